@@ -0,0 +1,237 @@
+# =====================================================
+# ARCHIVO: apps/authentication/audit.py
+# =====================================================
+"""Escritura diferida de los registros de acceso (`LogAcceso`).
+
+`log_user_action` ya no inserta en la petición: arma el `LogAcceso` (con la
+fecha del evento) y lo deja en una cola en memoria. Un hilo de fondo la vacía
+con `bulk_create`, en lotes de `ACCESS_LOG_BATCH_SIZE` registros o cada
+`ACCESS_LOG_FLUSH_INTERVAL_MS` milisegundos, lo que ocurra primero, y en la
+misma transacción suma el lote a los conteos diarios (apps/users/rollups.py); después
+invalida los conteos y páginas cacheados de la lista (apps/users/filters.py). Así el login
+no espera el bloqueo de escritura de SQLite y una ráfaga de intentos fallidos se
+escribe en unas pocas transacciones.
+
+La cola está acotada (`ACCESS_LOG_QUEUE_SIZE`). Si se llena, la política
+`ACCESS_LOG_OVERFLOW` decide: 'drop' descarta el registro nuevo y 'block' espera
+hasta `ACCESS_LOG_BLOCK_TIMEOUT_MS` a que haya sitio antes de descartarlo. Los
+descartes se cuentan en `stats()` y se informan en el log.
+
+Antes de insertar, los registros de usuarios que ya no existen (borrados entre
+`record()` y el vaciado) se guardan sin usuario. Se comprueba con una consulta
+y no esperando el `IntegrityError`: SQLite difiere la verificación de claves
+foráneas hasta el commit, así que dentro del `atomic()` de quien llama a
+`flush()` el error saldría en su commit y no aquí. Si el lote aun así falla por
+integridad, se reintenta de uno en uno: un registro inválido no hace perder el
+resto del lote.
+
+Al terminar el proceso (`atexit`) se escribe lo que quede en la cola. Con
+`ACCESS_LOG_BACKGROUND = False` no se arranca el hilo: los registros se escriben
+al completar un lote o al llamar a `flush()` (útil en pruebas y comandos).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from apps.users import filters, rollups
+from apps.users.models import LogAcceso
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class AuditWriter:
+    """Cola acotada de `LogAcceso` pendientes más el hilo que la vacía por lotes."""
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Serializa los vaciados (hilo de fondo, lote completo, flush explícito)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['pending'] = self._queue.qsize() if self._queue is not None else 0
+        return data
+
+    def _get_queue(self):
+        if self._queue is None:
+            with self._start_lock:
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=_setting('ACCESS_LOG_QUEUE_SIZE', 10000))
+        return self._queue
+
+    def _ensure_thread(self):
+        if not _setting('ACCESS_LOG_BACKGROUND', True):
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+                self._thread.start()
+
+    def record(self, entry):
+        """Encola un `LogAcceso` sin guardar. Devuelve False si se descartó por cola llena."""
+        q = self._get_queue()
+        self._ensure_thread()
+        try:
+            if _setting('ACCESS_LOG_OVERFLOW', 'drop') == 'block':
+                q.put(entry, timeout=_setting('ACCESS_LOG_BLOCK_TIMEOUT_MS', 50) / 1000.0)
+            else:
+                q.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning('Cola de registros de acceso llena; se descartó %s de %s', entry.accion, entry.direccion_ip)
+            return False
+        self._count('queued')
+        if self._thread is None and q.qsize() >= _setting('ACCESS_LOG_BATCH_SIZE', 50):
+            self.flush()
+        return True
+
+    def _drain(self, limit):
+        batch = []
+        q = self._get_queue()
+        while len(batch) < limit:
+            try:
+                batch.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _insert(batch):
+        # Un intento fallido puede haber asignado ids: volver a insertarlos como nuevos
+        for entry in batch:
+            entry.pk = None
+            entry._state.adding = True
+        with transaction.atomic():
+            LogAcceso.objects.bulk_create(batch, batch_size=500)
+            rollups.add_entries(batch)
+
+    @staticmethod
+    def _drop_missing_users(batch):
+        # Usuarios borrados entre record() y el vaciado: sus registros se guardan sin usuario
+        user_ids = {e.usuario_id for e in batch if e.usuario_id is not None}
+        if not user_ids:
+            return
+        existentes = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        for entry in batch:
+            if entry.usuario_id is not None and entry.usuario_id not in existentes:
+                entry.usuario_id = None
+
+    def _write(self, batch):
+        try:
+            self._drop_missing_users(batch)
+            self._insert(batch)
+        except IntegrityError:
+            # Último recurso: de uno en uno, para descartar solo los registros inválidos
+            for entry in batch:
+                try:
+                    self._insert([entry])
+                except Exception:
+                    self._count('failed')
+                    logger.exception('No se pudo guardar el registro de acceso %s de %s', entry.accion, entry.direccion_ip)
+                else:
+                    self._count('written')
+            filters.bump_version()
+        except Exception:
+            self._count('failed', len(batch))
+            logger.exception('No se pudieron guardar %s registros de acceso', len(batch))
+        else:
+            self._count('written', len(batch))
+            filters.bump_version()
+
+    def flush(self):
+        """Escribe en la base de datos todo lo que haya en la cola. Devuelve cuántos."""
+        total = 0
+        batch_size = _setting('ACCESS_LOG_BATCH_SIZE', 50)
+        with self._flush_lock:
+            while True:
+                batch = self._drain(batch_size)
+                if not batch:
+                    return total
+                self._write(batch)
+                total += len(batch)
+
+    def _run(self):
+        q = self._get_queue()
+        while not self._stop.is_set():
+            interval = _setting('ACCESS_LOG_FLUSH_INTERVAL_MS', 500) / 1000.0
+            batch_size = _setting('ACCESS_LOG_BATCH_SIZE', 50)
+            try:
+                first = q.get(timeout=interval)
+            except queue.Empty:
+                continue
+            # Juntar el lote hasta completarlo o hasta que venza el intervalo
+            batch = [first]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            close_old_connections()
+            try:
+                with self._flush_lock:
+                    self._write(batch)
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        """Detiene el hilo y escribe lo pendiente (se registra con `atexit`)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._queue is not None and not self._queue.empty():
+            self.flush()
+
+
+writer = AuditWriter()
+
+
+@atexit.register
+def _shutdown():
+    writer.shutdown()
+
+
+def record(user, action, ip_address=None, user_agent=''):
+    """Encola un registro de acceso con la fecha y hora actuales."""
+    return writer.record(LogAcceso(
+        usuario_id=getattr(user, 'pk', None),
+        accion=action,
+        direccion_ip=ip_address,
+        user_agent=user_agent or '',
+        fecha_hora=timezone.now(),
+    ))
+
+
+def flush():
+    return writer.flush()
+
+
+def stats():
+    return writer.stats()
@@ -0,0 +1,84 @@
+import io
+import time
+from contextlib import redirect_stdout
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from apps.authentication import url_blocker_middleware
+from apps.authentication.url_blocker_middleware import LISTA_BLANCA_PREFIX, LISTA_NEGRA, URLBlockerMiddleware
+
+RUTAS = ['/', '/dashboard/', '/reports/historial/', '/static/css/base.css', '/users/logs/', '/favicon.ico']
+
+_RESPUESTA = HttpResponse()
+
+
+def _respuesta(solicitud):
+    return _RESPUESTA
+
+
+class _LegacyMiddleware:
+    """Versión anterior: print por solicitud y recorrido lineal de la lista blanca."""
+
+    def __init__(self, obtener_respuesta):
+        self.obtener_respuesta = obtener_respuesta
+
+    def __call__(self, solicitud):
+        ruta = solicitud.path
+        print(f"[DEBUG] Ruta: {ruta} | Auth: {solicitud.user.is_authenticated} | Superuser: {getattr(solicitud.user, 'is_superuser', None)} | Admin: {getattr(solicitud.user, 'is_administrador', None)} | User: {getattr(solicitud.user, 'username', None)}")
+        if solicitud.user.is_authenticated and (solicitud.user.is_superuser or getattr(solicitud.user, 'is_administrador', False)):
+            return self.obtener_respuesta(solicitud)
+        if ruta in LISTA_NEGRA:
+            return None
+        if not any(ruta.startswith(prefijo) for prefijo in LISTA_BLANCA_PREFIX):
+            return None
+        return self.obtener_respuesta(solicitud)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el costo por solicitud (ns) de URLBlockerMiddleware frente a la versión anterior '
+        '(print + startswith lineal) y a no usar middleware.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200000, help='Solicitudes por medición (por defecto 200000).')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por variante (se informa la mediana).')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        solicitudes = []
+        for ruta in RUTAS:
+            solicitud = factory.get(ruta)
+            solicitud.user = AnonymousUser()
+            solicitudes.append(solicitud)
+
+        variantes = [
+            ('sin middleware', _respuesta),
+            ('anterior', _LegacyMiddleware(_respuesta)),
+            ('actual', URLBlockerMiddleware(_respuesta)),
+        ]
+        self.stdout.write(f'Logger {url_blocker_middleware.logger.name}: DEBUG {"activo" if url_blocker_middleware.logger.isEnabledFor(10) else "inactivo"}')
+        self.stdout.write(f"{'variante':<16} {'ns/solicitud':>13} {'neto (ns)':>10}")
+        base = None
+        for nombre, funcion in variantes:
+            ns = self._measure(funcion, solicitudes, options['requests'], options['repeat'])
+            base = ns if base is None else base
+            self.stdout.write(f'{nombre:<16} {ns:>13.1f} {ns - base:>10.1f}')
+
+    def _measure(self, funcion, solicitudes, total, repeat):
+        vueltas = max(1, total // len(solicitudes))
+        resultados = []
+        # El print de la versión anterior va a un buffer: el costo real contra la
+        # consola (escritura síncrona) es mayor que el medido aquí.
+        with redirect_stdout(io.StringIO()):
+            for _ in range(max(1, repeat)):
+                inicio = time.perf_counter_ns()
+                for _ in range(vueltas):
+                    for solicitud in solicitudes:
+                        funcion(solicitud)
+                resultados.append((time.perf_counter_ns() - inicio) / (vueltas * len(solicitudes)))
+        resultados.sort()
+        return resultados[len(resultados) // 2]
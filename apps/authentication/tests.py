@@ -1,3 +1,164 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
 
-# Crea tus pruebas aquí.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.users.models import LogAcceso, LogAccesoDiario
+
+from . import audit
+from .utils import log_user_action
+
+
+@override_settings(ACCESS_LOG_BACKGROUND=False, ACCESS_LOG_BATCH_SIZE=3)
+class AuditWriterTests(TestCase):
+	def setUp(self):
+		audit.writer = audit.AuditWriter()
+		self.user = get_user_model().objects.create_user(username='ana', password='pass', cedula='V-11000001')
+
+	def test_actions_are_buffered_and_written_in_batches(self):
+		with self.assertNumQueries(0):
+			log_user_action(self.user, 'login', ip_address='10.0.0.1', user_agent='Firefox')
+			log_user_action(None, 'failed_login', ip_address='10.0.0.2')
+		self.assertEqual(LogAcceso.objects.count(), 0)
+
+		# Al completar el lote se escribe con un solo INSERT (más los conteos diarios)
+		with CaptureQueriesContext(connection) as queries:
+			log_user_action(self.user, 'logout', ip_address='10.0.0.1')
+		self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "registros_acceso"')]), 1)
+		self.assertEqual(LogAcceso.objects.count(), 3)
+		self.assertEqual(
+			sorted(LogAcceso.objects.values_list('accion', 'usuario_id')),
+			[('failed_login', None), ('login', self.user.pk), ('logout', self.user.pk)],
+		)
+		self.assertEqual(audit.stats(), {'queued': 3, 'written': 3, 'dropped': 0, 'failed': 0, 'pending': 0})
+		self.assertEqual(
+			sorted(LogAccesoDiario.objects.values_list('fecha', 'accion', 'total')),
+			[(timezone.localdate(), 'failed_login', 1), (timezone.localdate(), 'login', 1), (timezone.localdate(), 'logout', 1)],
+		)
+		log_user_action(None, 'failed_login')
+		audit.flush()
+		self.assertEqual(LogAccesoDiario.objects.get(accion='failed_login').total, 2)
+
+	def test_event_time_is_kept_when_flushed_later(self):
+		log_user_action(self.user, 'login')
+		encolado = timezone.now()
+		self.assertEqual(audit.flush(), 1)
+		self.assertLess(abs(LogAcceso.objects.get().fecha_hora - encolado), timedelta(seconds=1))
+
+	@override_settings(ACCESS_LOG_QUEUE_SIZE=2, ACCESS_LOG_BATCH_SIZE=10)
+	def test_full_queue_drops_new_entries(self):
+		audit.writer = audit.AuditWriter()
+		resultados = [audit.record(None, 'failed_login', ip_address='10.0.0.9') for _ in range(4)]
+		self.assertEqual(resultados, [True, True, False, False])
+		self.assertEqual(audit.stats()['dropped'], 2)
+		audit.writer.shutdown()
+		self.assertEqual(LogAcceso.objects.count(), 2)
+
+
+@override_settings(ACCESS_LOG_BACKGROUND=True, ACCESS_LOG_BATCH_SIZE=4, ACCESS_LOG_FLUSH_INTERVAL_MS=50)
+class AuditBackgroundWriterTests(TransactionTestCase):
+	def test_background_thread_flushes_by_size_and_interval(self):
+		writer = audit.writer = audit.AuditWriter()
+		try:
+			for _ in range(6):
+				audit.record(None, 'failed_login', ip_address='10.0.0.3')
+			for _ in range(100):
+				if writer.stats()['written'] == 6:
+					break
+				time.sleep(0.02)
+			self.assertEqual(LogAcceso.objects.count(), 6)
+		finally:
+			writer.shutdown()
+		self.assertFalse(writer._thread.is_alive())
+
+
+@override_settings(ACCESS_LOG_BACKGROUND=False, ACCESS_LOG_BATCH_SIZE=50)
+class AuditWriterIntegrityTests(TransactionTestCase):
+	def test_deleted_user_does_not_drop_the_batch(self):
+		writer = audit.writer = audit.AuditWriter()
+		User = get_user_model()
+		ana = User.objects.create_user(username='ana', password='pass', cedula='V-11000011')
+		luis = User.objects.create_user(username='luis', password='pass', cedula='V-11000012')
+		audit.record(ana, 'login', ip_address='10.0.0.1')
+		audit.record(luis, 'login', ip_address='10.0.0.2')
+		audit.record(None, 'failed_login', ip_address='10.0.0.3')
+		luis_id = luis.pk
+		luis.delete()
+		self.assertEqual(audit.flush(), 3)
+		self.assertEqual(writer.stats()['written'], 3)
+		self.assertEqual(writer.stats()['failed'], 0)
+		self.assertEqual(
+			sorted(LogAcceso.objects.values_list('direccion_ip', 'usuario_id')),
+			[('10.0.0.1', ana.pk), ('10.0.0.2', None), ('10.0.0.3', None)],
+		)
+		self.assertFalse(LogAcceso.objects.filter(usuario_id=luis_id).exists())
+		self.assertEqual(sum(LogAccesoDiario.objects.values_list('total', flat=True)), 3)
+
+	def test_flush_inside_caller_transaction_with_deleted_user(self):
+		# SQLite difiere la verificación de claves foráneas hasta el commit externo
+		audit.writer = audit.AuditWriter()
+		User = get_user_model()
+		ana = User.objects.create_user(username='ana', password='pass', cedula='V-11000013')
+		with transaction.atomic():
+			luis = User.objects.create_user(username='luis', password='pass', cedula='V-11000014')
+			audit.record(ana, 'login', ip_address='10.0.0.1')
+			audit.record(luis, 'login', ip_address='10.0.0.2')
+			luis.delete()
+			self.assertEqual(audit.flush(), 2)
+		self.assertEqual(
+			sorted(LogAcceso.objects.values_list('direccion_ip', 'usuario_id')),
+			[('10.0.0.1', ana.pk), ('10.0.0.2', None)],
+		)
+
+
+@override_settings(URL_BLOCKER_ALLOW_PREFIXES=['/auth/', '/static/', '/reports/', '/reports/historial/'], URL_BLOCKER_DENY=['/reports/secreto/'], URL_BLOCKER_LOG_EVERY=3)
+class URLBlockerMiddlewareTests(TestCase):
+	def setUp(self):
+		from django.contrib.auth.models import AnonymousUser
+		from django.http import HttpResponse
+		from django.test import RequestFactory
+		from .url_blocker_middleware import URLBlockerMiddleware
+		self.factory = RequestFactory()
+		self.anonimo = AnonymousUser()
+		self.middleware = URLBlockerMiddleware(lambda solicitud: HttpResponse('ok'))
+
+	def _get(self, ruta, user=None):
+		solicitud = self.factory.get(ruta)
+		solicitud.user = user or self.anonimo
+		return self.middleware(solicitud)
+
+	def test_prefixes_compile_to_a_single_pattern(self):
+		from .url_blocker_middleware import compile_prefixes
+		match = compile_prefixes(['/users/', '/static/', '/', '/media/'])
+		self.assertEqual(match.__self__.pattern, '/')
+		match = compile_prefixes(['/media/', '/maintenance/', '/media/x'])
+		self.assertEqual(match.__self__.pattern, '/m(?:aintenance/|edia/)')
+		self.assertTrue(match('/media/foto.jpg'))
+		self.assertFalse(match('/medi'))
+		self.assertFalse(compile_prefixes([])('/'))
+
+	def test_blocks_paths_outside_the_allow_list(self):
+		self.assertEqual(self._get('/reports/historial/').status_code, 200)
+		self.assertEqual(self._get('/static/css/base.css').status_code, 200)
+		self.assertEqual(self._get('/admin/').status_code, 403)
+		self.assertEqual(self._get('/reports/secreto/').status_code, 403)
+		admin = get_user_model().objects.create_superuser(username='root', email='r@example.com', password='pass', cedula='V-11000009', rol='administrador')
+		self.assertEqual(self._get('/admin/', admin).status_code, 200)
+
+	def test_allowed_paths_do_not_load_the_user(self):
+		from django.utils.functional import SimpleLazyObject
+		solicitud = self.factory.get('/reports/')
+		cargas = []
+		solicitud.user = SimpleLazyObject(lambda: cargas.append(1) or self.anonimo)
+		self.assertEqual(self.middleware(solicitud).status_code, 200)
+		self.assertEqual(cargas, [])
+
+	def test_debug_log_is_sampled(self):
+		with self.assertLogs('apps.authentication.url_blocker_middleware', level='DEBUG') as logs:
+			for _ in range(7):
+				self._get('/reports/')
+		self.assertEqual(len([r for r in logs.records if r.levelname == 'DEBUG']), 3)
@@ -1,9 +1,30 @@
+"""Bloqueo de rutas fuera de la lista blanca.
+
+Las listas se compilan una sola vez, al crear el middleware: los prefijos
+permitidos en una única expresión regular anclada al inicio de la ruta, armada
+a partir de un trie (una sola llamada a `match` en C en lugar de recorrer la
+lista con `startswith`), y las rutas bloqueadas en un conjunto. Ambas se pueden
+reemplazar con los settings `URL_BLOCKER_ALLOW_PREFIXES` y `URL_BLOCKER_DENY`.
+
+La ruta se evalúa antes que el usuario: `request.user` solo se carga (sesión y
+consulta a la base de datos) cuando la ruta se va a bloquear, para dejar pasar
+a superusuarios y administradores.
+
+El detalle de cada solicitud se envía al logger de este módulo con nivel DEBUG
+y solo una de cada `URL_BLOCKER_LOG_EVERY` solicitudes (100 por defecto); si el
+nivel DEBUG no está activo no se arma ningún mensaje. Las rutas bloqueadas se
+registran con nivel INFO.
+"""
+import itertools
+import logging
+import re
+
 from django.conf import settings
-from django.http import HttpResponseForbidden
-from django.shortcuts import render
-from django.urls import resolve
+
 from config import views
 
+logger = logging.getLogger(__name__)
+
 LISTA_BLANCA_PREFIX = [
     '/',  # raíz
     '/auth/',
@@ -18,30 +39,71 @@ LISTA_BLANCA_PREFIX = [
 ]
 
 LISTA_NEGRA = [
-    #'/admin/',  
+    #'/admin/',
 ]
 
 
+def _patron(nodo):
+    ramas = [re.escape(caracter) + _patron(hijo) for caracter, hijo in sorted(nodo.items())]
+    if len(ramas) <= 1:
+        return ''.join(ramas)
+    return '(?:' + '|'.join(ramas) + ')'
+
+
+def compile_prefixes(prefijos):
+    """Función `match(ruta)` que es verdadera si la ruta empieza por alguno de los prefijos.
+
+    Se descartan los prefijos cubiertos por otro más corto y el resto se arma
+    como un trie (los prefijos comunes se comparan una sola vez), que se
+    convierte en una expresión regular sin alternativas redundantes.
+    """
+    minimos = []
+    for prefijo in sorted(set(prefijos), key=len):
+        if prefijo and not any(prefijo.startswith(m) for m in minimos):
+            minimos.append(prefijo)
+    if not minimos:
+        return lambda ruta: None
+    trie = {}
+    for prefijo in minimos:
+        nodo = trie
+        for caracter in prefijo:
+            nodo = nodo.setdefault(caracter, {})
+    return re.compile(_patron(trie)).match
+
+
 class URLBlockerMiddleware:
-    
+
     def __init__(self, obtener_respuesta):
         self.obtener_respuesta = obtener_respuesta
-        # Verificamos si el middleware está activo
+        self.permitida = compile_prefixes(getattr(settings, 'URL_BLOCKER_ALLOW_PREFIXES', LISTA_BLANCA_PREFIX))
+        self.lista_negra = frozenset(getattr(settings, 'URL_BLOCKER_DENY', LISTA_NEGRA))
+        self.log_every = max(1, getattr(settings, 'URL_BLOCKER_LOG_EVERY', 100))
+        self._contador = itertools.count()
+
+    def _log_debug(self, solicitud):
+        # next() sobre itertools.count es atómico con el GIL: no hace falta lock
+        if next(self._contador) % self.log_every:
+            return
+        usuario = solicitud.user
+        logger.debug(
+            'Ruta: %s | Auth: %s | Superuser: %s | Admin: %s | User: %s',
+            solicitud.path, usuario.is_authenticated, getattr(usuario, 'is_superuser', None),
+            getattr(usuario, 'is_administrador', None), getattr(usuario, 'username', None),
+        )
 
     def __call__(self, solicitud): # Metodo que se llama para cada solicitud
         ruta = solicitud.path
 
-        # DEBUG: Mostrar información del usuario en consola
-        print(f"[DEBUG] Ruta: {ruta} | Auth: {solicitud.user.is_authenticated} | Superuser: {getattr(solicitud.user, 'is_superuser', None)} | Admin: {getattr(solicitud.user, 'is_administrador', None)} | User: {getattr(solicitud.user, 'username', None)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            self._log_debug(solicitud)
 
-        # Permitir acceso total a superusuarios y administradores
-        if solicitud.user.is_authenticated and (solicitud.user.is_superuser or getattr(solicitud.user, 'is_administrador', False)):
+        if ruta not in self.lista_negra and self.permitida(ruta):
             return self.obtener_respuesta(solicitud)
 
-        if ruta in LISTA_NEGRA:
-            return views.custom_403_view(solicitud)
-
-        if not any(ruta.startswith(prefijo) for prefijo in LISTA_BLANCA_PREFIX):
-            return views.custom_403_view(solicitud)
+        # Permitir acceso total a superusuarios y administradores
+        usuario = solicitud.user
+        if usuario.is_authenticated and (usuario.is_superuser or getattr(usuario, 'is_administrador', False)):
+            return self.obtener_respuesta(solicitud)
 
-        return self.obtener_respuesta(solicitud) # Si la ruta está en la lista blanca, se continúa con el procesamiento de la solicitud
\ No newline at end of file
+        logger.info('Ruta bloqueada: %s', ruta)
+        return views.custom_403_view(solicitud)
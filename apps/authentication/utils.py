@@ -2,7 +2,7 @@
 # ARCHIVO: apps/authentication/utils.py
 # =====================================================
 
-from apps.users.models import LogAcceso
+from . import audit
 
 
 def get_client_ip(request):
@@ -16,10 +16,5 @@ def get_client_ip(request):
 
 
 def log_user_action(user, action, ip_address=None, user_agent=''):
-    """Registra una acción del usuario en el log"""
-    LogAcceso.objects.create(
-        usuario=user,
-        accion=action,
-        direccion_ip=ip_address,
-        user_agent=user_agent
-    )
+    """Registra una acción del usuario en el log (escritura diferida, ver `audit.py`)"""
+    audit.record(user, action, ip_address=ip_address, user_agent=user_agent)
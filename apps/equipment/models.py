@@ -1,7 +1,38 @@
-from django.db import models
+import copy
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import datetime
 
+# Caché de SystemConfig.get_solo(): copia en memoria del proceso, validada con
+# una versión en la caché compartida que cambia en cada save()/delete(). Para que
+# todos los procesos del servidor vean el cambio, CACHES debe ser compartida
+# (Redis o Memcached); la caché local por defecto solo avisa al proceso que guardó.
+SOLO_VERSION_KEY = 'equipment:systemconfig:version'
+SOLO_CACHE_PREFIX = 'equipment:systemconfig:'
+_solo_lock = threading.Lock()
+_solo = {'version': None, 'obj': None}
+
+
+def _solo_version():
+	version = cache.get(SOLO_VERSION_KEY)
+	if version is None:
+		# Sin versión (caché reiniciada o expulsada): una nueva obliga a recargar
+		cache.add(SOLO_VERSION_KEY, uuid.uuid4().hex, None)
+		version = cache.get(SOLO_VERSION_KEY)
+	return version
+
+
+def _bump_solo_version():
+	cache.set(SOLO_VERSION_KEY, uuid.uuid4().hex, None)
+	with _solo_lock:
+		_solo['version'] = _solo['obj'] = None
+
+
 class SystemConfig(models.Model):
 	FREQUENCY_CHOICES = [
 		('daily', 'Diariamente'),
@@ -47,5 +78,39 @@ class SystemConfig(models.Model):
 
 	@classmethod
 	def get_solo(cls):
-		obj, created = cls.objects.get_or_create(pk=1)
-		return obj
+		"""Configuración única (pk=1), sin consultas mientras no cambie.
+
+		Cada llamada lee solo la versión de la caché compartida; si coincide con
+		la de la copia en memoria del proceso se devuelve esa copia. Si no, se
+		toma la configuración de la caché compartida y solo si falta ahí se lee
+		(o crea) en la base de datos. Se devuelve una copia para que un
+		formulario pueda modificarla sin afectar a otras solicitudes.
+		"""
+		version = _solo_version()
+		with _solo_lock:
+			if _solo['version'] == version:
+				return copy.copy(_solo['obj'])
+		key = SOLO_CACHE_PREFIX + version
+		obj = cache.get(key)
+		if obj is None:
+			obj, created = cls.objects.get_or_create(pk=1)
+			if created:
+				# Crearla con save() ya cambió la versión
+				version = _solo_version()
+				key = SOLO_CACHE_PREFIX + version
+			cache.set(key, obj, getattr(settings, 'SYSTEMCONFIG_CACHE_TIMEOUT', 24 * 3600))
+		with _solo_lock:
+			_solo['version'], _solo['obj'] = version, obj
+		return copy.copy(obj)
+
+	def save(self, *args, **kwargs):
+		super().save(*args, **kwargs)
+		# Ya y otra vez al confirmar: una lectura concurrente no deja la copia anterior
+		_bump_solo_version()
+		transaction.on_commit(_bump_solo_version)
+
+	def delete(self, *args, **kwargs):
+		result = super().delete(*args, **kwargs)
+		_bump_solo_version()
+		transaction.on_commit(_bump_solo_version)
+		return result
@@ -1,2 +1,48 @@
+from django.core.cache import cache
 from django.test import TestCase
 
+from . import models
+from .models import SystemConfig
+
+
+class SystemConfigSoloTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		models._bump_solo_version()
+
+	def test_reads_cost_zero_queries_once_loaded(self):
+		self.assertEqual(SystemConfig.get_solo().pk, 1)
+		with self.assertNumQueries(0):
+			config = SystemConfig.get_solo()
+			SystemConfig.get_solo()
+		self.assertEqual(config.timezone, 'America/Caracas')
+
+	def test_returned_copy_is_not_shared(self):
+		config = SystemConfig.get_solo()
+		config.app_name = 'Sin guardar'
+		self.assertNotEqual(SystemConfig.get_solo().app_name, 'Sin guardar')
+
+	def test_save_is_visible_on_next_read(self):
+		config = SystemConfig.get_solo()
+		config.password_expiry = 30
+		with self.captureOnCommitCallbacks(execute=True):
+			config.save()
+		with self.assertNumQueries(1):
+			self.assertEqual(SystemConfig.get_solo().password_expiry, 30)
+
+	def test_other_processes_reload_when_the_shared_version_changes(self):
+		SystemConfig.get_solo()
+		# Otro proceso guardó: cambia la versión compartida y su copia ya está en la caché
+		SystemConfig.objects.filter(pk=1).update(max_attempts=7)
+		otra = SystemConfig.objects.get(pk=1)
+		version = 'otro-proceso'
+		cache.set(models.SOLO_VERSION_KEY, version, None)
+		cache.set(models.SOLO_CACHE_PREFIX + version, otra, None)
+		with self.assertNumQueries(0):
+			self.assertEqual(SystemConfig.get_solo().max_attempts, 7)
+
+	def test_missing_shared_version_forces_reload(self):
+		SystemConfig.get_solo()
+		SystemConfig.objects.filter(pk=1).update(two_factor=True)
+		cache.delete(models.SOLO_VERSION_KEY)
+		self.assertTrue(SystemConfig.get_solo().two_factor)
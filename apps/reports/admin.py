@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import FichaEntrada, Seguimiento, QueuedEmail
+from .models import FichaEntrada, Seguimiento, SeguimientoEvento, QueuedEmail, ExportJob
 # Register your models here.
 
 admin.site.register(FichaEntrada)
 admin.site.register(Seguimiento)
-admin.site.register(QueuedEmail)
\ No newline at end of file
+admin.site.register(SeguimientoEvento)
+admin.site.register(QueuedEmail)
+admin.site.register(ExportJob)
@@ -0,0 +1,312 @@
+"""Exportaciones en segundo plano.
+
+Las exportaciones pesadas (historial de equipos y registros de acceso) se
+registran como `ExportJob` y se generan en un pool local de hilos, de modo que
+no ocupan un hilo de waitress mientras se construye el archivo. El cliente
+consulta el progreso en JSON y descarga el archivo cuando está listo.
+
+- Deduplicación: una solicitud idéntica (mismo tipo, filtros y usuario) a otra
+  que sigue pendiente o en proceso reutiliza ese trabajo.
+- Expiración: los archivos se conservan `EXPORT_JOB_TTL` segundos y luego
+  `purge_expired` (o `manage.py purge_export_jobs`) los elimina.
+
+Cada tipo de exportación declara en `EXPORT_TYPES` su generador (ruta con
+puntos a una función `builder(job, fileobj, progress)`), la extensión del
+archivo, los filtros aceptados y los roles que pueden solicitarla.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TYPES = {
+    'historial_xlsx': {
+        'builder': 'apps.reports.views.build_historial_export',
+        'extension': 'xlsx',
+        'filename': 'historial_equipos',
+        'filtros': ('search',),
+        'roles': ('administrador', 'tecnico'),
+    },
+    'historial_csv': {
+        'builder': 'apps.reports.views.build_historial_export',
+        'extension': 'csv',
+        'filename': 'historial_equipos',
+        'filtros': ('search',),
+        'roles': ('administrador', 'tecnico'),
+    },
+    'logs_csv': {
+        'builder': 'apps.users.views.build_logs_export',
+        'extension': 'csv',
+        'filename': 'logs_acceso',
+        'filtros': ('usuario', 'accion', 'desde', 'hasta'),
+        'roles': ('administrador',),
+    },
+    'logs_xlsx': {
+        'builder': 'apps.users.views.build_logs_export',
+        'extension': 'xlsx',
+        'filename': 'logs_acceso',
+        'filtros': ('usuario', 'accion', 'desde', 'hasta'),
+        'roles': ('administrador',),
+    },
+    'logs_pdf': {
+        'builder': 'apps.users.views.build_logs_export',
+        'extension': 'pdf',
+        'filename': 'logs_acceso',
+        'filtros': ('usuario', 'accion', 'desde', 'hasta'),
+        'roles': ('administrador',),
+    },
+}
+
+# Segundos que se conserva un archivo generado (o un error) antes de purgarse
+EXPORT_JOB_TTL = getattr(settings, 'EXPORT_JOB_TTL', 24 * 3600)
+# Un trabajo pendiente más antiguo que esto se vuelve a encolar al consultarlo
+# (p.ej. si el proceso que lo tenía en cola se reinició)
+EXPORT_JOB_STALE_SECONDS = getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 60)
+# Un trabajo en proceso más antiguo que esto se considera interrumpido
+EXPORT_JOB_TIMEOUT = getattr(settings, 'EXPORT_JOB_TIMEOUT', 3600)
+# Intervalo mínimo entre escrituras de progreso en la base de datos
+PROGRESS_INTERVAL = 1.0
+PROGRESS_EVERY_ROWS = 500
+
+_executor = None
+_executor_lock = threading.Lock()
+# Trabajos encolados en el pool de este proceso que aún no han terminado
+_queued = set()
+_queued_lock = threading.Lock()
+_last_purge = 0.0
+
+
+class ExportJobError(Exception):
+    """Solicitud de exportación inválida (tipo desconocido o sin permiso)."""
+
+
+def get_spec(tipo):
+    try:
+        return EXPORT_TYPES[tipo]
+    except KeyError:
+        raise ExportJobError(f'Tipo de exportación desconocido: {tipo}')
+
+
+def can_request(user, tipo):
+    spec = get_spec(tipo)
+    return user.is_superuser or getattr(user, 'rol', None) in spec['roles']
+
+
+def clean_filters(tipo, params):
+    """Conserva solo los filtros aceptados por el tipo y con valor, para una huella estable."""
+    spec = get_spec(tipo)
+    filtros = {}
+    for key in spec['filtros']:
+        value = (params.get(key) or '').strip()
+        if value:
+            filtros[key] = value
+    return filtros
+
+
+def fingerprint(tipo, filtros, user_id):
+    raw = json.dumps([tipo, filtros, user_id], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def submit(tipo, params, user):
+    """Registra (o reutiliza) un trabajo de exportación y lo encola.
+
+    Devuelve `(job, created)`. Lanza `ExportJobError` si el tipo no existe o el
+    usuario no puede solicitarlo.
+    """
+    if not can_request(user, tipo):
+        raise ExportJobError('No tienes permiso para solicitar esta exportación.')
+    filtros = clean_filters(tipo, params)
+    huella = fingerprint(tipo, filtros, user.pk)
+    maybe_purge()
+
+    existing = ExportJob.objects.filter(huella=huella, estado__in=ExportJob.ESTADOS_ACTIVOS).first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            job = ExportJob.objects.create(tipo=tipo, filtros=filtros, solicitante=user, huella=huella)
+    except IntegrityError:
+        # Otra petición idéntica creó el trabajo entre la consulta y el insert
+        existing = ExportJob.objects.filter(huella=huella, estado__in=ExportJob.ESTADOS_ACTIVOS).first()
+        if existing:
+            return existing, False
+        raise
+    transaction.on_commit(lambda: schedule(job.pk))
+    return job, True
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'EXPORT_JOB_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reports-export')
+        return _executor
+
+
+def schedule(job_id):
+    """Encola el trabajo en el pool local; con `EXPORT_JOB_WORKERS = 0` se ejecuta en línea."""
+    if getattr(settings, 'EXPORT_JOB_WORKERS', 2) <= 0:
+        run_job(job_id)
+        return
+    with _queued_lock:
+        _queued.add(job_id)
+    try:
+        _get_executor().submit(_run_in_thread, job_id)
+    except Exception:
+        with _queued_lock:
+            _queued.discard(job_id)
+        raise
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_job(job_id)
+    finally:
+        with _queued_lock:
+            _queued.discard(job_id)
+        close_old_connections()
+
+
+def resume_if_stale(job):
+    """Vuelve a encolar un trabajo pendiente que nadie ha tomado en un tiempo prudencial.
+
+    Si el trabajo ya está en la cola de este proceso (p.ej. detrás de otras
+    exportaciones largas) no se vuelve a encolar: cada consulta de estado lo
+    agregaría otra vez al pool.
+    """
+    if job.estado != ExportJob.ESTADO_PENDIENTE:
+        return
+    with _queued_lock:
+        if job.pk in _queued:
+            return
+    if timezone.now() - job.creado > timedelta(seconds=EXPORT_JOB_STALE_SECONDS):
+        logger.info('Reencolando ExportJob %s pendiente desde %s', job.pk, job.creado)
+        schedule(job.pk)
+
+
+class _Progress:
+    """Callback de progreso que limita las escrituras en la base de datos."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.total = None
+        self._last_write = 0.0
+
+    def __call__(self, done, total=None, force=False):
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        fields = {'filas_procesadas': done}
+        if self.total is not None:
+            fields['total_filas'] = self.total
+            fields['progreso'] = min(99, int(done * 100 / self.total)) if self.total else 99
+        ExportJob.objects.filter(pk=self.job_id).update(**fields)
+
+
+def track(rows, progress, total=None):
+    """Itera `rows` informando el avance a `progress` cada `PROGRESS_EVERY_ROWS` filas."""
+    progress(0, total, force=True)
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % PROGRESS_EVERY_ROWS == 0:
+            progress(done)
+    progress(done, force=True)
+
+
+def run_job(job_id):
+    """Genera el archivo de un trabajo pendiente. Es seguro llamarlo más de una vez."""
+    claimed = ExportJob.objects.filter(pk=job_id, estado=ExportJob.ESTADO_PENDIENTE).update(
+        estado=ExportJob.ESTADO_EN_PROCESO,
+        iniciado=timezone.now(),
+    )
+    if not claimed:
+        return
+    job = ExportJob.objects.select_related('solicitante').get(pk=job_id)
+    spec = get_spec(job.tipo)
+    try:
+        builder = import_string(spec['builder'])
+        with tempfile.TemporaryFile() as tmp:
+            builder(job, tmp, _Progress(job.pk))
+            tmp.seek(0)
+            job.archivo.save(f"{spec['filename']}_{uuid4().hex}.{spec['extension']}", File(tmp), save=False)
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(
+            estado=ExportJob.ESTADO_COMPLETADO,
+            archivo=job.archivo.name,
+            progreso=100,
+            finalizado=now,
+            expira=now + timedelta(seconds=EXPORT_JOB_TTL),
+        )
+        logger.info('ExportJob %s (%s) completado: %s', job.pk, job.tipo, job.archivo.name)
+    except Exception as e:
+        logger.exception('Error generando ExportJob %s (%s)', job.pk, job.tipo)
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(
+            estado=ExportJob.ESTADO_ERROR,
+            error=str(e),
+            finalizado=now,
+            expira=now + timedelta(seconds=EXPORT_JOB_TTL),
+        )
+
+
+def purge_expired(now=None):
+    """Elimina los trabajos vencidos y sus archivos; marca como error los interrumpidos.
+
+    Devuelve el número de trabajos eliminados.
+    """
+    now = now or timezone.now()
+    ExportJob.objects.filter(
+        estado=ExportJob.ESTADO_EN_PROCESO,
+        iniciado__lt=now - timedelta(seconds=EXPORT_JOB_TIMEOUT),
+    ).update(
+        estado=ExportJob.ESTADO_ERROR,
+        error='Trabajo interrumpido.',
+        finalizado=now,
+        expira=now + timedelta(seconds=EXPORT_JOB_TTL),
+    )
+    removed = 0
+    for job in ExportJob.objects.filter(expira__lt=now).iterator():
+        if job.archivo:
+            try:
+                job.archivo.delete(save=False)
+            except Exception:
+                logger.exception('No se pudo eliminar el archivo de ExportJob %s', job.pk)
+        job.delete()
+        removed += 1
+    return removed
+
+
+def maybe_purge():
+    """Purga oportunista, como mucho una vez cada `EXPORT_JOB_STALE_SECONDS` por proceso."""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < EXPORT_JOB_STALE_SECONDS:
+        return
+    _last_purge = now
+    try:
+        purge_expired()
+    except Exception:
+        logger.exception('Error purgando exportaciones vencidas')
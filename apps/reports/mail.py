@@ -0,0 +1,401 @@
+"""Bandeja de salida de correos (`QueuedEmail`).
+
+Los correos transaccionales no se envían dentro de la petición: `enqueue` los
+guarda como `QueuedEmail` en la misma transacción que el cambio que los origina
+y, al confirmarse, pide su entrega inmediata en segundo plano. Así la latencia
+de la petición (y el tiempo que se mantienen los bloqueos de fila) no depende
+del servidor SMTP, y un correo nunca sale por un cambio que terminó en rollback.
+
+La entrega la hace `manage.py run_email_worker` (ver `run_loop`): un proceso
+aparte que consulta la cola con espera adaptativa y se despierta en cuanto
+`enqueue` confirma un correo, mediante un datagrama UDP local
+(`QUEUED_EMAIL_WAKE_PORT`). Con `QUEUED_EMAIL_INPROCESS_WORKER = True` se puede
+seguir entregando desde el propio proceso web, como antes. Lo que no se pudo
+entregar queda en la cola y se reintenta con espera exponencial; tras
+`QUEUED_EMAIL_MAX_ATTEMPTS` intentos pasa a la bandeja de correos fallidos
+(`failed`), desde donde un administrador puede reintentarlo. Los enviados se
+eliminan pasados `QUEUED_EMAIL_RETENTION_DAYS` días (`manage.py purge_sent_emails`).
+
+Varios procesos (cada proceso de waitress, comandos de management) pueden
+procesar la cola a la vez. Para que un correo no se envíe dos veces, cada worker
+reserva su lote con un UPDATE condicional (`claimed_by`, `lease_until`) y solo
+envía las filas que quedaron a su nombre. Si el worker muere, la reserva vence a
+los `QUEUED_EMAIL_LEASE_SECONDS` y otro la retoma.
+
+Cada lote se entrega por una única conexión SMTP (`get_connection()`), en vez de
+abrir una sesión TCP+TLS+AUTH por mensaje; si el servidor la cierra a mitad del
+lote se reconecta y se reintenta ese mensaje una vez. Cada mensaje se envía con
+su propia llamada a `send_messages()` sobre esa conexión para poder registrar el
+resultado de cada fila.
+"""
+import datetime
+import logging
+import os
+import smtplib
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Evento para despertar al worker en proceso (QUEUED_EMAIL_INPROCESS_WORKER)
+local_wake = threading.Event()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(subject, body_text, to, body_html=''):
+    """Registra un correo en la bandeja de salida y programa su entrega tras el commit.
+
+    Debe llamarse dentro de la transacción del cambio que genera el correo.
+    Devuelve el `QueuedEmail` creado.
+    """
+    with transaction.atomic():
+        queued = QueuedEmail.objects.create(
+            to=list(to),
+            subject=subject,
+            body_text=body_text,
+            body_html=body_html or '',
+        )
+    transaction.on_commit(lambda: kick([queued.pk]))
+    return queued
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting('QUEUED_EMAIL_WORKERS', 1),
+                thread_name_prefix='reports-email',
+            )
+        return _executor
+
+
+def wake_address():
+    return ('127.0.0.1', _setting('QUEUED_EMAIL_WAKE_PORT', 8765))
+
+
+def notify_worker():
+    """Avisa al worker de correos (datagrama UDP local, sin esperar respuesta) de que hay trabajo."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'wake', wake_address())
+    except OSError as e:
+        logger.debug('No se pudo notificar al worker de correos: %s', e)
+
+
+def kick(ids):
+    """Pide la entrega de los correos indicados tras el commit.
+
+    Siempre avisa al worker dedicado. Si el worker en proceso está habilitado,
+    además los entrega aquí en segundo plano (o en línea con
+    `QUEUED_EMAIL_WORKERS = 0`).
+    """
+    notify_worker()
+    if not _setting('QUEUED_EMAIL_INPROCESS_WORKER', False):
+        return
+    local_wake.set()
+    if _setting('QUEUED_EMAIL_WORKERS', 1) <= 0:
+        deliver_ids(ids)
+        return
+    _get_executor().submit(_run_in_thread, ids)
+
+
+def _run_in_thread(ids):
+    close_old_connections()
+    try:
+        deliver_ids(ids)
+    except Exception:
+        logger.exception('Error entregando correos %s', ids)
+    finally:
+        close_old_connections()
+
+
+def build_message(queued, connection=None):
+    from_email = _setting('DEFAULT_FROM_EMAIL', 'no-reply@example.com')
+    msg = EmailMultiAlternatives(
+        queued.subject,
+        queued.body_text,
+        from_email,
+        list(queued.to or []),
+        connection=connection,
+    )
+    if queued.body_html:
+        msg.attach_alternative(queued.body_html, 'text/html')
+    return msg
+
+
+def _release(queued):
+    queued.claimed_by = ''
+    queued.lease_until = None
+
+
+def mark_sent(queued):
+    queued.sent = True
+    queued.sent_at = timezone.now()
+    queued.attempts = queued.attempts + 1
+    queued.last_error = ''
+    queued.send_after = None
+    _release(queued)
+    queued.save(update_fields=['sent', 'sent_at', 'attempts', 'last_error', 'send_after', 'claimed_by', 'lease_until'])
+
+
+def max_attempts():
+    return _setting('QUEUED_EMAIL_MAX_ATTEMPTS', 6)
+
+
+def mark_failed(queued, error):
+    """Registra un intento fallido y programa el reintento con espera exponencial.
+
+    Al llegar a `QUEUED_EMAIL_MAX_ATTEMPTS` el correo pasa al estado terminal
+    `failed` y deja de reintentarse.
+    """
+    queued.attempts = queued.attempts + 1
+    queued.last_error = str(error)
+    if queued.attempts >= max_attempts():
+        queued.failed = True
+        queued.failed_at = timezone.now()
+        queued.send_after = None
+        logger.error('Correo %s a %s descartado tras %s intentos: %s', queued.pk, queued.to, queued.attempts, error)
+    else:
+        # exponencial backoff: 2^attempts * 60 seconds, limitado
+        backoff = min(3600, (2 ** queued.attempts) * 60)
+        queued.send_after = timezone.now() + datetime.timedelta(seconds=backoff)
+    _release(queued)
+    queued.save(update_fields=['attempts', 'last_error', 'send_after', 'failed', 'failed_at', 'claimed_by', 'lease_until'])
+
+
+def retry_failed(queryset):
+    """Devuelve a la cola los correos fallidos de `queryset`. Devuelve cuántos."""
+    count = queryset.filter(failed=True, sent=False).update(
+        failed=False,
+        failed_at=None,
+        attempts=0,
+        send_after=None,
+        claimed_by='',
+        lease_until=None,
+    )
+    if count:
+        transaction.on_commit(notify_worker)
+    return count
+
+
+def purge_sent(days=None, batch_size=1000, now=None):
+    """Elimina por lotes los correos enviados hace más de `days` días. Devuelve cuántos.
+
+    Cada lote es una transacción corta, para no bloquear la tabla mientras el
+    worker sigue enviando.
+    """
+    days = days if days is not None else _setting('QUEUED_EMAIL_RETENTION_DAYS', 30)
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=days)
+    removed = 0
+    while True:
+        ids = list(
+            QueuedEmail.objects.filter(sent=True, sent_at__lt=cutoff)
+            .order_by('sent_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return removed
+        with transaction.atomic():
+            removed += QueuedEmail.objects.filter(pk__in=ids).delete()[0]
+
+
+# Errores que indican que la conexión SMTP ya no sirve y conviene reabrirla
+STALE_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def _send_open(connection, msg):
+    connection.open()
+    if not connection.send_messages([msg]):
+        return ValueError('El mensaje no tiene destinatarios válidos.')
+    return None
+
+
+def send_one(connection, msg):
+    """Envía `msg` por `connection` (abriéndola si hace falta). Devuelve None o el error."""
+    try:
+        return _send_open(connection, msg)
+    except STALE_CONNECTION_ERRORS:
+        # El servidor cerró la conexión (p.ej. por inactividad): reabrir y reintentar una vez
+        _close_quietly(connection)
+        try:
+            return _send_open(connection, msg)
+        except Exception as e:
+            _close_quietly(connection)
+            return e
+    except Exception as e:
+        return e
+
+
+def send_each(connection, messages):
+    """Envía `messages` por una misma conexión y produce `(mensaje, error)` por cada uno."""
+    for msg in messages:
+        yield msg, send_one(connection, msg)
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def deliver_batch(queued_list):
+    """Entrega los correos de la cola usando una sola conexión. Devuelve cuántos se enviaron."""
+    queued_list = list(queued_list)
+    if not queued_list:
+        return 0
+    connection = get_connection(fail_silently=False)
+    messages = [build_message(queued, connection) for queued in queued_list]
+    sent = 0
+    try:
+        for queued, (_, error) in zip(queued_list, send_each(connection, messages)):
+            if error is None:
+                mark_sent(queued)
+                sent += 1
+            else:
+                logger.warning('No se pudo enviar el correo %s a %s: %s', queued.pk, queued.to, error)
+                mark_failed(queued, error)
+    finally:
+        _close_quietly(connection)
+    return sent
+
+
+def deliver(queued):
+    """Intenta enviar un correo de la cola. Devuelve True si se entregó."""
+    return deliver_batch([queued]) == 1
+
+
+def pending(now=None):
+    """Correos pendientes cuyo reintento ya venció, en orden de llegada."""
+    now = now or timezone.now()
+    return (
+        QueuedEmail.objects
+        .filter(sent=False, failed=False)
+        .filter(models.Q(send_after__isnull=True) | models.Q(send_after__lte=now))
+        .order_by('created_at')
+    )
+
+
+def _unclaimed(now):
+    return models.Q(lease_until__isnull=True) | models.Q(lease_until__lt=now)
+
+
+def worker_name():
+    """Identificador de este worker en `claimed_by` (host:pid:hilo)."""
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[:80]
+
+
+def claim(batch=None, ids=None):
+    """Reserva hasta `batch` correos pendientes (opcionalmente solo entre `ids`).
+
+    La reserva es un UPDATE condicional: solo toma filas sin reserva o con la
+    reserva vencida, así que dos workers nunca obtienen la misma fila. Devuelve
+    la lista de correos reservados por esta llamada.
+    """
+    batch = batch or _setting('QUEUED_EMAIL_BATCH', 10)
+    now = timezone.now()
+    candidates = pending(now).filter(_unclaimed(now))
+    if ids is not None:
+        candidates = candidates.filter(pk__in=ids)
+    candidate_ids = list(candidates.values_list('pk', flat=True)[:batch])
+    if not candidate_ids:
+        return []
+    token = f'{worker_name()}:{uuid4().hex[:12]}'
+    lease = datetime.timedelta(seconds=_setting('QUEUED_EMAIL_LEASE_SECONDS', 300))
+    QueuedEmail.objects.filter(pk__in=candidate_ids, sent=False, failed=False).filter(_unclaimed(now)).update(
+        claimed_by=token,
+        lease_until=now + lease,
+    )
+    return list(QueuedEmail.objects.filter(pk__in=candidate_ids, claimed_by=token).order_by('created_at'))
+
+
+def deliver_ids(ids):
+    """Entrega los correos indicados que sigan pendientes. Devuelve cuántos se enviaron."""
+    return deliver_batch(claim(batch=len(ids), ids=ids))
+
+
+def process_queue(batch=None):
+    """Reserva y procesa un lote de la cola. Devuelve (enviados, procesados)."""
+    queued_list = claim(batch)
+    return deliver_batch(queued_list), len(queued_list)
+
+
+def next_delay(delay, processed, batch, min_sleep, max_sleep):
+    """Espera antes de la siguiente consulta a la cola.
+
+    Lote completo: seguir sin esperar. Lote parcial: volver a la espera mínima.
+    Cola vacía: duplicar la espera hasta `max_sleep`.
+    """
+    if processed >= batch:
+        return 0
+    if processed:
+        return min_sleep
+    return min(max_sleep, max(delay, min_sleep) * 2)
+
+
+def run_loop(stop, wake, batch=None, min_sleep=0.5, max_sleep=None):
+    """Bucle del worker de correos hasta que se active `stop`.
+
+    Espera entre consultas según `next_delay`; activar `wake` interrumpe la
+    espera (llegó un correo nuevo). `wake` es de este hilo: con varios hilos,
+    cada uno tiene el suyo (ver `listen_for_wakeups`), porque el primero que
+    despierta lo limpia.
+    """
+    batch = batch or _setting('QUEUED_EMAIL_BATCH', 10)
+    max_sleep = max_sleep or _setting('QUEUED_EMAIL_LOOP_SLEEP', 30)
+    delay = min_sleep
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            _, processed = process_queue(batch)
+        except Exception:
+            logger.exception('Error procesando la cola de correos')
+            processed = 0
+        delay = next_delay(delay, processed, batch, min_sleep, max_sleep)
+        if delay and wake.wait(delay):
+            wake.clear()
+            delay = min_sleep
+    close_old_connections()
+
+
+def listen_for_wakeups(stop, wakes, address=None):
+    """Escucha los avisos de `notify_worker` y activa todos los eventos de `wakes` con cada uno.
+
+    Si el puerto no está disponible (p.ej. otro worker ya lo usa) el worker
+    sigue funcionando solo con la consulta periódica.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.bind(address or wake_address())
+    except OSError as e:
+        logger.warning('No se pudo escuchar avisos en %s: %s; solo consulta periódica', address or wake_address(), e)
+        sock.close()
+        return
+    sock.settimeout(0.5)
+    with sock:
+        while not stop.is_set():
+            try:
+                sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError:
+                if stop.is_set():
+                    break
+                raise
+            for wake in wakes:
+                wake.set()
@@ -0,0 +1,158 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.management.base import BaseCommand
+
+from apps.reports import mail
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Sesión SMTP mínima que acepta y descarta todos los mensajes."""
+
+    def _reply(self, text):
+        self.wfile.write(text.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.handshake_delay:
+            # Simula el coste de TCP+TLS+AUTH de un servidor real
+            time.sleep(server.handshake_delay)
+        self._reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].decode('ascii', 'replace').upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-sink\r\n250 8BITMIME\r\n')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            elif verb in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            else:
+                self._reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Servidor SMTP local de prueba que cuenta conexiones y mensajes recibidos.
+
+    Uso: `with SMTPSink() as sink: ...` y conectar a `sink.host`, `sink.port`.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handshake_delay=0.0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.handshake_delay = handshake_delay
+        self.connections = 0
+        self.messages = 0
+        self.host, self.port = self.server_address
+        self._thread = threading.Thread(target=self.serve_forever, name='smtp-sink', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def get_connection(self):
+        return get_connection(
+            SMTP_BACKEND,
+            host=self.host,
+            port=self.port,
+            username='',
+            password='',
+            use_tls=False,
+            use_ssl=False,
+            fail_silently=False,
+        )
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.messages = 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento (mensajes/segundo) de la entrega de correos contra un servidor SMTP '
+        'local: una conexión por mensaje (antes) frente a una conexión por lote (ahora).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200, help='Mensajes a enviar por prueba (por defecto 200).')
+        parser.add_argument('--batch', type=int, default=10, help='Mensajes por lote/conexión (por defecto 10, como QUEUED_EMAIL_BATCH).')
+        parser.add_argument(
+            '--handshake-ms',
+            type=float,
+            default=0.0,
+            help='Retraso simulado al abrir cada conexión, para aproximar TLS+AUTH (por defecto 0).',
+        )
+
+    def handle(self, *args, **options):
+        total = options['messages']
+        batch = max(1, options['batch'])
+        messages = [self._message(i) for i in range(total)]
+        with SMTPSink(handshake_delay=options['handshake_ms'] / 1000.0) as sink:
+            resultados = [
+                ('una conexión por mensaje', self._per_message(sink, messages)),
+                (f'una conexión por lote ({batch})', self._pooled(sink, messages, batch)),
+            ]
+            self.stdout.write(f"{'modo':<32} {'mensajes':>9} {'conexiones':>11} {'segundos':>9} {'msg/s':>9}")
+            for nombre, (segundos, conexiones, recibidos) in resultados:
+                self.stdout.write(
+                    f'{nombre:<32} {recibidos:>9} {conexiones:>11} {segundos:>9.3f} {recibidos / segundos:>9.1f}'
+                )
+
+    @staticmethod
+    def _message(i):
+        msg = EmailMultiAlternatives(
+            f'Estado de su equipo EQ-{i}',
+            'Su equipo está listo para retirar.',
+            'no-reply@example.com',
+            [f'cliente{i}@example.com'],
+        )
+        msg.attach_alternative('<p>Su equipo está <b>listo</b> para retirar.</p>', 'text/html')
+        return msg
+
+    @staticmethod
+    def _per_message(sink, messages):
+        """Comportamiento anterior: cada `send()` abre y cierra su propia sesión SMTP."""
+        sink.reset()
+        inicio = time.perf_counter()
+        for msg in messages:
+            msg.connection = sink.get_connection()
+            msg.send(fail_silently=False)
+        return time.perf_counter() - inicio, sink.connections, sink.messages
+
+    @staticmethod
+    def _pooled(sink, messages, batch):
+        """Comportamiento actual del worker: `mail.send_each` sobre una conexión por lote."""
+        sink.reset()
+        inicio = time.perf_counter()
+        for start in range(0, len(messages), batch):
+            connection = sink.get_connection()
+            try:
+                for _, error in mail.send_each(connection, messages[start:start + batch]):
+                    if error is not None:
+                        raise error
+            finally:
+                connection.close()
+        return time.perf_counter() - inicio, sink.connections, sink.messages
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no hay contabilidad de CPU de procesos hijos
+    resource = None
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reports import video
+
+
+def _cpu_children():
+    """CPU (s) de los procesos hijos terminados, o None si el sistema no lo informa.
+
+    En Windows `os.times()` siempre devuelve 0 para los hijos, así que solo se
+    mide el tiempo real.
+    """
+    if resource is None:
+        return None
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara tiempo real y CPU del recorte por copia de flujos (-c copy) frente a la '
+        'recodificación con libx264 sobre clips de muestra.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('clips', nargs='*', help='Videos de muestra. Si no se indica ninguno se generan clips sintéticos.')
+        parser.add_argument('--seconds', type=int, default=20, help='Duración de los clips sintéticos (por defecto 20).')
+        parser.add_argument('--size', default='1280x720', help='Resolución de los clips sintéticos (por defecto 1280x720).')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por clip y método (se informa la mediana).')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='benchmark-video-')
+        try:
+            clips = options['clips'] or self._generate(workdir, options['seconds'], options['size'])
+            self.stdout.write(f"{'clip':<28} {'método':<10} {'real (s)':>9} {'cpu (s)':>9} {'tamaño (KB)':>12}")
+            for clip in clips:
+                if not os.path.exists(clip):
+                    raise CommandError(f'No existe el archivo {clip}')
+                info = video.probe(clip)
+                metodos = [('transcode', video.transcode)]
+                if video.can_stream_copy(info):
+                    metodos.insert(0, ('copy', video.stream_copy))
+                for nombre, funcion in metodos:
+                    real, cpu, size = self._measure(funcion, clip, workdir, options['repeat'])
+                    cpu = f'{cpu:>9.3f}' if cpu is not None else f"{'-':>9}"
+                    self.stdout.write(
+                        f'{os.path.basename(clip)[:28]:<28} {nombre:<10} {real:>9.3f} {cpu} {size / 1024:>12.1f}'
+                    )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _generate(self, workdir, seconds, size):
+        """Genera un clip H.264/AAC (candidato a copia) y otro MPEG-4 Part 2 (requiere recodificar)."""
+        clips = []
+        for nombre, codec in (('muestra_h264.mp4', 'libx264'), ('muestra_mpeg4.mp4', 'mpeg4')):
+            path = os.path.join(workdir, nombre)
+            video.run_ffmpeg([
+                '-f', 'lavfi', '-i', f'testsrc2=duration={seconds}:size={size}:rate=30',
+                '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+                '-c:v', codec, '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path,
+            ], timeout=600)
+            clips.append(path)
+        return clips
+
+    def _measure(self, funcion, clip, workdir, repeat):
+        reales, cpus = [], []
+        dst = os.path.join(workdir, 'salida.mp4')
+        for _ in range(max(1, repeat)):
+            if os.path.exists(dst):
+                os.remove(dst)
+            cpu_inicio = _cpu_children()
+            inicio = time.perf_counter()
+            funcion(clip, dst)
+            reales.append(time.perf_counter() - inicio)
+            if cpu_inicio is not None:
+                cpus.append(_cpu_children() - cpu_inicio)
+        reales.sort()
+        cpus.sort()
+        cpu = cpus[len(cpus) // 2] if cpus else None
+        return reales[len(reales) // 2], cpu, os.path.getsize(dst)
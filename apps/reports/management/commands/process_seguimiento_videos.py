@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports import video
+
+
+class Command(BaseCommand):
+    help = 'Procesa los videos de seguimiento que quedaron pendientes (p.ej. tras reiniciar el servidor).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--include-in-progress',
+            action='store_true',
+            help='Reintentar también los que quedaron marcados en proceso por un proceso interrumpido.',
+        )
+
+    def handle(self, *args, **options):
+        total = video.process_pending(include_in_progress=options['include_in_progress'])
+        self.stdout.write(self.style.SUCCESS(f'{total} videos procesados.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports import export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Elimina las exportaciones en segundo plano vencidas y sus archivos.'
+
+    def handle(self, *args, **options):
+        removed = export_jobs.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'{removed} exportaciones eliminadas.'))
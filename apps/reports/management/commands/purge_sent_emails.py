@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports import mail
+
+
+class Command(BaseCommand):
+    help = 'Elimina por lotes los correos ya enviados de la cola (QueuedEmail) más antiguos que el periodo de retención.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Días de retención de los correos enviados (por defecto QUEUED_EMAIL_RETENTION_DAYS, 30).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Filas eliminadas por transacción (por defecto 1000).')
+
+    def handle(self, *args, **options):
+        total = mail.purge_sent(days=options['days'], batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'{total} correos enviados eliminados.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports import search
+
+
+class Command(BaseCommand):
+    help = 'Regenera los documentos de búsqueda de todas las fichas y el índice del backend configurado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Fichas procesadas por lote (por defecto 500).')
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        backend.install()
+        total = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} fichas indexadas con {backend.__class__.__name__}.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.reports import rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenera la tabla de agregados diarios usada por el reporte de estadísticas.'
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} cubetas de estadísticas generadas.'))
@@ -0,0 +1,80 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.reports import mail
+
+
+class Command(BaseCommand):
+    help = (
+        'Entrega los correos de la cola (QueuedEmail). Consulta la cola con espera adaptativa '
+        'y se despierta al instante cuando la aplicación encola un correo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'QUEUED_EMAIL_WORKER_CONCURRENCY', 1),
+            help='Hilos de entrega en paralelo (por defecto 1).',
+        )
+        parser.add_argument('--batch', type=int, default=None, help='Correos por lote (por defecto QUEUED_EMAIL_BATCH).')
+        parser.add_argument('--min-sleep', type=float, default=0.5, help='Espera mínima entre consultas, en segundos.')
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=None,
+            help='Espera máxima con la cola vacía, en segundos (por defecto QUEUED_EMAIL_LOOP_SLEEP).',
+        )
+        parser.add_argument('--once', action='store_true', help='Vaciar la cola una vez y terminar.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = 0
+            while True:
+                sent, processed = mail.process_queue(options['batch'])
+                total += sent
+                if not processed:
+                    break
+            self.stdout.write(self.style.SUCCESS(f'{total} correos enviados.'))
+            return
+
+        stop = threading.Event()
+        # Un evento por hilo: el hilo que despierta limpia el suyo sin afectar a los demás
+        wakes = [threading.Event() for _ in range(max(1, options['concurrency']))]
+
+        def _shutdown(signum, frame):
+            self.stdout.write('Deteniendo el worker de correos (terminando el lote en curso)...')
+            stop.set()
+            for wake in wakes:
+                wake.set()
+
+        for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), _shutdown)
+
+        listener = threading.Thread(target=mail.listen_for_wakeups, args=(stop, wakes), name='email-worker-wake', daemon=True)
+        listener.start()
+        workers = [
+            threading.Thread(
+                target=mail.run_loop,
+                args=(stop, wake),
+                kwargs={'batch': options['batch'], 'min_sleep': options['min_sleep'], 'max_sleep': options['max_sleep']},
+                name=f'email-worker-{i}',
+            )
+            for i, wake in enumerate(wakes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker de correos iniciado ({len(workers)} hilos, avisos en {mail.wake_address()[0]}:{mail.wake_address()[1]}).'
+        ))
+        # El hilo principal solo espera la señal de parada para seguir atendiendo señales
+        while not stop.wait(0.5):
+            pass
+        for worker in workers:
+            worker.join()
+        listener.join(timeout=2)
+        self.stdout.write(self.style.SUCCESS('Worker de correos detenido.'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def instalar_indice(apps, schema_editor):
+    from apps.reports import search
+    search.get_backend().install(schema_editor)
+
+
+def desinstalar_indice(apps, schema_editor):
+    from apps.reports import search
+    search.get_backend().uninstall(schema_editor)
+
+
+def poblar_documentos(apps, schema_editor):
+    from apps.reports.search import build_document
+    FichaEntrada = apps.get_model('reports', 'FichaEntrada')
+    FichaSearchDocument = apps.get_model('reports', 'FichaSearchDocument')
+    fichas = FichaEntrada.objects.select_related('tecnico_asignado').iterator(chunk_size=500)
+    FichaSearchDocument.objects.bulk_create(
+        (FichaSearchDocument(ficha_id=f.pk, documento=build_document(f)) for f in fichas),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0009_queuedemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FichaSearchDocument',
+            fields=[
+                ('ficha', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='reports.fichaentrada', verbose_name='Ficha de Entrada')),
+                ('documento', models.TextField(blank=True, verbose_name='Documento de búsqueda')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda',
+                'verbose_name_plural': 'Documentos de búsqueda',
+            },
+        ),
+        migrations.RunPython(instalar_indice, desinstalar_indice),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0010_fichasearchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=40, verbose_name='Tipo de exportación')),
+                ('filtros', models.JSONField(blank=True, default=dict, verbose_name='Filtros')),
+                ('huella', models.CharField(db_index=True, max_length=64, verbose_name='Huella')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('progreso', models.PositiveSmallIntegerField(default=0, verbose_name='Progreso (%)')),
+                ('filas_procesadas', models.PositiveIntegerField(default=0, verbose_name='Filas procesadas')),
+                ('total_filas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total de filas')),
+                ('archivo', models.FileField(blank=True, upload_to='exports/', verbose_name='Archivo')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('iniciado', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finalizado', models.DateTimeField(blank=True, null=True, verbose_name='Finalizado')),
+                ('expira', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Expira')),
+                ('solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Solicitante')),
+            ],
+            options={
+                'verbose_name': 'Exportación en segundo plano',
+                'verbose_name_plural': 'Exportaciones en segundo plano',
+                'ordering': ['-creado'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ('pendiente', 'en_proceso'))), fields=('huella',), name='reports_exportjob_unique_active_huella')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_estadisticas(apps, schema_editor):
+    from apps.reports.rollups import rebuild
+    rebuild(apps.get_model('reports', 'FichaEntrada'), apps.get_model('reports', 'FichaEstadistica'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0011_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FichaEstadistica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('ubicacion', models.CharField(max_length=20, verbose_name='Ubicación')),
+                ('tipo_equipo', models.CharField(max_length=30, verbose_name='Tipo de Equipo')),
+                ('estado', models.CharField(max_length=20, verbose_name='Estado')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+                ('tecnico_asignado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Técnico Asignado')),
+            ],
+            options={
+                'verbose_name': 'Estadística diaria de fichas',
+                'verbose_name_plural': 'Estadísticas diarias de fichas',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'ubicacion', 'tipo_equipo', 'estado', 'tecnico_asignado'), name='reports_fichaestadistica_unique_bucket')],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
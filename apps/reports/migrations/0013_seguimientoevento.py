@@ -0,0 +1,108 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+CAMPOS_EVENTO = ('titulo', 'descripcion', 'estado', 'tecnico', 'autor', 'video', 'icono')
+LONGITUDES = {'titulo': 200, 'estado': 30, 'tecnico': 150, 'autor': 150, 'video': 500, 'icono': 50}
+
+
+def _parse_fecha(value, default):
+    fecha = parse_datetime(value) if isinstance(value, str) else None
+    if fecha is None:
+        return default
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _evento_desde_json(SeguimientoEvento, seguimiento, item):
+    extra = {k: v for k, v in item.items() if k not in CAMPOS_EVENTO + ('fecha', 'progreso')}
+    fecha = _parse_fecha(item.get('fecha'), None)
+    if fecha is None:
+        fecha = seguimiento.fecha_ingreso
+        if item.get('fecha'):
+            extra['fecha'] = item.get('fecha')
+    try:
+        progreso = int(item['progreso']) if item.get('progreso') is not None else None
+    except (TypeError, ValueError):
+        progreso = None
+        extra['progreso'] = item.get('progreso')
+    campos = {}
+    for name in CAMPOS_EVENTO:
+        value = item.get(name)
+        campos[name] = str(value)[:LONGITUDES.get(name)] if value is not None else ''
+    return SeguimientoEvento(seguimiento=seguimiento, fecha=fecha, progreso=progreso, extra=extra, **campos)
+
+
+def migrar_timeline(apps, schema_editor):
+    Seguimiento = apps.get_model('reports', 'Seguimiento')
+    SeguimientoEvento = apps.get_model('reports', 'SeguimientoEvento')
+    eventos = []
+    for seguimiento in Seguimiento.objects.order_by('pk').iterator(chunk_size=500):
+        for item in seguimiento.timeline or []:
+            if isinstance(item, dict):
+                eventos.append(_evento_desde_json(SeguimientoEvento, seguimiento, item))
+        if len(eventos) >= 1000:
+            SeguimientoEvento.objects.bulk_create(eventos)
+            eventos = []
+    if eventos:
+        SeguimientoEvento.objects.bulk_create(eventos)
+
+
+def restaurar_timeline(apps, schema_editor):
+    Seguimiento = apps.get_model('reports', 'Seguimiento')
+    SeguimientoEvento = apps.get_model('reports', 'SeguimientoEvento')
+    for seguimiento in Seguimiento.objects.order_by('pk').iterator(chunk_size=500):
+        timeline = []
+        for evento in SeguimientoEvento.objects.filter(seguimiento=seguimiento).order_by('fecha', 'id'):
+            item = dict(evento.extra or {})
+            item.update({name: getattr(evento, name) for name in CAMPOS_EVENTO if getattr(evento, name)})
+            item['fecha'] = evento.fecha.isoformat()
+            if evento.progreso is not None:
+                item['progreso'] = evento.progreso
+            timeline.append(item)
+        if timeline:
+            seguimiento.timeline = timeline
+            seguimiento.save(update_fields=['timeline'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0012_fichaestadistica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeguimientoEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('titulo', models.CharField(blank=True, max_length=200, verbose_name='Título')),
+                ('descripcion', models.TextField(blank=True, verbose_name='Descripción')),
+                ('estado', models.CharField(blank=True, max_length=30, verbose_name='Estado')),
+                ('progreso', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Progreso (%)')),
+                ('tecnico', models.CharField(blank=True, max_length=150, verbose_name='Técnico')),
+                ('autor', models.CharField(blank=True, max_length=150, verbose_name='Autor')),
+                ('video', models.CharField(blank=True, max_length=500, verbose_name='Video')),
+                ('icono', models.CharField(blank=True, max_length=50, verbose_name='Icono')),
+                ('extra', models.JSONField(blank=True, default=dict, verbose_name='Datos adicionales')),
+                ('seguimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='reports.seguimiento', verbose_name='Seguimiento')),
+            ],
+            options={
+                'verbose_name': 'Evento de seguimiento',
+                'verbose_name_plural': 'Eventos de seguimiento',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['seguimiento', 'fecha'], name='reports_segevento_fecha_idx'), models.Index(fields=['seguimiento', 'estado'], name='reports_segevento_estado_idx')],
+            },
+        ),
+        migrations.RunPython(migrar_timeline, restaurar_timeline),
+        migrations.RemoveField(
+            model_name='seguimiento',
+            name='timeline',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0013_seguimientoevento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seguimientoevento',
+            name='poster',
+            field=models.CharField(blank=True, max_length=500, verbose_name='Miniatura del video'),
+        ),
+        migrations.AddField(
+            model_name='seguimientoevento',
+            name='video_error',
+            field=models.TextField(blank=True, verbose_name='Error del video'),
+        ),
+        migrations.AddField(
+            model_name='seguimientoevento',
+            name='video_estado',
+            field=models.CharField(blank=True, choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('listo', 'Listo'), ('error', 'Error')], max_length=20, verbose_name='Estado del video'),
+        ),
+        migrations.AddField(
+            model_name='seguimientoevento',
+            name='video_origen',
+            field=models.CharField(blank=True, max_length=500, verbose_name='Video original'),
+        ),
+    ]
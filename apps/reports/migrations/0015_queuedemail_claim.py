@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0014_seguimientoevento_video'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedemail',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Reservado por'),
+        ),
+        migrations.AddField(
+            model_name='queuedemail',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado hasta'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedemail',
+            index=models.Index(fields=['sent', 'send_after', 'created_at'], name='reports_qemail_poll_idx'),
+        ),
+    ]
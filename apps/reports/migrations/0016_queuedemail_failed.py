@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def marcar_agotados(apps, schema_editor):
+    # Los correos que ya agotaron los reintentos pasan al estado terminal
+    QueuedEmail = apps.get_model('reports', 'QueuedEmail')
+    max_attempts = getattr(settings, 'QUEUED_EMAIL_MAX_ATTEMPTS', 6)
+    QueuedEmail.objects.filter(sent=False, attempts__gte=max_attempts).update(
+        failed=True,
+        failed_at=timezone.now(),
+        send_after=None,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0015_queuedemail_claim'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='queuedemail',
+            name='reports_qemail_poll_idx',
+        ),
+        migrations.AddField(
+            model_name='queuedemail',
+            name='failed',
+            field=models.BooleanField(default=False, verbose_name='Fallido'),
+        ),
+        migrations.AddField(
+            model_name='queuedemail',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de fallo'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedemail',
+            index=models.Index(condition=models.Q(('failed', False), ('sent', False)), fields=['send_after', 'created_at'], name='reports_qemail_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedemail',
+            index=models.Index(fields=['sent', 'sent_at'], name='reports_qemail_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuedemail',
+            index=models.Index(fields=['failed', 'failed_at'], name='reports_qemail_failed_idx'),
+        ),
+        migrations.RunPython(marcar_agotados, migrations.RunPython.noop),
+    ]
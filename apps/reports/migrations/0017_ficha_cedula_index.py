@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0016_queuedemail_failed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fichaentrada',
+            index=models.Index(fields=['cedula_cliente', 'fecha_creacion'], name='reports_ficha_cedula_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seguimiento',
+            index=models.Index(fields=['ficha', '-fecha_ingreso'], name='reports_seguimiento_ult_idx'),
+        ),
+    ]
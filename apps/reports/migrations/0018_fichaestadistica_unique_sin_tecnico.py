@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def regenerar_estadisticas(apps, schema_editor):
+    # Regenerar fusiona las cubetas sin técnico duplicadas antes de la restricción
+    from apps.reports.rollups import rebuild
+    rebuild(apps.get_model('reports', 'FichaEntrada'), apps.get_model('reports', 'FichaEstadistica'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0017_ficha_cedula_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(regenerar_estadisticas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='fichaestadistica',
+            constraint=models.UniqueConstraint(condition=models.Q(('tecnico_asignado__isnull', True)), fields=('fecha', 'ubicacion', 'tipo_equipo', 'estado'), name='reports_fichaestadistica_unique_sin_tecnico'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def regenerar_documentos(apps, schema_editor):
+    # Los documentos pasan a guardarse tokenizados (sin signos), como las búsquedas
+    from apps.reports.search import build_document
+    FichaEntrada = apps.get_model('reports', 'FichaEntrada')
+    FichaSearchDocument = apps.get_model('reports', 'FichaSearchDocument')
+    FichaSearchDocument.objects.all().delete()
+    fichas = FichaEntrada.objects.select_related('tecnico_asignado').iterator(chunk_size=500)
+    FichaSearchDocument.objects.bulk_create(
+        (FichaSearchDocument(ficha_id=f.pk, documento=build_document(f)) for f in fichas),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0018_fichaestadistica_unique_sin_tecnico'),
+    ]
+
+    operations = [
+        migrations.RunPython(regenerar_documentos, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 CustomUser = get_user_model()
 
@@ -93,6 +94,13 @@ class FichaEntrada(models.Model):
             related_name='fichas_asignadas',
             verbose_name="Técnico Asignado"
         )
+
+    class Meta:
+        indexes = [
+            # Consulta pública de equipos por cédula (timelines_by_cedula)
+            models.Index(fields=["cedula_cliente", "fecha_creacion"], name="reports_ficha_cedula_idx"),
+        ]
+
     def __str__(self):
         # Mostrar el tipo de equipo personalizado si existe
         tipo = self.get_tipo_equipo_display()
@@ -104,8 +112,9 @@ class FichaEntrada(models.Model):
 class Seguimiento(models.Model):
     """Modelo para llevar el seguimiento / reporte del equipo relacionado con una FichaEntrada.
 
-    Se utiliza un JSONField llamado `timeline` para almacenar una lista de eventos
-    (fecha, título, descripción, estado, icono), tal como en el ejemplo provisto.
+    Los eventos del timeline (fecha, título, descripción, estado, icono...) se
+    guardan como filas de `SeguimientoEvento`; la propiedad `timeline` los
+    devuelve como la lista de diccionarios que antes se almacenaba en JSON.
     """
     ESTADO_CHOICES = [
         ("recepcion", "Recepción"),
@@ -136,26 +145,6 @@ class Seguimiento(models.Model):
         verbose_name="Técnico asignado",
     )
     descripcion = models.TextField("Descripción general", blank=True)
-    # Usamos JSONField para guardar el timeline como una lista de objetos
-    timeline = models.JSONField("Timeline", default=list, blank=True)
-    # Ejemplo de como se guardaria en el timeline:
-    # [
-    #     {
-    #         "fecha": "2025-10-01T10:00:00",
-    #         "titulo": "Equipo Recibido",
-    #         "descripcion": "El equipo ha sido recibido en el taller.",
-    #         "estado": "completed",
-    #         "icono": "check-circle"
-    #     },
-    #     {
-    #         "fecha": "2025-10-02T14:30:00",
-    #         "titulo": "Diagnóstico Realizado",
-    #         "descripcion": "Se ha completado el diagnóstico y se identificaron los problemas.",
-    #         "estado": "completed",
-    #         "icono": "stethoscope"
-    #     },
-    #     ...
-    # ]                     
     # Video opcional subido junto al seguimiento. Se recortará a los primeros 10 segundos al guardarse.
     video = models.FileField(
         "Video (opcional)",
@@ -169,28 +158,113 @@ class Seguimiento(models.Model):
         verbose_name = "Seguimiento"
         verbose_name_plural = "Seguimientos"
         ordering = ["-fecha_ingreso"]
+        indexes = [
+            # Último seguimiento de cada ficha
+            models.Index(fields=["ficha", "-fecha_ingreso"], name="reports_seguimiento_ult_idx"),
+        ]
 
     def __str__(self):
         codigo = self.ficha.codigo if self.ficha else "-"
         return f"Seguimiento {codigo} - {self.get_estado_display()} ({self.progreso}%)"
 
+    @property
+    def timeline(self):
+        """Eventos en el formato de la antigua lista JSON (ver `SeguimientoEvento.as_timeline_dict`)."""
+        return [evento.as_timeline_dict() for evento in self.eventos.all()]
+
     def add_event(self, fecha, titulo, descripcion, estado="pending", icono=""):
-        """Conveniencia para añadir un evento al timeline y guardar el modelo."""
-        evento = {
-            "fecha": fecha,
-            "titulo": titulo,
-            "descripcion": descripcion,
-            "estado": estado,
-            "icono": icono,
-        }
-        timeline = list(self.timeline or [])
-        timeline.append(evento)
-        self.timeline = timeline
-        self.save()
+        """Conveniencia para añadir un evento al timeline."""
+        return SeguimientoEvento.objects.create(
+            seguimiento=self,
+            fecha=fecha,
+            titulo=titulo,
+            descripcion=descripcion,
+            estado=estado,
+            icono=icono,
+        )
+
+
+class SeguimientoEvento(models.Model):
+    """Evento del timeline de un `Seguimiento`.
+
+    Añadir un evento es un INSERT y comprobar si un estado ya fue usado es un
+    EXISTS sobre el índice (seguimiento, estado), sin leer el timeline completo.
+    Las claves desconocidas de los eventos migrados desde la lista JSON se
+    conservan en `extra`.
+
+    Si el evento trae video, el archivo subido se guarda en `video_origen` y un
+    pool de trabajo (ver `video.py`) lo recorta y convierte a H.264; al terminar
+    `video` apunta al archivo convertido y `poster` a su miniatura.
+    """
+    VIDEO_PENDIENTE = 'pendiente'
+    VIDEO_EN_PROCESO = 'en_proceso'
+    VIDEO_LISTO = 'listo'
+    VIDEO_ERROR = 'error'
+    VIDEO_ESTADO_CHOICES = [
+        (VIDEO_PENDIENTE, "Pendiente"),
+        (VIDEO_EN_PROCESO, "En proceso"),
+        (VIDEO_LISTO, "Listo"),
+        (VIDEO_ERROR, "Error"),
+    ]
+
+    seguimiento = models.ForeignKey(
+        Seguimiento,
+        on_delete=models.CASCADE,
+        related_name="eventos",
+        verbose_name="Seguimiento",
+    )
+    fecha = models.DateTimeField("Fecha", default=timezone.now)
+    titulo = models.CharField("Título", max_length=200, blank=True)
+    descripcion = models.TextField("Descripción", blank=True)
+    estado = models.CharField("Estado", max_length=30, blank=True)
+    progreso = models.PositiveSmallIntegerField("Progreso (%)", null=True, blank=True)
+    tecnico = models.CharField("Técnico", max_length=150, blank=True)
+    autor = models.CharField("Autor", max_length=150, blank=True)
+    video = models.CharField("Video", max_length=500, blank=True)
+    icono = models.CharField("Icono", max_length=50, blank=True)
+    # Ruta en el storage del video tal como se subió, pendiente de procesar
+    video_origen = models.CharField("Video original", max_length=500, blank=True)
+    video_estado = models.CharField("Estado del video", max_length=20, choices=VIDEO_ESTADO_CHOICES, blank=True)
+    poster = models.CharField("Miniatura del video", max_length=500, blank=True)
+    video_error = models.TextField("Error del video", blank=True)
+    extra = models.JSONField("Datos adicionales", default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "Evento de seguimiento"
+        verbose_name_plural = "Eventos de seguimiento"
+        ordering = ["fecha", "id"]
+        indexes = [
+            models.Index(fields=["seguimiento", "fecha"], name="reports_segevento_fecha_idx"),
+            models.Index(fields=["seguimiento", "estado"], name="reports_segevento_estado_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.seguimiento_id} - {self.titulo or self.estado} ({self.fecha})"
+
+    def as_timeline_dict(self):
+        """Serializa el evento con las mismas claves que tenía en la lista JSON `timeline`."""
+        data = dict(self.extra or {})
+        data.update({
+            "fecha": self.fecha.isoformat() if self.fecha else None,
+            "titulo": self.titulo,
+            "descripcion": self.descripcion,
+            "estado": self.estado,
+            "progreso": self.progreso,
+            "tecnico": self.tecnico,
+            "autor": self.autor,
+            "video": self.video or None,
+        })
+        if self.icono:
+            data["icono"] = self.icono
+        if self.video_estado:
+            data["video_estado"] = self.video_estado
+            data["poster"] = self.poster or None
+        return data
 
 
 class QueuedEmail(models.Model):
-    """Modelo simple para encolar correos a reenviar en background si el envío directo falla.
+    """Bandeja de salida de correos: todo correo transaccional se guarda aquí y se
+    entrega en background (ver `mail.py`), reintentando los envíos fallidos.
 
     Campos:
     - to: lista de destinatarios (JSON)
@@ -202,6 +276,10 @@ class QueuedEmail(models.Model):
     - send_after: datetime opcional para esperar antes de reintentar
     - sent: si ya se envió
     - sent_at: datetime de envío
+    - claimed_by / lease_until: worker que tiene reservado el correo y hasta
+      cuándo; una reserva vencida puede volver a tomarla otro worker
+    - failed / failed_at: agotó los reintentos (`QUEUED_EMAIL_MAX_ATTEMPTS`); queda
+      en la bandeja de correos fallidos hasta que se reintente manualmente
     """
     to = models.JSONField("Destinatarios", default=list)
     subject = models.CharField("Asunto", max_length=255)
@@ -213,11 +291,152 @@ class QueuedEmail(models.Model):
     sent = models.BooleanField("Enviado", default=False)
     sent_at = models.DateTimeField("Fecha de envío", null=True, blank=True)
     created_at = models.DateTimeField("Creado en", auto_now_add=True)
+    claimed_by = models.CharField("Reservado por", max_length=100, blank=True)
+    lease_until = models.DateTimeField("Reservado hasta", null=True, blank=True)
+    failed = models.BooleanField("Fallido", default=False)
+    failed_at = models.DateTimeField("Fecha de fallo", null=True, blank=True)
 
     class Meta:
         verbose_name = "Correo en cola"
         verbose_name_plural = "Correos en cola"
+        indexes = [
+            # Índice parcial: solo contiene los correos pendientes, así que la consulta
+            # del worker no crece con el histórico de enviados y fallidos
+            models.Index(
+                fields=["send_after", "created_at"],
+                condition=models.Q(sent=False, failed=False),
+                name="reports_qemail_pending_idx",
+            ),
+            models.Index(fields=["sent", "sent_at"], name="reports_qemail_sent_idx"),
+            models.Index(fields=["failed", "failed_at"], name="reports_qemail_failed_idx"),
+        ]
 
     def __str__(self):
-        return f"QueuedEmail to={','.join(self.to or [])} sent={self.sent} attempts={self.attempts}"
+        return f"QueuedEmail to={','.join(self.to or [])} sent={self.sent} failed={self.failed} attempts={self.attempts}"
         
+
+
+class FichaSearchDocument(models.Model):
+    """Documento de búsqueda desnormalizado por ficha.
+
+    Contiene en una sola columna el texto normalizado (minúsculas y sin acentos)
+    de todos los campos buscables de la ficha. Se mantiene sincronizado desde las
+    señales de `FichaEntrada` (ver `apps.reports.signals`) y es la fuente para
+    el índice FTS5 en SQLite o para el backend genérico en otras bases de datos.
+    """
+    ficha = models.OneToOneField(
+        FichaEntrada,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+        verbose_name="Ficha de Entrada",
+    )
+    documento = models.TextField("Documento de búsqueda", blank=True)
+    actualizado = models.DateTimeField("Actualizado", auto_now=True)
+
+    class Meta:
+        verbose_name = "Documento de búsqueda"
+        verbose_name_plural = "Documentos de búsqueda"
+
+    def __str__(self):
+        return f"SearchDocument ficha={self.ficha_id}"
+
+
+class ExportJob(models.Model):
+    """Exportación solicitada para generarse en segundo plano (ver `export_jobs.py`).
+
+    El archivo resultante se guarda en `MEDIA_ROOT/exports/` y se puede descargar
+    hasta la fecha `expira`; después se elimina junto con el registro.
+    """
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_EN_PROCESO = 'en_proceso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_EN_PROCESO, "En proceso"),
+        (ESTADO_COMPLETADO, "Completado"),
+        (ESTADO_ERROR, "Error"),
+    ]
+    ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_PROCESO)
+
+    tipo = models.CharField("Tipo de exportación", max_length=40)
+    filtros = models.JSONField("Filtros", default=dict, blank=True)
+    solicitante = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        verbose_name="Solicitante",
+    )
+    # Hash de (tipo, filtros, solicitante) para deduplicar solicitudes idénticas
+    huella = models.CharField("Huella", max_length=64, db_index=True)
+    estado = models.CharField("Estado", max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    progreso = models.PositiveSmallIntegerField("Progreso (%)", default=0)
+    filas_procesadas = models.PositiveIntegerField("Filas procesadas", default=0)
+    total_filas = models.PositiveIntegerField("Total de filas", null=True, blank=True)
+    archivo = models.FileField("Archivo", upload_to='exports/', blank=True)
+    error = models.TextField("Error", blank=True)
+    creado = models.DateTimeField("Creado", auto_now_add=True)
+    iniciado = models.DateTimeField("Iniciado", null=True, blank=True)
+    finalizado = models.DateTimeField("Finalizado", null=True, blank=True)
+    expira = models.DateTimeField("Expira", null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Exportación en segundo plano"
+        verbose_name_plural = "Exportaciones en segundo plano"
+        ordering = ["-creado"]
+        constraints = [
+            # Solo puede haber un trabajo activo por huella: las solicitudes
+            # concurrentes idénticas reutilizan el existente
+            models.UniqueConstraint(
+                fields=["huella"],
+                condition=models.Q(estado__in=("pendiente", "en_proceso")),
+                name="reports_exportjob_unique_active_huella",
+            ),
+        ]
+
+    def __str__(self):
+        return f"ExportJob {self.pk} {self.tipo} ({self.estado} {self.progreso}%)"
+
+
+class FichaEstadistica(models.Model):
+    """Tabla de agregados diarios de fichas para `reporte_estadisticas`.
+
+    Cada fila cuenta las fichas creadas un día (hora local) con una combinación de
+    ubicación, tipo de equipo, estado y técnico asignado. Se mantiene de forma
+    incremental desde las señales de `FichaEntrada` (ver `rollups.py`) y se puede
+    regenerar con `manage.py rebuild_statistics`. Los nombres de campos coinciden
+    con los de `FichaEntrada` para poder agrupar con las mismas claves.
+    """
+    fecha = models.DateField("Fecha")
+    ubicacion = models.CharField("Ubicación", max_length=20)
+    tipo_equipo = models.CharField("Tipo de Equipo", max_length=30)
+    estado = models.CharField("Estado", max_length=20)
+    tecnico_asignado = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Técnico Asignado",
+    )
+    total = models.PositiveIntegerField("Total", default=0)
+
+    class Meta:
+        verbose_name = "Estadística diaria de fichas"
+        verbose_name_plural = "Estadísticas diarias de fichas"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fecha", "ubicacion", "tipo_equipo", "estado", "tecnico_asignado"],
+                name="reports_fichaestadistica_unique_bucket",
+            ),
+            # Los NULL no chocan en la restricción anterior: cubeta sin técnico aparte
+            models.UniqueConstraint(
+                fields=["fecha", "ubicacion", "tipo_equipo", "estado"],
+                condition=models.Q(tecnico_asignado__isnull=True),
+                name="reports_fichaestadistica_unique_sin_tecnico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.ubicacion}/{self.tipo_equipo}/{self.estado} tecnico={self.tecnico_asignado_id}: {self.total}"
@@ -0,0 +1,116 @@
+"""Paginación por cursor (keyset) para listados grandes.
+
+En lugar de `OFFSET`, cada página continúa a partir de los valores de ordenación
+de la última fila entregada, por lo que el coste de pedir una página no depende
+de cuántas filas haya antes. El cursor es un token opaco (base64 de JSON) que el
+cliente devuelve tal cual para pedir la página siguiente.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no es válido para el ordenamiento del listado."""
+
+
+def _dump_value(value):
+    # isoformat conserva los microsegundos, necesarios para comparar por igualdad
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _load_value(value, field):
+    if isinstance(value, dict):
+        if set(value) != {'dt'} or not isinstance(value['dt'], str):
+            raise InvalidCursor('Valor inválido en el cursor.')
+        try:
+            value = parse_datetime(value['dt'])
+        except ValueError:
+            value = None
+        if value is None:
+            raise InvalidCursor('Fecha inválida en el cursor.')
+    elif value is None or isinstance(value, (list, bool)):
+        raise InvalidCursor('Valor inválido en el cursor.')
+    if field is None:
+        return value
+    # Validar contra el campo de la clave: un cursor manipulado no debe llegar a la consulta
+    try:
+        return field.to_python(value)
+    except (TypeError, ValueError, ValidationError):
+        raise InvalidCursor('Valor inválido en el cursor.')
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, fields):
+    """Valores del cursor, validados con `fields` (un campo, o None, por clave)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor('Cursor mal formado.')
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor('Cursor no corresponde al ordenamiento del listado.')
+    return [_load_value(v, field) for v, field in zip(values, fields)]
+
+
+def _key_field(queryset, name):
+    """Campo del modelo o de la anotación `name` del queryset (None si no se conoce)."""
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        annotation = queryset.query.annotations.get(name)
+        return getattr(annotation, 'output_field', None) if annotation is not None else None
+
+
+def _after(keys, values):
+    """Condición `(k1, k2, ...) > (v1, v2, ...)` respetando la dirección de cada clave."""
+    condition = Q()
+    for i, (field, descending) in enumerate(keys):
+        branch = Q(**{name: value for (name, _), value in zip(keys[:i], values[:i])})
+        lookup = 'lt' if descending else 'gt'
+        branch &= Q(**{f'{field}__{lookup}': values[i]})
+        condition |= branch
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_paginate(queryset, keys, cursor=None, page_size=50, fields=()):
+    """Devuelve una `KeysetPage` del queryset proyectado con `values(*fields)`.
+
+    - keys: lista de tuplas (campo, descendente) que define un orden total; la
+      última clave debe ser única (normalmente `id`).
+    - cursor: token devuelto como `next_cursor` por la página anterior.
+    - fields: campos a proyectar; las claves de ordenación se añaden siempre.
+    """
+    key_names = [name for name, _ in keys]
+    queryset = queryset.order_by(*[f'-{name}' if desc else name for name, desc in keys])
+    if cursor:
+        key_fields = [_key_field(queryset, name) for name in key_names]
+        queryset = queryset.filter(_after(keys, decode_cursor(cursor, key_fields)))
+    projection = list(fields) + [name for name in key_names if name not in fields]
+    rows = list(queryset.values(*projection)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1][name] for name in key_names])
+    return KeysetPage(rows, next_cursor)
@@ -0,0 +1,171 @@
+"""Motor de reportes PDF tabulares por páginas.
+
+En lugar de una única `Table` de reportlab con todas las filas (cuyo cálculo de
+diseño crece más que linealmente con el número de filas), cada página es una
+tabla pequeña de tamaño fijo que se dibuja directamente sobre el canvas y se
+cierra con `showPage()`. Los anchos de columna, el alto de fila y el estilo se
+calculan una sola vez; las celdas se recortan a una línea para que todas las
+páginas tengan exactamente `rows_per_page` filas. El costo es lineal en filas y
+las filas se consumen del iterable a medida que se dibujan.
+
+`max_rows` limita el número de filas; si hay más, el documento termina con una
+página de resumen que pide acotar los filtros. `pdf_response` genera el PDF en
+un archivo temporal y lo devuelve con `FileResponse`, que lo envía por bloques.
+
+reportlab es opcional: `available()` indica si está instalado.
+"""
+import itertools
+import tempfile
+
+from django.http import FileResponse
+from django.utils import timezone
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Table, TableStyle
+except ImportError:  # pragma: no cover - dependencia opcional
+    canvas = None
+
+FONT = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+FONT_SIZE = 8
+ROW_HEIGHT = 14
+MARGIN = 20
+# Espacio reservado arriba de la tabla para el título y abajo para el pie
+HEADER_SPACE = 28
+FOOTER_SPACE = 18
+
+
+def available():
+    return canvas is not None
+
+
+def _fit(text, width, font=FONT, size=FONT_SIZE):
+    """Recorta `text` con '…' para que quepa en `width` puntos en una línea."""
+    text = ' '.join(str(text if text is not None else '').split())
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + '…', font, size) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+class TablePDF:
+    """Escribe en `out` un reporte tabular de `headers` con una tabla por página.
+
+    - col_weights: peso relativo de cada columna (por defecto, iguales).
+    - max_rows: máximo de filas a incluir (None = sin límite).
+    """
+
+    def __init__(self, out, title, headers, col_weights=None, pagesize=None, max_rows=None):
+        self.out = out
+        self.title = title
+        self.headers = list(headers)
+        self.pagesize = pagesize or landscape(letter)
+        self.max_rows = max_rows
+        page_width, page_height = self.pagesize
+        weights = col_weights or [1] * len(self.headers)
+        usable = page_width - 2 * MARGIN
+        self.col_widths = [usable * w / sum(weights) for w in weights]
+        # Ancho de texto por celda descontando el relleno de la tabla (6 pt por lado)
+        self._text_widths = [max(1, w - 12) for w in self.col_widths]
+        self.rows_per_page = max(1, int((page_height - 2 * MARGIN - HEADER_SPACE - FOOTER_SPACE) // ROW_HEIGHT) - 1)
+        self._header_row = [_fit(h, tw, FONT_BOLD) for h, tw in zip(self.headers, self._text_widths)]
+        self._style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E6DA4')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('FONTNAME', (0, 1), (-1, -1), FONT),
+            ('FONTSIZE', (0, 0), (-1, -1), FONT_SIZE),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ])
+        self._generated = timezone.localtime().strftime('%Y-%m-%d %H:%M')
+
+    def _page_frame(self, c, page):
+        width, height = self.pagesize
+        c.setFont(FONT_BOLD, 12)
+        c.drawString(MARGIN, height - MARGIN - 12, self.title)
+        c.setFont(FONT, FONT_SIZE)
+        c.drawRightString(width - MARGIN, height - MARGIN - 12, f'Generado: {self._generated}')
+        c.drawRightString(width - MARGIN, MARGIN, f'Página {page}')
+
+    def _draw_table(self, c, rows):
+        data = [self._header_row] + [
+            [_fit(value, tw) for value, tw in zip(row, self._text_widths)]
+            for row in rows
+        ]
+        table = Table(data, colWidths=self.col_widths, rowHeights=ROW_HEIGHT)
+        table.setStyle(self._style)
+        _, table_height = table.wrapOn(c, *self.pagesize)
+        table.drawOn(c, MARGIN, self.pagesize[1] - MARGIN - HEADER_SPACE - table_height)
+
+    def _draw_summary(self, c, written, total):
+        width, height = self.pagesize
+        y = height - MARGIN - HEADER_SPACE - 20
+        c.setFont(FONT_BOLD, 14)
+        c.drawString(MARGIN, y, 'Reporte truncado')
+        c.setFont(FONT, 11)
+        detalle = f'Se incluyeron las primeras {written} filas'
+        detalle += f' de un total de {total}.' if total is not None else '; hay más resultados.'
+        c.drawString(MARGIN, y - 24, detalle)
+        c.drawString(MARGIN, y - 42, 'Acota los filtros (rango de fechas, usuario o acción) o usa la exportación CSV/Excel')
+        c.drawString(MARGIN, y - 58, 'para obtener el listado completo.')
+
+    def write(self, rows, total=None):
+        """Dibuja `rows` (iterable de secuencias) y guarda el PDF. Devuelve las filas escritas.
+
+        `total` (número o función que lo calcula) solo se usa en la página de
+        resumen, así que una función solo se llama si hubo truncamiento.
+        """
+        c = canvas.Canvas(self.out, pagesize=self.pagesize, pageCompression=1)
+        c.setTitle(self.title)
+        rows = iter(rows)
+        if self.max_rows is not None:
+            # Una fila más que el límite para saber si hubo truncamiento
+            rows = itertools.islice(rows, self.max_rows + 1)
+        written = 0
+        page = 0
+        truncated = False
+        while True:
+            limit = self.rows_per_page
+            if self.max_rows is not None:
+                limit = min(limit, self.max_rows - written)
+            chunk = list(itertools.islice(rows, limit)) if limit > 0 else []
+            if self.max_rows is not None and written + len(chunk) >= self.max_rows and next(rows, None) is not None:
+                truncated = True
+            if not chunk and page:
+                break
+            page += 1
+            self._page_frame(c, page)
+            self._draw_table(c, chunk)
+            c.showPage()
+            written += len(chunk)
+            if truncated or len(chunk) < limit:
+                break
+        if truncated:
+            page += 1
+            self._page_frame(c, page)
+            self._draw_summary(c, written, total() if callable(total) else total)
+            c.showPage()
+        c.save()
+        return written
+
+
+def pdf_response(filename, write):
+    """`FileResponse` con el PDF que `write(fileobj)` escribe en un archivo temporal.
+
+    El archivo temporal es anónimo: desaparece al cerrarse cuando termina la respuesta.
+    """
+    tmp = tempfile.TemporaryFile(suffix='.pdf')
+    try:
+        write(tmp)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type='application/pdf')
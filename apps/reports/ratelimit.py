@@ -0,0 +1,80 @@
+"""Limitación de frecuencia (token bucket) para endpoints públicos.
+
+Cada cubeta tiene `capacity` fichas y se rellena a `rate` fichas por segundo;
+cada petición consume una ficha y, si no queda ninguna, se rechaza indicando en
+cuántos segundos habrá otra disponible (`Retry-After`).
+
+El estado `(fichas, instante)` de cada clave vive en la caché de Django
+(`RATELIMIT_CACHE`, por defecto 'default', que es la caché local en memoria del
+proceso), así que lo comparten todos los hilos de waitress. La lectura y
+escritura de cada cubeta se hace bajo un lock del proceso; con una caché
+compartida entre procesos el límite sigue siendo aproximado, no exacto.
+
+`stats()` devuelve los contadores de peticiones permitidas y rechazadas por
+cubeta desde que arrancó el proceso, para monitoreo.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def _cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+class TokenBucket:
+    """Cubeta de `capacity` fichas que se rellena a `rate` fichas por segundo."""
+
+    def __init__(self, name, capacity, rate):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+
+    def _key(self, key):
+        return 'ratelimit:%s:%s' % (self.name, hashlib.sha1(str(key).encode('utf-8')).hexdigest())
+
+    def consume(self, key, now=None):
+        """Consume una ficha de la cubeta de `key`.
+
+        Devuelve `(permitido, retry_after)`, donde `retry_after` son los segundos
+        (enteros, redondeados hacia arriba) hasta que haya una ficha disponible.
+        """
+        now = time.time() if now is None else now
+        cache_key = self._key(key)
+        # Tiempo en que una cubeta vacía vuelve a estar llena: pasado ese plazo
+        # la entrada se puede descartar porque equivale a una cubeta nueva.
+        ttl = max(1, math.ceil(self.capacity / self.rate)) if self.rate > 0 else None
+        with _lock:
+            tokens, last = _cache().get(cache_key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + max(0.0, now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            _cache().set(cache_key, (tokens, now), ttl)
+            counters = _counters.setdefault(self.name, {'allowed': 0, 'limited': 0})
+            counters['allowed' if allowed else 'limited'] += 1
+        if allowed:
+            return True, 0
+        retry_after = math.ceil((1 - tokens) / self.rate) if self.rate > 0 else 60
+        return False, max(1, retry_after)
+
+
+def stats():
+    """Contadores `{cubeta: {'allowed': n, 'limited': n}}` de este proceso."""
+    with _lock:
+        return {name: dict(values) for name, values in _counters.items()}
+
+
+def reset_stats():
+    with _lock:
+        _counters.clear()
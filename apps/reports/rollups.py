@@ -0,0 +1,102 @@
+"""Agregados diarios de fichas (`FichaEstadistica`).
+
+`reporte_estadisticas` sin búsqueda lee de esta tabla, cuyo tamaño depende del
+número de combinaciones día × ubicación × tipo × estado × técnico y no del
+número de fichas. Las señales de `FichaEntrada` llaman a `apply_change` con la
+clave anterior y la nueva de cada ficha para mover su conteo de cubeta.
+
+Las cubetas sin técnico tienen su propia restricción única parcial (en SQLite los
+NULL no chocan en una restricción única normal). Al borrar un técnico, sus
+fichas quedan sin técnico (SET_NULL), así que `merge_tecnico` suma antes sus
+cubetas a las cubetas sin técnico correspondientes.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import FichaEntrada, FichaEstadistica
+
+# Campos de FichaEntrada que definen la cubeta (además del día de creación)
+DIMENSIONS = ('ubicacion', 'tipo_equipo', 'estado', 'tecnico_asignado_id')
+
+
+def bucket_key(ficha):
+    """Clave de la cubeta de una ficha, o None si aún no tiene fecha de creación."""
+    if not ficha.fecha_creacion:
+        return None
+    fecha = ficha.fecha_creacion
+    if timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return (fecha.date(),) + tuple(getattr(ficha, name) for name in DIMENSIONS)
+
+
+def _bucket_filter(key):
+    return dict(zip(('fecha',) + DIMENSIONS, key))
+
+
+def _increment(key, amount=1):
+    lookup = _bucket_filter(key)
+    if FichaEstadistica.objects.filter(**lookup).update(total=F('total') + amount):
+        return
+    try:
+        with transaction.atomic():
+            FichaEstadistica.objects.create(total=amount, **lookup)
+    except IntegrityError:
+        # Otra escritura creó la cubeta en paralelo
+        FichaEstadistica.objects.filter(**lookup).update(total=F('total') + amount)
+
+
+def _decrement(key):
+    lookup = _bucket_filter(key)
+    FichaEstadistica.objects.filter(total__gt=0, **lookup).update(total=F('total') - 1)
+    FichaEstadistica.objects.filter(total=0, **lookup).delete()
+
+
+def apply_change(old_key, new_key):
+    """Mueve una ficha de la cubeta `old_key` a `new_key` (cualquiera puede ser None)."""
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _decrement(old_key)
+    if new_key is not None:
+        _increment(new_key)
+
+
+def merge_tecnico(tecnico_id):
+    """Pasa las cubetas del técnico `tecnico_id` a las cubetas sin técnico (antes de borrarlo)."""
+    with transaction.atomic():
+        buckets = FichaEstadistica.objects.filter(tecnico_asignado_id=tecnico_id)
+        for bucket in buckets.values('fecha', 'ubicacion', 'tipo_equipo', 'estado', 'total'):
+            key = (bucket['fecha'], bucket['ubicacion'], bucket['tipo_equipo'], bucket['estado'], None)
+            _increment(key, bucket['total'])
+        buckets.delete()
+
+
+def rebuild(ficha_model=FichaEntrada, rollup_model=FichaEstadistica):
+    """Regenera la tabla de agregados desde cero. Devuelve el número de cubetas.
+
+    Acepta los modelos como parámetros para poder usarse desde migraciones.
+    """
+    grouped = (
+        ficha_model.objects
+        .annotate(fecha=TruncDate('fecha_creacion'))
+        .values('fecha', 'ubicacion', 'tipo_equipo', 'estado', 'tecnico_asignado')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    buckets = [
+        rollup_model(
+            fecha=row['fecha'],
+            ubicacion=row['ubicacion'],
+            tipo_equipo=row['tipo_equipo'],
+            estado=row['estado'],
+            tecnico_asignado_id=row['tecnico_asignado'],
+            total=row['total'],
+        )
+        for row in grouped.iterator()
+    ]
+    with transaction.atomic():
+        rollup_model.objects.all().delete()
+        rollup_model.objects.bulk_create(buckets, batch_size=500)
+    return len(buckets)
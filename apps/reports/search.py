@@ -0,0 +1,296 @@
+"""Motor de búsqueda de fichas de entrada.
+
+Cada `FichaEntrada` tiene un `FichaSearchDocument` con el texto normalizado de
+todos sus campos buscables. Sobre ese documento trabaja un backend de búsqueda
+intercambiable:
+
+- `SQLiteFTS5SearchBackend`: índice FTS5 (tabla virtual de contenido externo
+  sincronizada por triggers) con resultados ordenados por relevancia (bm25).
+- `DocumentSearchBackend`: backend genérico para otras bases de datos; filtra
+  con `LIKE` sobre la columna única del documento.
+
+El backend se elige automáticamente según la base de datos, o explícitamente con
+`settings.REPORTS_SEARCH_BACKEND` (ruta con puntos a la clase).
+
+Las vistas `historial_equipos`, `exportar_datos` y `reporte_estadisticas` usan
+`filter_fichas` / `rank_fichas` en lugar de construir sus propias cadenas de OR.
+"""
+import logging
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'reports_ficha_fts'
+DOCUMENT_TABLE = 'reports_fichasearchdocument'
+
+# Campos de texto libre de la ficha que forman parte del documento
+TEXT_FIELDS = (
+    'codigo',
+    'marca',
+    'modelo',
+    'numero_serie',
+    'dependencia',
+    'descripcion',
+    'tipo_equipo_otro',
+    'nombre_cliente',
+    'apellido_cliente',
+    'cedula_cliente',
+    'departamento_cliente',
+    'telefono_cliente',
+    'correo_cliente',
+    'descripcion_falla',
+    'tipo_falla_otro',
+    'observaciones',
+)
+# Campos con choices: se indexa tanto la clave como la etiqueta legible
+CHOICE_FIELDS = ('tipo_equipo', 'ubicacion', 'tipo_falla', 'estado')
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def normalize_text(value):
+    """Pasa a minúsculas y elimina acentos/diacríticos (José -> jose, Socopó -> socopo)."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def build_document(ficha):
+    """Construye el texto normalizado que se indexa para una ficha.
+
+    Se guarda como tokens separados por espacios (sin signos), igual que se
+    dividen las búsquedas en `query_terms`: así 'V-123' o '2025-10-01' coinciden
+    también con el `LIKE` de `DocumentSearchBackend`.
+    """
+    partes = [getattr(ficha, name, '') or '' for name in TEXT_FIELDS]
+    for name in CHOICE_FIELDS:
+        value = getattr(ficha, name, '') or ''
+        partes.append(value)
+        partes.append(getattr(ficha, f'get_{name}_display')())
+    tecnico = ficha.tecnico_asignado
+    if tecnico:
+        partes.extend([tecnico.first_name, tecnico.last_name, tecnico.username])
+    if ficha.fecha_creacion:
+        fecha = timezone.localtime(ficha.fecha_creacion) if timezone.is_aware(ficha.fecha_creacion) else ficha.fecha_creacion
+        partes.append(fecha.strftime('%Y-%m-%d'))
+        partes.append(fecha.strftime('%d/%m/%Y'))
+    return ' '.join(_TOKEN_RE.findall(normalize_text(' '.join(p for p in partes if p))))
+
+
+def query_terms(query):
+    """Divide la búsqueda en términos; cada término es una lista de tokens normalizados.
+
+    Un término es cada palabra separada por espacios. Los signos dentro de un
+    término (p.ej. '2025-10-01' o 'V-123') lo dividen en tokens que deben
+    aparecer consecutivos.
+    """
+    terms = []
+    for raw in normalize_text(query).split():
+        tokens = _TOKEN_RE.findall(raw)
+        if tokens:
+            terms.append(tokens)
+    return terms
+
+
+def fts5_available():
+    """Indica si la conexión actual es SQLite compilado con FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+    except Exception:
+        logger.exception('No se pudo determinar si SQLite soporta FTS5')
+        return False
+
+
+def _ficha_pk_column():
+    from .models import FichaEntrada
+    qn = connection.ops.quote_name
+    return f'{qn(FichaEntrada._meta.db_table)}.{qn(FichaEntrada._meta.pk.column)}'
+
+
+class BaseSearchBackend:
+    """Interfaz común de los backends de búsqueda."""
+
+    def install(self, schema_editor=None):
+        """Crea las estructuras auxiliares que necesite el backend (idempotente)."""
+
+    def uninstall(self, schema_editor=None):
+        """Elimina las estructuras auxiliares creadas por `install`."""
+
+    def rebuild(self):
+        """Reconstruye el índice a partir de la tabla de documentos."""
+
+    def filter(self, queryset, query):
+        raise NotImplementedError
+
+    def rank(self, queryset, query):
+        """Filtra y ordena por relevancia. Por defecto, más recientes primero."""
+        return self.filter(queryset, query).order_by('-fecha_creacion', '-id')
+
+
+class DocumentSearchBackend(BaseSearchBackend):
+    """Backend genérico: un `LIKE` por término sobre el documento desnormalizado."""
+
+    def filter(self, queryset, query):
+        from .models import FichaSearchDocument
+        terms = query_terms(query)
+        if not terms:
+            return queryset.none()
+        docs = FichaSearchDocument.objects.all()
+        for tokens in terms:
+            docs = docs.filter(documento__contains=' '.join(tokens))
+        return queryset.filter(pk__in=docs.values('ficha_id'))
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """Índice FTS5 de contenido externo sobre `FichaSearchDocument`.
+
+    La tabla virtual no duplica el texto: lee de la tabla de documentos y se
+    mantiene al día mediante triggers, por lo que cualquier escritura del ORM
+    sobre `FichaSearchDocument` (incluidos borrados en cascada) queda indexada.
+    """
+
+    def install(self, schema_editor=None):
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"documento, content='{DOCUMENT_TABLE}', content_rowid='ficha_id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, documento) VALUES (new.ficha_id, new.documento); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, documento) VALUES ('delete', old.ficha_id, old.documento); END",
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, documento) VALUES ('delete', old.ficha_id, old.documento); "
+            f"INSERT INTO {FTS_TABLE}(rowid, documento) VALUES (new.ficha_id, new.documento); END",
+        ]
+        self._execute(statements, schema_editor)
+
+    def uninstall(self, schema_editor=None):
+        statements = [f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+        statements.append(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        self._execute(statements, schema_editor)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    @staticmethod
+    def _execute(statements, schema_editor):
+        if schema_editor is not None:
+            for sql in statements:
+                schema_editor.execute(sql)
+            return
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    @staticmethod
+    def match_expression(query):
+        """Convierte la búsqueda en una expresión MATCH de FTS5 (prefijo en el último token)."""
+        terms = query_terms(query)
+        return ' '.join(f'"{" ".join(tokens)}"*' for tokens in terms)
+
+    def filter(self, queryset, query):
+        expr = self.match_expression(query)
+        if not expr:
+            return queryset.none()
+        condition = RawSQL(
+            f'{_ficha_pk_column()} IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            (expr,),
+            output_field=BooleanField(),
+        )
+        return queryset.filter(condition)
+
+    def rank(self, queryset, query):
+        expr = self.match_expression(query)
+        if not expr:
+            return queryset.none()
+        # bm25 devuelve valores negativos: cuanto menor, más relevante
+        score = RawSQL(
+            f'(SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {_ficha_pk_column()})',
+            (expr,),
+            output_field=FloatField(),
+        )
+        return (
+            self.filter(queryset, query)
+            .annotate(search_rank=score)
+            .order_by('search_rank', '-fecha_creacion', '-id')
+        )
+
+
+_backend = None
+
+
+def get_backend():
+    """Devuelve la instancia (compartida por proceso) del backend configurado."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'REPORTS_SEARCH_BACKEND', None)
+        if path:
+            backend_cls = import_string(path)
+        elif fts5_available():
+            backend_cls = SQLiteFTS5SearchBackend
+        else:
+            backend_cls = DocumentSearchBackend
+        _backend = backend_cls()
+    return _backend
+
+
+def filter_fichas(queryset, query):
+    """Restringe `queryset` (de FichaEntrada) a las fichas que coinciden con `query`."""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    return get_backend().filter(queryset, query)
+
+
+def rank_fichas(queryset, query):
+    """Como `filter_fichas`, pero ordenando los resultados por relevancia."""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    return get_backend().rank(queryset, query)
+
+
+def index_ficha(ficha):
+    """Crea o actualiza el documento de búsqueda de la ficha."""
+    from .models import FichaSearchDocument
+    FichaSearchDocument.objects.update_or_create(
+        ficha_id=ficha.pk,
+        defaults={'documento': build_document(ficha)},
+    )
+
+
+def rebuild_index(chunk_size=500):
+    """Regenera todos los documentos de búsqueda y el índice del backend.
+
+    Devuelve el número de fichas indexadas.
+    """
+    from .models import FichaEntrada, FichaSearchDocument
+    FichaSearchDocument.objects.all().delete()
+    total = 0
+    batch = []
+    fichas = FichaEntrada.objects.select_related('tecnico_asignado').order_by('pk')
+    for ficha in fichas.iterator(chunk_size=chunk_size):
+        batch.append(FichaSearchDocument(ficha_id=ficha.pk, documento=build_document(ficha)))
+        if len(batch) >= chunk_size:
+            FichaSearchDocument.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        FichaSearchDocument.objects.bulk_create(batch)
+        total += len(batch)
+    get_backend().rebuild()
+    return total
@@ -0,0 +1,112 @@
+"""Señales de la app reports.
+
+Mantienen sincronizados el documento de búsqueda de cada ficha (ver `search.py`),
+los agregados diarios de estadísticas (ver `rollups.py`) y la caché de la
+consulta pública de timelines por cédula (ver `timelines.py`).
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import rollups, search, timelines
+from .models import FichaEntrada, Seguimiento, SeguimientoEvento
+
+# Campos del técnico que forman parte del documento de búsqueda de sus fichas
+_TECNICO_SEARCH_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+# Campos de la ficha que determinan su cubeta de estadísticas
+_ROLLUP_FIELDS = {'fecha_creacion', 'ubicacion', 'tipo_equipo', 'estado', 'tecnico_asignado', 'tecnico_asignado_id'}
+
+
+@receiver(post_save, sender=FichaEntrada)
+def indexar_ficha(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_ficha(instance)
+
+
+@receiver(pre_save, sender=FichaEntrada)
+def recordar_cubeta_ficha(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Guardar la cubeta anterior (según la base de datos) para moverla en post_save
+    instance._rollup_key_anterior = None
+    instance._rollup_sin_cambios = update_fields is not None and not (set(update_fields) & _ROLLUP_FIELDS)
+    if raw or instance._rollup_sin_cambios or instance.pk is None:
+        return
+    anterior = FichaEntrada.objects.filter(pk=instance.pk).values('fecha_creacion', *rollups.DIMENSIONS).first()
+    if anterior is not None:
+        instance._rollup_key_anterior = rollups.bucket_key(FichaEntrada(**anterior))
+
+
+@receiver(post_save, sender=FichaEntrada)
+def actualizar_estadisticas_ficha(sender, instance, raw=False, **kwargs):
+    if raw or getattr(instance, '_rollup_sin_cambios', False):
+        return
+    rollups.apply_change(getattr(instance, '_rollup_key_anterior', None), rollups.bucket_key(instance))
+
+
+@receiver(post_delete, sender=FichaEntrada)
+def descontar_ficha_estadisticas(sender, instance, **kwargs):
+    rollups.apply_change(rollups.bucket_key(instance), None)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def fusionar_estadisticas_tecnico(sender, instance, **kwargs):
+    # Sus fichas pasan a "sin técnico" (SET_NULL) sin señales: mover sus cubetas
+    rollups.merge_tecnico(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def reindexar_fichas_tecnico(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # El nombre del técnico se indexa en sus fichas; las actualizaciones que no
+    # lo tocan (p.ej. last_login en cada inicio de sesión) no requieren reindexar.
+    if raw or created:
+        return
+    if update_fields is not None and not (set(update_fields) & _TECNICO_SEARCH_FIELDS):
+        return
+    for ficha in FichaEntrada.objects.filter(tecnico_asignado=instance).select_related('tecnico_asignado'):
+        search.index_ficha(ficha)
+
+
+@receiver(pre_save, sender=FichaEntrada)
+def recordar_cedula_ficha(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Si cambia la cédula hay que invalidar también la respuesta de la anterior
+    instance._cedula_anterior = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'cedula_cliente' not in update_fields:
+        return
+    instance._cedula_anterior = timelines.cedula_de_ficha(instance.pk)
+
+
+@receiver(post_save, sender=FichaEntrada)
+@receiver(post_delete, sender=FichaEntrada)
+def invalidar_timelines_ficha(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    timelines.invalidate(instance.cedula_cliente, getattr(instance, '_cedula_anterior', None))
+
+
+def _cedula_seguimiento(seguimiento):
+    if Seguimiento.ficha.is_cached(seguimiento):
+        return seguimiento.ficha.cedula_cliente
+    return timelines.cedula_de_ficha(seguimiento.ficha_id)
+
+
+@receiver(post_save, sender=Seguimiento)
+@receiver(post_delete, sender=Seguimiento)
+def invalidar_timelines_seguimiento(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    timelines.invalidate(_cedula_seguimiento(instance))
+
+
+@receiver(post_save, sender=SeguimientoEvento)
+@receiver(post_delete, sender=SeguimientoEvento)
+def invalidar_timelines_evento(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if SeguimientoEvento.seguimiento.is_cached(instance):
+        timelines.invalidate(_cedula_seguimiento(instance.seguimiento))
+    else:
+        timelines.invalidate(timelines.cedula_de_seguimiento(instance.seguimiento_id))
@@ -1,26 +1,53 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import smtplib
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core import mail as django_mail
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+import imageio_ffmpeg
+
+from .models import ExportJob, FichaEntrada, FichaEstadistica, FichaSearchDocument, QueuedEmail, Seguimiento, SeguimientoEvento
+from . import export_jobs, mail, ratelimit, rollups, search, timelines, video, views
+from .management.commands.benchmark_email_delivery import SMTPSink
 
 
 class RoleAccessTests(TestCase):
 	def setUp(self):
 		User = get_user_model()
 		# Administrador (superuser)
-		self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+		self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass', cedula='V-10000001')
 		# asegurar rol si el campo existe
 		if hasattr(self.admin, 'rol'):
 			self.admin.rol = 'administrador'
 			self.admin.save()
 
 		# Técnico
-		self.tech = User.objects.create_user(username='tech', password='pass')
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-10000002')
 		if hasattr(self.tech, 'rol'):
 			self.tech.rol = 'tecnico'
 			self.tech.save()
 
 		# Usuario sin permisos
-		self.other = User.objects.create_user(username='other', password='pass')
+		self.other = User.objects.create_user(username='other', password='pass', cedula='V-10000003')
 		if hasattr(self.other, 'rol'):
 			self.other.rol = 'usuario'
 			self.other.save()
@@ -61,3 +88,860 @@ class RoleAccessTests(TestCase):
 		self.client.force_login(self.other)
 		resp = self.client.get(url)
 		self.assertIn(resp.status_code, (302, 403))
+
+
+class FailingEmailBackend(BaseEmailBackend):
+	def send_messages(self, email_messages):
+		raise ConnectionError('SMTP caído')
+
+
+class DroppingEmailBackend(locmem.EmailBackend):
+	"""Simula un servidor que cierra la conexión una vez, a mitad de lote."""
+	opened = 0
+	dropped = False
+
+	def open(self):
+		DroppingEmailBackend.opened += 1
+		return True
+
+	def send_messages(self, messages):
+		if len(django_mail.outbox) == 1 and not DroppingEmailBackend.dropped:
+			DroppingEmailBackend.dropped = True
+			raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+		return super().send_messages(messages)
+
+
+def crear_ficha(**kwargs):
+	datos = {
+		'codigo': 'EQ-001',
+		'tipo_equipo': 'laptop',
+		'ubicacion': 'barinas',
+		'nombre_cliente': 'Ana',
+		'apellido_cliente': 'Rojas',
+		'descripcion_falla': 'No enciende',
+		'tipo_falla': 'hardware',
+	}
+	datos.update(kwargs)
+	return FichaEntrada.objects.create(**datos)
+
+
+class SearchIndexTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-20000001', first_name='Luis', last_name='Peña', rol='tecnico')
+		self.jose = crear_ficha(codigo='EQ-100', nombre_cliente='José', apellido_cliente='Pérez', marca='Lenovo', ubicacion='socopo')
+		self.maria = crear_ficha(codigo='EQ-200', nombre_cliente='María', marca='HP', tecnico_asignado=self.tech)
+
+	def ids(self, query):
+		return set(search.filter_fichas(FichaEntrada.objects.all(), query).values_list('id', flat=True))
+
+	def test_document_created_on_save(self):
+		doc = FichaSearchDocument.objects.get(ficha=self.jose)
+		self.assertIn('jose perez', doc.documento)
+
+	def test_accent_insensitive_and_prefix(self):
+		self.assertEqual(self.ids('jose'), {self.jose.id})
+		self.assertEqual(self.ids('PÉREZ'), {self.jose.id})
+		self.assertEqual(self.ids('Socopó'), {self.jose.id})
+		self.assertEqual(self.ids('leno'), {self.jose.id})
+
+	def test_all_terms_must_match(self):
+		self.assertEqual(self.ids('maria hp'), {self.maria.id})
+		self.assertEqual(self.ids('maria lenovo'), set())
+
+	def test_tecnico_and_date(self):
+		self.assertEqual(self.ids('pena'), {self.maria.id})
+		fecha = timezone.localtime(self.jose.fecha_creacion)
+		self.assertEqual(self.ids(fecha.strftime('%d/%m/%Y')), {self.jose.id, self.maria.id})
+
+	def test_index_follows_updates_and_deletes(self):
+		self.jose.marca = 'Dell'
+		self.jose.save()
+		self.assertEqual(self.ids('lenovo'), set())
+		self.assertEqual(self.ids('dell'), {self.jose.id})
+		self.tech.last_name = 'Gómez'
+		self.tech.save()
+		self.assertEqual(self.ids('gomez'), {self.maria.id})
+		self.maria.delete()
+		self.assertEqual(self.ids('maria'), set())
+
+	def test_rank_orders_by_relevance(self):
+		otra = crear_ficha(codigo='EQ-300', marca='Lenovo', modelo='Lenovo', descripcion='Lenovo ThinkPad')
+		ranked = list(search.rank_fichas(FichaEntrada.objects.all(), 'lenovo').values_list('id', flat=True))
+		self.assertEqual(ranked, [otra.id, self.jose.id])
+
+	def test_document_backend_matches(self):
+		backend = search.DocumentSearchBackend()
+		ids = set(backend.filter(FichaEntrada.objects.all(), 'Pérez').values_list('id', flat=True))
+		self.assertEqual(ids, {self.jose.id})
+
+	@override_settings(REPORTS_SEARCH_BACKEND='apps.reports.search.DocumentSearchBackend')
+	def test_document_backend_matches_punctuated_terms(self):
+		search._backend = None
+		self.addCleanup(setattr, search, '_backend', None)
+		self.jose.cedula_cliente = 'V-12345678'
+		self.jose.correo_cliente = 'jose.perez@example.com'
+		self.jose.save()
+		self.assertIsInstance(search.get_backend(), search.DocumentSearchBackend)
+		self.assertEqual(self.ids('V-12345678'), {self.jose.id})
+		self.assertEqual(self.ids('v 1234'), {self.jose.id})
+		self.assertEqual(self.ids('jose.perez@example.com'), {self.jose.id})
+		fecha = timezone.localtime(self.jose.fecha_creacion)
+		self.assertEqual(self.ids(fecha.strftime('%Y-%m-%d')), {self.jose.id, self.maria.id})
+		self.assertEqual(self.ids(fecha.strftime('%d/%m/%Y')), {self.jose.id, self.maria.id})
+		self.assertEqual(self.ids('EQ-200'), {self.maria.id})
+
+	def test_rebuild_index(self):
+		FichaSearchDocument.objects.all().delete()
+		self.assertEqual(self.ids('jose'), set())
+		self.assertEqual(search.rebuild_index(), 2)
+		self.assertEqual(self.ids('jose'), {self.jose.id})
+
+	def test_views_share_search_engine(self):
+		admin = get_user_model().objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-20000002', rol='administrador')
+		self.client.force_login(admin)
+		resp = self.client.get(reverse('reports:historial_equipos'), {'search': 'perez'})
+		self.assertEqual([r['id'] for r in resp.context['registros']], [self.jose.id])
+		resp = self.client.get(reverse('reports:reporte_estadisticas'), {'search': 'perez'})
+		self.assertEqual(resp.context['total_equipos'], 1)
+		resp = self.client.get(reverse('reports:exportar_datos'), {'search': 'perez'})
+		self.assertEqual(resp.status_code, 200)
+
+
+class HistorialPaginationTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-30000001', rol='administrador')
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-30000002', rol='tecnico')
+		self.fichas = [crear_ficha(codigo=f'EQ-{i:03d}', tecnico_asignado=self.tech if i % 2 else None) for i in range(7)]
+		# Forzar fechas repetidas para comprobar el desempate por id
+		FichaEntrada.objects.filter(id__in=[f.id for f in self.fichas[:4]]).update(fecha_creacion=self.fichas[0].fecha_creacion)
+
+	def collect(self, user, **params):
+		self.client.force_login(user)
+		url = reverse('reports:historial_equipos_json')
+		ids, cursor = [], ''
+		while True:
+			resp = self.client.get(url, dict(params, cursor=cursor, limit=3))
+			data = resp.json()
+			ids += [r['id'] for r in data['results']]
+			cursor = data['next_cursor']
+			if not data['has_next']:
+				return ids
+
+	def test_pages_cover_all_rows_in_order(self):
+		expected = list(FichaEntrada.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True))
+		self.assertEqual(self.collect(self.admin), expected)
+
+	def test_tech_only_sees_assigned(self):
+		expected = {f.id for f in self.fichas if f.tecnico_asignado_id}
+		self.assertEqual(set(self.collect(self.tech)), expected)
+
+	def test_search_pages(self):
+		crear_ficha(codigo='XYZ-1', marca='Lenovo')
+		crear_ficha(codigo='XYZ-2', marca='Lenovo', modelo='Lenovo')
+		ids = self.collect(self.admin, search='lenovo')
+		self.assertEqual(len(ids), 2)
+
+	def test_invalid_cursor(self):
+		self.client.force_login(self.admin)
+		resp = self.client.get(reverse('reports:historial_equipos_json'), {'cursor': 'no-valido'})
+		self.assertEqual(resp.status_code, 400)
+
+	def test_tampered_cursor_values(self):
+		from .pagination import encode_cursor
+		self.client.force_login(self.admin)
+		url = reverse('reports:historial_equipos_json')
+		ahora = timezone.now()
+		for valores in ([{'dt': 5}, 1], ['zzz', 1], [{'dt': 'ayer'}, 1], [{'dt': ahora.isoformat()}, 'x'], [[1], 1], [None, 1], [{'dt': ahora.isoformat(), 'x': 1}, 1]):
+			token = encode_cursor(valores)
+			resp = self.client.get(url, {'cursor': token})
+			self.assertEqual(resp.status_code, 400, valores)
+			self.assertFalse(resp.json()['success'])
+		resp = self.client.get(url, {'cursor': encode_cursor(['no-es-rango', {'dt': ahora.isoformat()}, 1]), 'search': 'EQ'})
+		self.assertEqual(resp.status_code, 400)
+		# Un cursor bien formado sigue funcionando
+		resp = self.client.get(url, {'cursor': encode_cursor([ahora, 10 ** 6])})
+		self.assertEqual(resp.status_code, 200)
+
+	def test_html_first_page(self):
+		self.client.force_login(self.admin)
+		resp = self.client.get(reverse('reports:historial_equipos'), {'limit': 5})
+		self.assertEqual(len(resp.context['registros']), 5)
+		self.assertTrue(resp.context['next_cursor'])
+
+
+class ExportTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-40000001', rol='administrador')
+		self.client.force_login(self.admin)
+		crear_ficha(codigo='EQ-1', marca='Lenovo', nombre_cliente='José', apellido_cliente='Pérez')
+		crear_ficha(codigo='EQ-2', marca='HP <&> "x"', tipo_equipo='impresora')
+
+	def test_xlsx_is_streamed_and_readable(self):
+		import io
+		import openpyxl
+		resp = self.client.get(reverse('reports:exportar_datos'))
+		self.assertTrue(resp.streaming)
+		wb = openpyxl.load_workbook(io.BytesIO(b''.join(resp.streaming_content)))
+		rows = list(wb.active.iter_rows(values_only=True))
+		self.assertEqual(rows[0][0], 'Código')
+		self.assertEqual(rows[1][:5], ('EQ-1', 'Laptop', 'Lenovo', None, 'José Pérez'))
+		self.assertEqual(rows[2][1:3], ('Impresora', 'HP <&> "x"'))
+		self.assertTrue(wb.active['A1'].font.b)
+
+	def test_csv_with_search(self):
+		resp = self.client.get(reverse('reports:exportar_datos'), {'formato': 'csv', 'search': 'perez'})
+		content = b''.join(resp.streaming_content).decode('utf-8').splitlines()
+		self.assertEqual(len(content), 2)
+		self.assertTrue(content[1].startswith('EQ-1,Laptop,Lenovo'))
+
+	def test_xlsx_many_rows(self):
+		import io
+		import openpyxl
+		from . import exports
+		rows = ((i, f'fila {i}') for i in range(3 * exports.STREAM_FLUSH_ROWS))
+		data = b''.join(exports.stream_xlsx(['n', 'texto'], rows))
+		wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+		rows = list(wb.active.iter_rows(values_only=True))
+		self.assertEqual(len(rows), 3 * exports.STREAM_FLUSH_ROWS + 1)
+		self.assertEqual(rows[-1], (3 * exports.STREAM_FLUSH_ROWS - 1, f'fila {3 * exports.STREAM_FLUSH_ROWS - 1}'))
+
+
+	def test_pdf_splits_rows_into_fixed_pages(self):
+		import re
+		from . import pdf
+		out = io.BytesIO()
+		writer = pdf.TablePDF(out, 'Prueba', ['n', 'texto'], col_weights=[1, 3])
+		per_page = writer.rows_per_page
+		written = writer.write((i, 'x' * 500) for i in range(2 * per_page + 1))
+		self.assertEqual(written, 2 * per_page + 1)
+		data = out.getvalue()
+		self.assertTrue(data.startswith(b'%PDF'))
+		self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', data)), 3)
+
+	def test_pdf_row_cap_adds_summary_page(self):
+		import re
+		from . import pdf
+		out = io.BytesIO()
+		writer = pdf.TablePDF(out, 'Prueba', ['n'], max_rows=5)
+		totales = []
+		written = writer.write(((i,) for i in range(100)), total=lambda: totales.append(1) or 100)
+		self.assertEqual(written, 5)
+		self.assertEqual(totales, [1])
+		# Una página con las 5 filas y la página de resumen
+		self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', out.getvalue())), 2)
+		out = io.BytesIO()
+		self.assertEqual(pdf.TablePDF(out, 'Prueba', ['n'], max_rows=5).write([(1,), (2,)], total=lambda: totales.append(1)), 2)
+		self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', out.getvalue())), 1)
+		self.assertEqual(totales, [1])
+
+
+@override_settings(EXPORT_JOB_WORKERS=0)
+class ExportJobTests(TestCase):
+	def setUp(self):
+		self.media = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+		override = override_settings(MEDIA_ROOT=self.media)
+		override.enable()
+		self.addCleanup(override.disable)
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-50000001', rol='administrador')
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-50000002', rol='tecnico')
+		crear_ficha(codigo='EQ-1', marca='Lenovo')
+		crear_ficha(codigo='EQ-2', marca='HP', tecnico_asignado=self.tech)
+
+	def test_background_export_completes_and_downloads(self):
+		self.client.force_login(self.tech)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.get(reverse('reports:exportar_datos'), {'background': '1', 'formato': 'csv'})
+		self.assertEqual(resp.status_code, 202)
+		status = self.client.get(resp.json()['job']['status_url']).json()['job']
+		self.assertEqual(status['estado'], ExportJob.ESTADO_COMPLETADO)
+		self.assertEqual((status['progreso'], status['total_filas']), (100, 1))
+		download = self.client.get(status['download_url'])
+		content = b''.join(download.streaming_content).decode('utf-8')
+		self.assertIn('EQ-2', content)
+		self.assertNotIn('EQ-1', content)
+
+	def test_identical_concurrent_requests_are_deduplicated(self):
+		job1, created1 = export_jobs.submit('historial_xlsx', {'search': 'hp'}, self.admin)
+		job2, created2 = export_jobs.submit('historial_xlsx', {'search': 'hp', 'otro': 'x'}, self.admin)
+		job3, created3 = export_jobs.submit('historial_xlsx', {'search': 'lenovo'}, self.admin)
+		self.assertTrue(created1)
+		self.assertEqual((job2.id, created2), (job1.id, False))
+		self.assertNotEqual(job3.id, job1.id)
+
+	def test_permissions(self):
+		with self.assertRaises(export_jobs.ExportJobError):
+			export_jobs.submit('logs_pdf', {}, self.tech)
+		job, _ = export_jobs.submit('historial_csv', {}, self.admin)
+		self.client.force_login(self.tech)
+		resp = self.client.get(reverse('reports:export_job_status', args=[job.id]))
+		self.assertEqual(resp.status_code, 403)
+
+	def test_logs_pdf_job(self):
+		self.client.force_login(self.admin)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.get(reverse('users:logs_export_pdf'), {'background': '1'})
+		job = ExportJob.objects.get(id=resp.json()['job']['id'])
+		self.assertEqual(job.estado, ExportJob.ESTADO_COMPLETADO)
+		with job.archivo.open('rb') as f:
+			self.assertEqual(f.read(4), b'%PDF')
+
+	def test_purge_expired_removes_files(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			job, _ = export_jobs.submit('historial_csv', {}, self.admin)
+		job.refresh_from_db()
+		path = job.archivo.path
+		self.assertTrue(os.path.exists(path))
+		self.assertEqual(export_jobs.purge_expired(now=job.expira + timedelta(seconds=1)), 1)
+		self.assertFalse(os.path.exists(path))
+		self.assertFalse(ExportJob.objects.filter(id=job.id).exists())
+
+	@override_settings(EXPORT_JOB_WORKERS=2)
+	def test_stale_job_is_resubmitted_once_while_queued(self):
+		job = ExportJob.objects.create(tipo='historial_csv', filtros={}, solicitante=self.admin, huella='x' * 64)
+		ExportJob.objects.filter(pk=job.pk).update(creado=timezone.now() - timedelta(seconds=export_jobs.EXPORT_JOB_STALE_SECONDS + 1))
+		job.refresh_from_db()
+
+		class Executor:
+			def __init__(self):
+				self.calls = []
+
+			def submit(self, fn, *args):
+				self.calls.append((fn, args))
+
+		executor = Executor()
+		original = export_jobs._executor
+		export_jobs._executor = executor
+		self.addCleanup(setattr, export_jobs, '_executor', original)
+		for _ in range(3):
+			export_jobs.resume_if_stale(job)
+		self.assertEqual(len(executor.calls), 1)
+		fn, args = executor.calls[0]
+		fn(*args)
+		job.refresh_from_db()
+		self.assertEqual(job.estado, ExportJob.ESTADO_COMPLETADO)
+		self.assertNotIn(job.pk, export_jobs._queued)
+
+
+class StatisticsRollupTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-60000001', rol='administrador')
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-60000002', rol='tecnico', first_name='Luis', last_name='Peña')
+		self.f1 = crear_ficha(codigo='EQ-1')
+		self.f2 = crear_ficha(codigo='EQ-2', tipo_equipo='impresora', tecnico_asignado=self.tech)
+		self.f3 = crear_ficha(codigo='EQ-3', tipo_equipo='impresora', tecnico_asignado=self.tech)
+
+	def buckets(self):
+		return {
+			(b.tipo_equipo, b.estado, b.tecnico_asignado_id): b.total
+			for b in FichaEstadistica.objects.all()
+		}
+
+	def test_rollups_follow_saves_and_deletes(self):
+		self.assertEqual(self.buckets(), {('laptop', 'recibido', None): 1, ('impresora', 'recibido', self.tech.id): 2})
+		self.f2.estado = 'reparacion'
+		self.f2.save()
+		self.f1.tecnico_asignado = self.tech
+		self.f1.save()
+		self.f3.delete()
+		self.assertEqual(self.buckets(), {('laptop', 'recibido', self.tech.id): 1, ('impresora', 'reparacion', self.tech.id): 1})
+
+	def test_deleting_a_technician_merges_into_unassigned_buckets(self):
+		otro = get_user_model().objects.create_user(username='tech2', password='pass', cedula='V-60000003', rol='tecnico')
+		crear_ficha(codigo='EQ-4', tecnico_asignado=otro)
+		otro.delete()
+		self.assertEqual(self.buckets(), {('laptop', 'recibido', None): 2, ('impresora', 'recibido', self.tech.id): 2})
+		# Editar una ficha sin técnico de la misma cubeta mueve una sola unidad
+		self.f1.estado = 'reparacion'
+		self.f1.save()
+		self.assertEqual(FichaEstadistica.objects.filter(tecnico_asignado__isnull=True, tipo_equipo='laptop').count(), 2)
+		antes = self.buckets()
+		self.assertEqual(antes, {('laptop', 'recibido', None): 1, ('laptop', 'reparacion', None): 1, ('impresora', 'recibido', self.tech.id): 2})
+		rollups.rebuild()
+		self.assertEqual(self.buckets(), antes)
+
+	def test_unassigned_buckets_are_unique(self):
+		from django.db import IntegrityError, transaction
+		bucket = FichaEstadistica.objects.get(tecnico_asignado__isnull=True)
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			FichaEstadistica.objects.create(fecha=bucket.fecha, ubicacion=bucket.ubicacion, tipo_equipo=bucket.tipo_equipo, estado=bucket.estado, total=1)
+
+	def test_rebuild_matches_incremental(self):
+		antes = self.buckets()
+		FichaEstadistica.objects.all().delete()
+		self.assertEqual(rollups.rebuild(), 2)
+		self.assertEqual(self.buckets(), antes)
+
+	def test_unfiltered_page_matches_raw_counts(self):
+		self.client.force_login(self.admin)
+		resp = self.client.get(reverse('reports:reporte_estadisticas'), {'month': timezone.localtime().month})
+		ctx = resp.context
+		self.assertEqual(ctx['total_equipos'], 3)
+		self.assertEqual({r['tipo_equipo']: r['count'] for r in ctx['equipos_por_tipo']}, {'laptop': 1, 'impresora': 2})
+		self.assertEqual(ctx['reparaciones_por_tecnico']['labels'], ['Luis Peña', 'Sin asignar'])
+		self.assertEqual(ctx['reparaciones_por_tecnico']['data'], [2, 1])
+		self.assertEqual(sum(ctx['reparaciones_por_mes']['data']), 3)
+		self.assertEqual(ctx['rep_count_for_month'], 3)
+
+	def test_tech_user_and_search_paths(self):
+		self.client.force_login(self.tech)
+		resp = self.client.get(reverse('reports:reporte_estadisticas'))
+		self.assertEqual(resp.context['total_equipos'], 2)
+		resp = self.client.get(reverse('reports:reporte_estadisticas'), {'search': 'EQ-3'})
+		self.assertEqual(resp.context['total_equipos'], 1)
+
+	def test_breakdowns_come_from_a_single_query(self):
+		year = timezone.localtime().year
+		fichas = search.filter_fichas(FichaEntrada.objects.all(), 'EQ')
+		medida = lambda **kw: Count('id', **kw)
+		with self.assertNumQueries(1):
+			stats = views._estadisticas_agrupadas(fichas, medida, 'fecha_creacion', year)
+		self.assertEqual(stats['total'], 3)
+		self.assertEqual({r['estado']: r['count'] for r in stats['por_estado']}, {'recibido': 3})
+		self.assertEqual([t['count'] for t in stats['por_tecnico']], [2, 1])
+		self.assertEqual(stats['por_mes'][timezone.localtime().month - 1], 3)
+		medida = lambda **kw: Sum('total', **kw)
+		with self.assertNumQueries(1):
+			rollup = views._estadisticas_agrupadas(FichaEstadistica.objects.all(), medida, 'fecha', year)
+		self.assertEqual(rollup, stats)
+
+
+class SeguimientoEventoTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-70000001', rol='tecnico', first_name='Luis', last_name='Peña')
+		self.ficha = crear_ficha(codigo='EQ-7', cedula_cliente='V-123')
+		self.client.force_login(self.tech)
+
+	def agregar(self, estado):
+		url = reverse('reports:add_seguimiento', args=[self.ficha.id])
+		return self.client.post(url, {'estado': estado, 'progreso': 0, 'descripcion': f'Paso {estado}'})
+
+	def test_events_are_rows_and_repeated_state_is_rejected(self):
+		self.assertEqual(self.agregar('diagnostico').status_code, 200)
+		self.assertEqual(self.agregar('reparacion').status_code, 200)
+		resp = self.agregar('diagnostico')
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('Recepción', resp.json()['message'])
+		seguimiento = Seguimiento.objects.get(ficha=self.ficha)
+		self.assertEqual(list(seguimiento.eventos.values_list('estado', flat=True)), ['diagnostico', 'reparacion'])
+		self.ficha.refresh_from_db()
+		self.assertEqual(self.ficha.estado, 'reparacion')
+
+	def test_repeated_state_ignores_case_of_migrated_events(self):
+		seguimiento = Seguimiento.objects.create(ficha=self.ficha, estado='diagnostico')
+		SeguimientoEvento.objects.create(seguimiento=seguimiento, titulo='Recepción', estado=' Recepcion ')
+		SeguimientoEvento.objects.create(seguimiento=seguimiento, titulo='Diagnóstico', estado='Diagnostico')
+		resp = self.agregar('diagnostico')
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('Reparación', resp.json()['message'])
+		self.assertEqual(seguimiento.eventos.count(), 2)
+
+	def test_timeline_keeps_legacy_json_shape(self):
+		self.agregar('diagnostico')
+		resp = self.client.get(reverse('reports:timelines_by_cedula'), {'cedula': 'V-123'})
+		evento = resp.json()['fichas'][0]['timeline'][0]
+		self.assertEqual(
+			set(evento),
+			{'fecha', 'titulo', 'descripcion', 'estado', 'progreso', 'tecnico', 'autor', 'video'},
+		)
+		self.assertEqual(evento['titulo'], 'Diagnóstico')
+		self.assertEqual(evento['progreso'], 20)
+		self.assertEqual(evento['tecnico'], 'Luis Peña')
+		self.assertIsNone(evento['video'])
+
+	def test_add_event_helper_and_extra_keys(self):
+		seguimiento = Seguimiento.objects.create(ficha=self.ficha)
+		seguimiento.add_event(timezone.now(), 'Equipo Recibido', 'Recibido en taller', estado='completed', icono='check-circle')
+		SeguimientoEvento.objects.create(seguimiento=seguimiento, titulo='Nota', extra={'origen': 'legado'})
+		timeline = seguimiento.timeline
+		self.assertEqual(timeline[0]['icono'], 'check-circle')
+		self.assertEqual(timeline[1]['origen'], 'legado')
+
+
+def crear_video(path, segundos=12, codec='mpeg4'):
+	"""Genera un clip de prueba (patrón de color + tono) con el ffmpeg de imageio-ffmpeg."""
+	video.run_ffmpeg([
+		'-f', 'lavfi', '-i', f'testsrc=duration={segundos}:size=160x120:rate=10',
+		'-f', 'lavfi', '-i', f'sine=frequency=440:duration={segundos}',
+		'-c:v', codec, '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path,
+	])
+
+
+class TimelinesByCedulaTests(TestCase):
+	def setUp(self):
+		cache.clear()
+
+	def crear_cliente(self, cedula, n):
+		for i in range(n):
+			ficha = crear_ficha(codigo=f'{cedula}-{i}', cedula_cliente=cedula)
+			Seguimiento.objects.create(ficha=ficha, estado='recepcion', progreso=10).add_event(timezone.now(), 'Recepción', '', estado='recepcion')
+			ultimo = Seguimiento.objects.create(ficha=ficha, estado='reparacion', progreso=60)
+			ultimo.add_event(timezone.now(), 'Recepción', '', estado='recepcion')
+			ultimo.add_event(timezone.now(), 'Reparación', '', estado='reparacion')
+		crear_ficha(codigo=f'{cedula}-sin-seguimiento', cedula_cliente=cedula)
+
+	def consultar(self, cedula):
+		resp = self.client.get(reverse('reports:timelines_by_cedula'), {'cedula': cedula})
+		self.assertEqual(resp.status_code, 200)
+		return resp.json()['fichas']
+
+	def test_query_count_does_not_grow_with_fichas(self):
+		self.crear_cliente('V-1', 1)
+		self.crear_cliente('V-50', 50)
+		with CaptureQueriesContext(connection) as pocas:
+			self.consultar('V-1')
+		with CaptureQueriesContext(connection) as muchas:
+			fichas = self.consultar('V-50')
+		# fichas + último seguimiento por ficha + eventos
+		self.assertEqual(len(muchas), 3)
+		self.assertEqual(len(muchas), len(pocas))
+		self.assertEqual(len(fichas), 51)
+
+		# Se usa el seguimiento más reciente de cada ficha
+		con_seguimiento = [f for f in fichas if f['timeline']]
+		self.assertEqual(len(con_seguimiento), 50)
+		for ficha in con_seguimiento:
+			self.assertEqual((ficha['estado'], ficha['progreso']), ('reparacion', 60))
+			self.assertEqual([e['titulo'] for e in ficha['timeline']], ['Recepción', 'Reparación'])
+		sin_seguimiento = fichas[-1]
+		self.assertEqual((sin_seguimiento['estado'], sin_seguimiento['progreso'], sin_seguimiento['timeline']), ('recibido', 0, []))
+
+	def test_repeat_poll_gets_304_without_queries(self):
+		self.crear_cliente('V-7', 2)
+		url = reverse('reports:timelines_by_cedula')
+		primera = self.client.get(url, {'cedula': 'V-7'})
+		self.assertEqual(primera.status_code, 200)
+		self.assertEqual(primera['Cache-Control'], 'no-cache')
+		etag, last_modified = primera['ETag'], primera['Last-Modified']
+
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, {'cedula': 'V-7'}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 304)
+		self.assertEqual(resp['ETag'], etag)
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, {'cedula': 'V-7'}, HTTP_IF_MODIFIED_SINCE=last_modified)
+		self.assertEqual(resp.status_code, 304)
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, {'cedula': 'V-7'})
+		self.assertEqual(resp.content, primera.content)
+
+	def test_changes_invalidate_the_cached_response(self):
+		self.crear_cliente('V-8', 1)
+		url = reverse('reports:timelines_by_cedula')
+		etag = self.client.get(url, {'cedula': 'V-8'})['ETag']
+
+		seguimiento = Seguimiento.objects.filter(ficha__cedula_cliente='V-8').first()
+		seguimiento.add_event(timezone.now(), 'Pruebas', '', estado='pruebas')
+		resp = self.client.get(url, {'cedula': 'V-8'}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp['ETag'], etag)
+		self.assertEqual(resp.json()['fichas'][0]['timeline'][-1]['titulo'], 'Pruebas')
+
+		# Cambiar la cédula de una ficha invalida la respuesta de ambas cédulas
+		self.assertEqual(len(self.client.get(url, {'cedula': 'V-9'}).json()['fichas']), 0)
+		ficha = FichaEntrada.objects.get(codigo='V-8-0')
+		ficha.cedula_cliente = 'V-9'
+		ficha.save()
+		self.assertEqual(len(self.client.get(url, {'cedula': 'V-8'}).json()['fichas']), 1)
+		self.assertEqual(len(self.client.get(url, {'cedula': 'V-9'}).json()['fichas']), 1)
+
+		# Los cambios hechos con update() (pool de videos) invalidan explícitamente
+		evento = SeguimientoEvento.objects.filter(seguimiento__ficha=ficha).last()
+		self.client.get(url, {'cedula': 'V-9'})
+		SeguimientoEvento.objects.filter(pk=evento.pk).update(titulo='Pruebas finales')
+		timelines.invalidate_evento(evento.pk)
+		self.assertEqual(self.client.get(url, {'cedula': 'V-9'}).json()['fichas'][0]['timeline'][-1]['titulo'], 'Pruebas finales')
+
+	@override_settings(TIMELINES_RATE_LIMITS={'ip': (3, 0.001), 'cedula': (100, 1)})
+	def test_ip_is_rate_limited_with_retry_after(self):
+		ratelimit.reset_stats()
+		url = reverse('reports:timelines_by_cedula')
+		for i in range(3):
+			self.assertEqual(self.client.get(url, {'cedula': f'V-{i}'}).status_code, 200)
+		with self.assertNumQueries(0):
+			resp = self.client.get(url, {'cedula': 'V-3'}, HTTP_ACCEPT='application/json')
+		self.assertEqual(resp.status_code, 429)
+		self.assertGreaterEqual(int(resp['Retry-After']), 1)
+		self.assertFalse(resp.json()['success'])
+
+		# Sin Accept JSON se usa la página de error 429 del sitio
+		resp = self.client.get(url, {'cedula': 'V-3'})
+		self.assertEqual(resp.status_code, 429)
+		self.assertIn('Retry-After', resp)
+		self.assertTemplateUsed(resp, 'errors/error.html')
+
+		# Otra IP tiene su propia cubeta
+		self.assertEqual(self.client.get(url, {'cedula': 'V-3'}, REMOTE_ADDR='10.0.0.2').status_code, 200)
+		self.assertEqual(ratelimit.stats()['timelines_ip'], {'allowed': 4, 'limited': 2})
+
+	@override_settings(TIMELINES_RATE_LIMITS={'ip': (100, 1), 'cedula': (2, 0.001)})
+	def test_cedula_is_rate_limited_across_ips(self):
+		url = reverse('reports:timelines_by_cedula')
+		for i in range(2):
+			self.assertEqual(self.client.get(url, {'cedula': 'V-5'}, REMOTE_ADDR=f'10.0.0.{i}').status_code, 200)
+		self.assertEqual(self.client.get(url, {'cedula': 'V-5'}, REMOTE_ADDR='10.0.0.9').status_code, 429)
+		self.assertEqual(self.client.get(url, {'cedula': 'V-6'}, REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+	def test_token_bucket_refills_over_time(self):
+		bucket = ratelimit.TokenBucket('prueba', capacity=2, rate=0.5)
+		self.assertEqual(bucket.consume('k', now=1000), (True, 0))
+		self.assertEqual(bucket.consume('k', now=1000), (True, 0))
+		self.assertEqual(bucket.consume('k', now=1000), (False, 2))
+		self.assertEqual(bucket.consume('k', now=1001), (False, 1))
+		self.assertEqual(bucket.consume('k', now=1002.5), (True, 0))
+
+@override_settings(VIDEO_TRANSCODE_WORKERS=0)
+class VideoPipelineTests(TestCase):
+	def setUp(self):
+		self.media = tempfile.mkdtemp()
+		self.override = override_settings(MEDIA_ROOT=self.media)
+		self.override.enable()
+		User = get_user_model()
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-80000001', rol='tecnico')
+		self.ficha = crear_ficha(codigo='EQ-8', cedula_cliente='V-888')
+		self.client.force_login(self.tech)
+
+	def tearDown(self):
+		self.override.disable()
+		shutil.rmtree(self.media, ignore_errors=True)
+
+	def test_upload_is_recorded_then_transcoded_in_background(self):
+		origen = os.path.join(self.media, 'origen.mp4')
+		crear_video(origen)
+		with open(origen, 'rb') as f:
+			upload = SimpleUploadedFile('clip.mp4', f.read(), content_type='video/mp4')
+		url = reverse('reports:add_seguimiento', args=[self.ficha.id])
+		with self.captureOnCommitCallbacks() as callbacks:
+			resp = self.client.post(url, {'estado': 'diagnostico', 'progreso': 0, 'video': upload})
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.json()['video_estado'], SeguimientoEvento.VIDEO_PENDIENTE)
+		self.assertIsNone(resp.json()['event']['video'])
+		evento = SeguimientoEvento.objects.get()
+		self.assertTrue(os.path.exists(os.path.join(self.media, evento.video_origen)))
+
+		for callback in callbacks:
+			callback()
+		evento.refresh_from_db()
+		self.assertEqual(evento.video_estado, SeguimientoEvento.VIDEO_LISTO, evento.video_error)
+		self.assertTrue(evento.video.endswith('.mp4'))
+		self.assertTrue(evento.poster.endswith('.jpg'))
+		self.assertFalse(os.path.exists(os.path.join(self.media, evento.video_origen)))
+		salida = os.path.join(self.media, evento.video.replace(settings.MEDIA_URL, '', 1))
+		_, segundos = imageio_ffmpeg.count_frames_and_secs(salida)
+		self.assertLessEqual(segundos, video.VIDEO_MAX_SECONDS + 0.5)
+
+		resp = self.client.get(reverse('reports:timelines_by_cedula'), {'cedula': 'V-888'})
+		item = resp.json()['fichas'][0]['timeline'][0]
+		self.assertEqual(item['video_estado'], SeguimientoEvento.VIDEO_LISTO)
+		self.assertEqual(item['poster'], evento.poster)
+
+	def test_trim_uses_stream_copy_only_for_h264_aac_mp4(self):
+		h264 = os.path.join(self.media, 'h264.mp4')
+		mpeg4 = os.path.join(self.media, 'mpeg4.mp4')
+		crear_video(h264, codec='libx264')
+		crear_video(mpeg4)
+		info = video.probe(h264)
+		self.assertEqual((info['video_codec'], info['audio_codec'], info['pix_fmt']), ('h264', 'aac', 'yuv420p'))
+		self.assertAlmostEqual(info['duration'], 12, delta=0.5)
+		self.assertEqual(video.trim(h264, os.path.join(self.media, 'a.mp4')), 'copy')
+		self.assertEqual(video.trim(mpeg4, os.path.join(self.media, 'b.mp4')), 'transcode')
+		for salida in ('a.mp4', 'b.mp4'):
+			info = video.probe(os.path.join(self.media, salida))
+			self.assertEqual(info['video_codec'], 'h264')
+			self.assertLessEqual(info['duration'], video.VIDEO_MAX_SECONDS + 0.5)
+
+	def test_invalid_video_keeps_original_and_reports_error(self):
+		seguimiento = Seguimiento.objects.create(ficha=self.ficha)
+		origen = default_storage.save('seguimientos/videos/roto.mp4', ContentFile(b'no es un video'))
+		evento = SeguimientoEvento.objects.create(seguimiento=seguimiento, video_origen=origen, video_estado=SeguimientoEvento.VIDEO_PENDIENTE)
+		self.assertEqual(video.process_pending(), 1)
+		evento.refresh_from_db()
+		self.assertEqual(evento.video_estado, SeguimientoEvento.VIDEO_ERROR)
+		self.assertTrue(evento.video.endswith('roto.mp4'))
+		self.assertTrue(evento.video_error)
+
+
+@override_settings(QUEUED_EMAIL_WORKERS=0, QUEUED_EMAIL_INPROCESS_WORKER=True)
+class EmailOutboxTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.tech = User.objects.create_user(username='tech', password='pass', cedula='V-90000001', rol='tecnico')
+		self.ficha = crear_ficha(codigo='EQ-9', correo_cliente='cliente@example.com')
+		self.client.force_login(self.tech)
+
+	def test_email_is_queued_in_transaction_and_sent_after_commit(self):
+		url = reverse('reports:add_seguimiento', args=[self.ficha.id])
+		with self.captureOnCommitCallbacks() as callbacks:
+			resp = self.client.post(url, {'estado': 'recepcion', 'progreso': 0})
+			self.assertEqual(resp.status_code, 200)
+			self.assertEqual(len(django_mail.outbox), 0)
+		queued = QueuedEmail.objects.get()
+		self.assertFalse(queued.sent)
+		self.assertEqual(queued.to, ['cliente@example.com'])
+
+		for callback in callbacks:
+			callback()
+		queued.refresh_from_db()
+		self.assertTrue(queued.sent)
+		self.assertEqual(queued.attempts, 1)
+		self.assertEqual(len(django_mail.outbox), 1)
+		self.assertIn('EQ-9', django_mail.outbox[0].subject)
+
+	def test_failed_delivery_stays_queued_with_backoff(self):
+		with override_settings(EMAIL_BACKEND='apps.reports.tests.FailingEmailBackend'):
+			with self.captureOnCommitCallbacks(execute=True):
+				queued = mail.enqueue('Asunto', 'Cuerpo', ['x@example.com'])
+		queued.refresh_from_db()
+		self.assertFalse(queued.sent)
+		self.assertEqual(queued.attempts, 1)
+		self.assertIn('SMTP caído', queued.last_error)
+		self.assertGreater(queued.send_after, timezone.now())
+		self.assertEqual(mail.process_queue(), (0, 0))
+
+	def test_batch_uses_a_single_smtp_connection(self):
+		with SMTPSink() as sink:
+			with override_settings(
+				EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+				EMAIL_HOST=sink.host, EMAIL_PORT=sink.port,
+				EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+			):
+				for i in range(3):
+					mail.enqueue(f'Asunto {i}', 'Cuerpo', [f'c{i}@example.com'], body_html='<p>Cuerpo</p>')
+				self.assertEqual(mail.process_queue(), (3, 3))
+			self.assertEqual((sink.connections, sink.messages), (1, 3))
+		self.assertEqual(QueuedEmail.objects.filter(sent=True).count(), 3)
+
+	@override_settings(EMAIL_BACKEND='apps.reports.tests.DroppingEmailBackend')
+	def test_stale_connection_is_reopened_and_message_retried(self):
+		DroppingEmailBackend.opened, DroppingEmailBackend.dropped = 0, False
+		for i in range(3):
+			mail.enqueue(f'Asunto {i}', 'Cuerpo', [f'c{i}@example.com'])
+		self.assertEqual(mail.process_queue(), (3, 3))
+		self.assertTrue(DroppingEmailBackend.dropped)
+		self.assertEqual(len(django_mail.outbox), 3)
+		self.assertEqual(list(QueuedEmail.objects.values_list('attempts', flat=True)), [1, 1, 1])
+
+	def test_claims_do_not_overlap_and_stale_leases_are_reclaimed(self):
+		for i in range(5):
+			mail.enqueue(f'Asunto {i}', 'Cuerpo', [f'c{i}@example.com'])
+		primero = mail.claim(batch=3)
+		segundo = mail.claim(batch=3)
+		self.assertEqual(len(primero), 3)
+		self.assertEqual(len(segundo), 2)
+		self.assertFalse({q.pk for q in primero} & {q.pk for q in segundo})
+		self.assertEqual(mail.claim(batch=3), [])
+
+		# El worker del primer lote murió: su reserva vence y otro la retoma
+		QueuedEmail.objects.filter(pk__in=[q.pk for q in primero]).update(lease_until=timezone.now() - timedelta(seconds=1))
+		retomados = mail.claim(batch=10)
+		self.assertEqual({q.pk for q in retomados}, {q.pk for q in primero})
+
+		self.assertEqual(mail.deliver_batch(retomados), 3)
+		self.assertFalse(QueuedEmail.objects.filter(sent=True).exclude(claimed_by='').exists())
+		self.assertFalse(QueuedEmail.objects.filter(sent=True, lease_until__isnull=False).exists())
+
+
+	@override_settings(EMAIL_BACKEND='apps.reports.tests.FailingEmailBackend', QUEUED_EMAIL_MAX_ATTEMPTS=2)
+	def test_exhausted_email_becomes_failed_and_leaves_the_queue(self):
+		queued = mail.enqueue('Asunto', 'Cuerpo', ['x@example.com'])
+		mail.deliver_batch(mail.claim())
+		QueuedEmail.objects.filter(pk=queued.pk).update(send_after=None)
+		mail.deliver_batch(mail.claim())
+		queued.refresh_from_db()
+		self.assertTrue(queued.failed)
+		self.assertIsNotNone(queued.failed_at)
+		self.assertIsNone(queued.send_after)
+		self.assertEqual(queued.attempts, 2)
+		self.assertEqual(mail.claim(), [])
+		self.assertFalse(mail.pending().exists())
+
+	def test_admin_retries_failed_emails(self):
+		admin = get_user_model().objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-90000002', rol='administrador')
+		fallidos = [
+			QueuedEmail.objects.create(to=[f'c{i}@example.com'], subject=f'Asunto {i}', body_text='Cuerpo', attempts=5, failed=True, failed_at=timezone.now())
+			for i in range(3)
+		]
+		url = reverse('reports:correos_fallidos')
+		self.assertEqual(self.client.get(url).status_code, 403)
+
+		self.client.force_login(admin)
+		resp = self.client.get(url)
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.context['correos']), 3)
+
+		resp = self.client.post(url, {'ids': [fallidos[0].pk]})
+		self.assertRedirects(resp, url)
+		fallidos[0].refresh_from_db()
+		self.assertFalse(fallidos[0].failed)
+		self.assertEqual(fallidos[0].attempts, 0)
+		self.assertEqual(QueuedEmail.objects.filter(failed=True).count(), 2)
+
+		self.client.post(url, {'todos': '1'})
+		self.assertFalse(QueuedEmail.objects.filter(failed=True).exists())
+		self.assertEqual(mail.process_queue(), (3, 3))
+
+	def test_purge_sent_only_removes_old_sent_emails(self):
+		antiguo = timezone.now() - timedelta(days=40)
+		viejos = [
+			QueuedEmail.objects.create(to=['c@example.com'], subject='Viejo', body_text='x', sent=True, sent_at=antiguo)
+			for _ in range(5)
+		]
+		reciente = QueuedEmail.objects.create(to=['c@example.com'], subject='Reciente', body_text='x', sent=True, sent_at=timezone.now())
+		pendiente = QueuedEmail.objects.create(to=['c@example.com'], subject='Pendiente', body_text='x')
+		fallido = QueuedEmail.objects.create(to=['c@example.com'], subject='Fallido', body_text='x', failed=True, failed_at=antiguo)
+
+		out = io.StringIO()
+		call_command('purge_sent_emails', days=30, batch_size=2, stdout=out)
+		self.assertIn('5 correos', out.getvalue())
+		self.assertFalse(QueuedEmail.objects.filter(pk__in=[q.pk for q in viejos]).exists())
+		self.assertEqual(
+			set(QueuedEmail.objects.values_list('pk', flat=True)),
+			{reciente.pk, pendiente.pk, fallido.pk},
+		)
+
+class EmailWorkerTests(TestCase):
+	def test_adaptive_delay(self):
+		delay = 0.5
+		esperas = []
+		for _ in range(7):
+			delay = mail.next_delay(delay, 0, 10, 0.5, 30)
+			esperas.append(delay)
+		self.assertEqual(esperas, [1.0, 2.0, 4.0, 8.0, 16.0, 30, 30])
+		self.assertEqual(mail.next_delay(30, 3, 10, 0.5, 30), 0.5)
+		self.assertEqual(mail.next_delay(30, 10, 10, 0.5, 30), 0)
+
+	def test_enqueue_wakes_the_dedicated_worker(self):
+		with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+			probe.bind(('127.0.0.1', 0))
+			port = probe.getsockname()[1]
+		stop = threading.Event()
+		wakes = [threading.Event(), threading.Event()]
+		with override_settings(QUEUED_EMAIL_WAKE_PORT=port):
+			listener = threading.Thread(target=mail.listen_for_wakeups, args=(stop, wakes))
+			listener.start()
+			try:
+				for _ in range(20):
+					with self.captureOnCommitCallbacks(execute=True):
+						mail.enqueue('Asunto', 'Cuerpo', ['c@example.com'])
+					if wakes[-1].wait(0.25):
+						break
+				# Cada hilo del worker tiene su propio evento y todos se despiertan
+				self.assertTrue(all(wake.is_set() for wake in wakes))
+			finally:
+				stop.set()
+				listener.join()
+		# Sin worker en proceso, el aviso no entrega nada por sí mismo
+		self.assertFalse(QueuedEmail.objects.filter(sent=True).exists())
+
+	def test_run_email_worker_once_drains_the_queue(self):
+		for i in range(15):
+			mail.enqueue(f'Asunto {i}', 'Cuerpo', [f'c{i}@example.com'])
+		call_command('run_email_worker', once=True, batch=4, stdout=io.StringIO())
+		self.assertEqual(QueuedEmail.objects.filter(sent=True).count(), 15)
+		self.assertEqual(len(django_mail.outbox), 15)
@@ -0,0 +1,124 @@
+"""Consulta pública de timelines por cédula (`timelines_by_cedula`).
+
+Los clientes consultan periódicamente el estado de sus equipos, así que la
+respuesta JSON de cada cédula se guarda ya serializada en la caché de Django
+junto con su ETag (hash del cuerpo) y su fecha de generación. Una consulta
+repetida con `If-None-Match` / `If-Modified-Since` se responde con 304 sin tocar
+la base de datos ni volver a codificar el JSON.
+
+Las señales de `FichaEntrada`, `Seguimiento` y `SeguimientoEvento` (y el pool
+de videos, que actualiza los eventos con `update()`) llaman a `invalidate` con
+la cédula afectada. Con varios procesos de servidor la caché debe ser
+compartida (`CACHES` con Redis o Memcached); la caché local por defecto solo
+invalida en el proceso que hizo el cambio.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import FichaEntrada, Seguimiento, SeguimientoEvento
+
+CACHE_PREFIX = 'reports:timelines:'
+
+
+def _timeout():
+    return getattr(settings, 'TIMELINES_CACHE_TIMEOUT', 3600)
+
+
+def cache_key(cedula):
+    return CACHE_PREFIX + hashlib.sha1(cedula.encode('utf-8')).hexdigest()
+
+
+def build_fichas(cedula):
+    """Fichas del cliente con el timeline de su último seguimiento.
+
+    Tres consultas en total sin importar cuántas fichas tenga el cliente: las
+    fichas, el último seguimiento de cada una (el slice del Prefetch se resuelve
+    con ROW_NUMBER() por ficha) y los eventos de esos seguimientos.
+    """
+    ultimo_seguimiento = Prefetch(
+        'seguimientos',
+        queryset=Seguimiento.objects.order_by('-fecha_ingreso', '-id').prefetch_related('eventos')[:1],
+        to_attr='ultimo_seguimiento',
+    )
+    fichas = (
+        FichaEntrada.objects.filter(cedula_cliente=cedula)
+        .order_by('fecha_creacion', 'id')
+        .prefetch_related(ultimo_seguimiento)
+    )
+    result = []
+    for ficha in fichas:
+        seguimiento = ficha.ultimo_seguimiento[0] if ficha.ultimo_seguimiento else None
+        # Formatear datos de ficha para presentar en el modal
+        result.append({
+            'id': ficha.id,
+            'codigo': ficha.codigo,
+            'tipo_equipo': ficha.get_tipo_equipo_display(),
+            'modelo': ficha.modelo,
+            'estado': seguimiento.estado if seguimiento else ficha.estado,
+            'progreso': seguimiento.progreso if seguimiento else 0,
+            'fechaIngreso': ficha.fecha_creacion.strftime('%d %b %Y'),
+            'fechaEstimada': seguimiento.fecha_estimada.strftime('%d %b %Y') if (seguimiento and seguimiento.fecha_estimada) else '',
+            'timeline': seguimiento.timeline if seguimiento else [],
+        })
+    return result
+
+
+def get_entry(cedula):
+    """Respuesta cacheada de `cedula`: dict con `body` (bytes JSON), `etag` y `last_modified`."""
+    key = cache_key(cedula)
+    entry = cache.get(key)
+    if entry is None:
+        body = json.dumps(
+            {'success': True, 'cedula': cedula, 'fichas': build_fichas(cedula)},
+            cls=DjangoJSONEncoder,
+        ).encode('utf-8')
+        entry = {
+            'body': body,
+            'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+            # Segundos enteros: es la resolución de Last-Modified / If-Modified-Since
+            'last_modified': int(timezone.now().timestamp()),
+        }
+        cache.set(key, entry, _timeout())
+    return entry
+
+
+def invalidate(*cedulas):
+    """Descarta la respuesta cacheada de las cédulas indicadas al confirmar la transacción.
+
+    Se borra también de inmediato; el borrado tras el commit evita que una
+    consulta concurrente vuelva a cachear los datos anteriores al cambio.
+    """
+    keys = [cache_key(c) for c in {c for c in cedulas if c}]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def cedula_de_ficha(ficha_id):
+    return FichaEntrada.objects.filter(pk=ficha_id).values_list('cedula_cliente', flat=True).first()
+
+
+def cedula_de_seguimiento(seguimiento_id):
+    return (
+        Seguimiento.objects.filter(pk=seguimiento_id)
+        .values_list('ficha__cedula_cliente', flat=True)
+        .first()
+    )
+
+
+def invalidate_evento(evento_id):
+    """Invalida la cédula dueña del evento (para cambios hechos con `update()`)."""
+    cedula = (
+        SeguimientoEvento.objects.filter(pk=evento_id)
+        .values_list('seguimiento__ficha__cedula_cliente', flat=True)
+        .first()
+    )
+    invalidate(cedula)
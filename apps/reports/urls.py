@@ -11,14 +11,20 @@ urlpatterns = [
     
     path('ficha_entrada/', views.ficha_entrada_view, name='ficha_entrada'),
     path('historial_equipos/', views.historial_equipos, name='historial_equipos'),
+    path('historial_equipos/json/', views.historial_equipos_json, name='historial_equipos_json'),
     path('get_equipo_details/<int:registro_id>/', views.get_equipo_details, name='get_equipo_details'),
     path('asignar_tecnico/<int:registro_id>/', views.asignar_tecnico, name='asignar_tecnico'),
     path('exportar_datos/', views.exportar_datos, name='exportar_datos'),
+    path('exportaciones/', views.export_job_create, name='export_job_create'),
+    path('exportaciones/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('exportaciones/<int:job_id>/descargar/', views.export_job_download, name='export_job_download'),
 
     path('ficha/<int:registro_id>/seguimiento/', views.add_seguimiento, name='add_seguimiento'),
     path('timelines/', views.timelines_by_cedula, name='timelines_by_cedula'),
 
-    path('estadisticas/', views.reporte_estadisticas, name='reporte_estadisticas')
+    path('estadisticas/', views.reporte_estadisticas, name='reporte_estadisticas'),
+    path('correos/fallidos/', views.CorreosFallidosView.as_view(), name='correos_fallidos'),
+    path('limites/', views.estado_limites, name='estado_limites'),
 
 
 ]
@@ -0,0 +1,302 @@
+"""Procesamiento en segundo plano de los videos de seguimiento.
+
+`add_seguimiento` solo guarda el archivo subido y registra el evento con
+`video_estado = 'pendiente'`; el recorte a los primeros `VIDEO_MAX_SECONDS`
+segundos, la conversión a H.264/AAC y la miniatura se hacen aquí, en un pool
+local de hilos, fuera de la petición y de la transacción que bloquea el
+`Seguimiento`. Al terminar se actualiza el evento (`video`, `poster`,
+`video_estado`), que el cliente ve en el JSON del timeline.
+
+Si el archivo subido ya es MP4 con H.264 (yuv420p) y AAC, el recorte se hace
+copiando los flujos (`-c copy`) sin recodificar: el corte empieza en el primer
+fotograma, que siempre es clave, y termina en el límite de paquete más cercano.
+Solo si la copia no es posible o falla se recodifica con libx264.
+
+ffmpeg se obtiene de `imageio-ffmpeg`. Los trabajos que quedaron pendientes tras
+un reinicio se retoman con `manage.py process_seguimiento_videos`.
+"""
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from . import timelines
+from .models import SeguimientoEvento
+
+logger = logging.getLogger(__name__)
+
+# Duración máxima (segundos) del video guardado
+VIDEO_MAX_SECONDS = getattr(settings, 'VIDEO_MAX_SECONDS', 10)
+# Tiempo máximo de cada invocación de ffmpeg
+VIDEO_TRANSCODE_TIMEOUT = getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT', 300)
+# Ancho máximo de la miniatura
+POSTER_WIDTH = 640
+
+VIDEO_DIR = 'seguimientos/videos'
+POSTER_DIR = 'seguimientos/posters'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class VideoError(Exception):
+    """Fallo al procesar un video (ffmpeg no disponible o error de conversión)."""
+
+
+def ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        raise VideoError('imageio-ffmpeg no está instalado.')
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def run_ffmpeg(args, timeout=None):
+    """Ejecuta ffmpeg con `args`; lanza `VideoError` con el final de stderr si falla."""
+    cmd = [ffmpeg_exe(), '-hide_banner', '-nostdin', '-loglevel', 'error', '-y'] + list(args)
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout or VIDEO_TRANSCODE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise VideoError('ffmpeg excedió el tiempo máximo.')
+    if result.returncode != 0:
+        stderr = result.stderr.decode('utf-8', 'replace').strip()
+        raise VideoError(stderr[-500:] or f'ffmpeg terminó con código {result.returncode}')
+    return result
+
+
+# Contenedores que se pueden servir tal cual al navegador tras copiar los flujos
+COPY_FORMATS = {'mov', 'mp4', 'm4a'}
+COPY_VIDEO_CODECS = {'h264'}
+COPY_AUDIO_CODECS = {'aac'}
+
+_INPUT_RE = re.compile(r'^Input #0, (.+?), from ', re.MULTILINE)
+_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+_VIDEO_RE = re.compile(r'Stream #0:\d+.*?: Video: (\w+)([^\n]*)')
+_AUDIO_RE = re.compile(r'Stream #0:\d+.*?: Audio: (\w+)')
+
+
+def probe(path):
+    """Lee contenedor, duración y códecs de `path` a partir de la salida de `ffmpeg -i`.
+
+    Devuelve un dict con `formats` (conjunto), `duration` (segundos o None),
+    `video_codec`, `pix_fmt` y `audio_codec` (None si no hay flujo).
+    """
+    try:
+        result = subprocess.run(
+            [ffmpeg_exe(), '-hide_banner', '-nostdin', '-i', path],
+            capture_output=True,
+            timeout=60,
+        )
+    except subprocess.TimeoutExpired:
+        raise VideoError('ffmpeg excedió el tiempo máximo al analizar el video.')
+    info = result.stderr.decode('utf-8', 'replace')
+    match = _INPUT_RE.search(info)
+    if not match:
+        raise VideoError('No se pudo leer el video.')
+    data = {
+        'formats': set(match.group(1).split(',')),
+        'duration': None,
+        'video_codec': None,
+        'pix_fmt': None,
+        'audio_codec': None,
+    }
+    match = _DURATION_RE.search(info)
+    if match:
+        h, m, sec = match.groups()
+        data['duration'] = int(h) * 3600 + int(m) * 60 + float(sec)
+    match = _VIDEO_RE.search(info)
+    if match:
+        data['video_codec'] = match.group(1)
+        pix = re.search(r', (yuv\w+|nv12|rgb\w+|gray\w*)', match.group(2))
+        data['pix_fmt'] = pix.group(1) if pix else None
+    match = _AUDIO_RE.search(info)
+    if match:
+        data['audio_codec'] = match.group(1)
+    return data
+
+
+def can_stream_copy(info):
+    """Indica si el video se puede recortar copiando flujos y reproducirse en el navegador."""
+    return (
+        bool(info['formats'] & COPY_FORMATS)
+        and info['video_codec'] in COPY_VIDEO_CODECS
+        and info['pix_fmt'] == 'yuv420p'
+        and (info['audio_codec'] is None or info['audio_codec'] in COPY_AUDIO_CODECS)
+    )
+
+
+def stream_copy(src, dst, max_seconds=None):
+    """Recorta `src` a `max_seconds` copiando los flujos, sin recodificar."""
+    run_ffmpeg([
+        '-i', src,
+        '-t', str(max_seconds or VIDEO_MAX_SECONDS),
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart',
+        dst,
+    ])
+
+
+def trim(src, dst, max_seconds=None):
+    """Recorta `src` en `dst` (MP4 H.264/AAC) por el camino más barato posible.
+
+    Devuelve 'copy' si bastó con copiar los flujos o 'transcode' si hubo que
+    recodificar.
+    """
+    try:
+        info = probe(src)
+    except VideoError:
+        logger.warning('No se pudo analizar %s; se recodificará', src)
+        info = None
+    if info and can_stream_copy(info):
+        try:
+            stream_copy(src, dst, max_seconds)
+            return 'copy'
+        except VideoError as e:
+            logger.warning('Falló la copia de flujos de %s (%s); se recodificará', src, e)
+    transcode(src, dst, max_seconds)
+    return 'transcode'
+
+
+def transcode(src, dst, max_seconds=None):
+    """Recorta `src` a `max_seconds` y lo convierte a MP4 H.264/AAC en `dst`."""
+    run_ffmpeg([
+        '-i', src,
+        '-t', str(max_seconds or VIDEO_MAX_SECONDS),
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '128k',
+        '-movflags', '+faststart',
+        dst,
+    ])
+
+
+def make_poster(src, dst):
+    """Extrae el primer fotograma de `src` como JPEG en `dst`."""
+    run_ffmpeg([
+        '-i', src,
+        '-frames:v', '1',
+        '-vf', f'scale=min({POSTER_WIDTH}\\,iw):-2',
+        '-q:v', '4',
+        dst,
+    ])
+
+
+def _storage_url(name):
+    try:
+        return default_storage.url(name)
+    except Exception:
+        return os.path.join(settings.MEDIA_URL, name)
+
+
+def save_upload(uploaded_file):
+    """Guarda el video subido tal cual y devuelve su ruta en el storage."""
+    ext = (os.path.splitext(uploaded_file.name)[1].lstrip('.') or 'mp4').lower()
+    return default_storage.save(f'{VIDEO_DIR}/{uuid4().hex}.{ext}', uploaded_file)
+
+
+def _local_copy(name, workdir):
+    """Ruta local del archivo del storage; lo descarga a `workdir` si el storage no es local."""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        local = os.path.join(workdir, 'origen' + os.path.splitext(name)[1])
+        with default_storage.open(name, 'rb') as src, open(local, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return local
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'VIDEO_TRANSCODE_WORKERS', 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reports-video')
+        return _executor
+
+
+def schedule(evento_id):
+    """Encola el evento en el pool local; con `VIDEO_TRANSCODE_WORKERS = 0` se procesa en línea."""
+    if getattr(settings, 'VIDEO_TRANSCODE_WORKERS', 1) <= 0:
+        process_event(evento_id)
+        return
+    _get_executor().submit(_run_in_thread, evento_id)
+
+
+def _run_in_thread(evento_id):
+    close_old_connections()
+    try:
+        process_event(evento_id)
+    finally:
+        close_old_connections()
+
+
+def process_event(evento_id):
+    """Procesa el video pendiente de un evento. Es seguro llamarlo más de una vez."""
+    claimed = SeguimientoEvento.objects.filter(
+        pk=evento_id,
+        video_estado=SeguimientoEvento.VIDEO_PENDIENTE,
+    ).update(video_estado=SeguimientoEvento.VIDEO_EN_PROCESO)
+    if not claimed:
+        return
+    evento = SeguimientoEvento.objects.get(pk=evento_id)
+    origen = evento.video_origen
+    base = uuid4().hex
+    workdir = tempfile.mkdtemp(prefix='seguimiento-video-')
+    try:
+        src = _local_copy(origen, workdir)
+        out_path = os.path.join(workdir, f'{base}.mp4')
+        poster_path = os.path.join(workdir, f'{base}.jpg')
+        metodo = trim(src, out_path)
+        make_poster(out_path, poster_path)
+        with open(out_path, 'rb') as f:
+            video_name = default_storage.save(f'{VIDEO_DIR}/{base}.mp4', File(f))
+        with open(poster_path, 'rb') as f:
+            poster_name = default_storage.save(f'{POSTER_DIR}/{base}.jpg', File(f))
+        SeguimientoEvento.objects.filter(pk=evento_id).update(
+            video=_storage_url(video_name),
+            poster=_storage_url(poster_name),
+            video_estado=SeguimientoEvento.VIDEO_LISTO,
+            video_error='',
+        )
+        try:
+            default_storage.delete(origen)
+        except Exception:
+            logger.exception('No se pudo eliminar el video original %s', origen)
+        logger.info('Video del evento %s procesado (%s): %s', evento_id, metodo, video_name)
+    except Exception as e:
+        # Sin conversión se deja disponible el archivo original
+        logger.exception('Error procesando el video del evento %s', evento_id)
+        SeguimientoEvento.objects.filter(pk=evento_id).update(
+            video=_storage_url(origen),
+            video_estado=SeguimientoEvento.VIDEO_ERROR,
+            video_error=str(e),
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        # Los `update()` no disparan señales: refrescar la consulta pública del cliente
+        timelines.invalidate_evento(evento_id)
+
+
+def process_pending(include_in_progress=False):
+    """Procesa en línea los videos pendientes (p.ej. tras un reinicio). Devuelve cuántos."""
+    estados = [SeguimientoEvento.VIDEO_PENDIENTE]
+    if include_in_progress:
+        estados.append(SeguimientoEvento.VIDEO_EN_PROCESO)
+    ids = list(SeguimientoEvento.objects.filter(video_estado__in=estados).values_list('pk', flat=True))
+    if include_in_progress:
+        SeguimientoEvento.objects.filter(pk__in=ids).update(video_estado=SeguimientoEvento.VIDEO_PENDIENTE)
+    for evento_id in ids:
+        process_event(evento_id)
+    return len(ids)
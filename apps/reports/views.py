@@ -1,36 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import TemplateView, CreateView, DetailView
+from django.views.generic import TemplateView, CreateView, DetailView, ListView
 from apps.authentication.mixins import AdminRequiredMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth.decorators import login_required
-from apps.authentication.decorators import tech_required
+from apps.authentication.decorators import admin_required, tech_required
+from apps.authentication.utils import get_client_ip
+from config.views import custom_429_view
 from django.views.decorators.http import require_http_methods
 from .forms import FichaEntradaForm, SeguimientoForm
 from django.contrib import messages
-from .models import FichaEntrada, Seguimiento, QueuedEmail
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from .models import FichaEntrada, Seguimiento, SeguimientoEvento, ExportJob, FichaEstadistica, QueuedEmail
+from . import export_jobs, exports, mail, ratelimit, search, timelines, video
+from .pagination import InvalidCursor, keyset_paginate
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, FileResponse
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 import json
 from django.template.loader import render_to_string
-from django.db.models import Q, Count
-from django.db.models.functions import TruncMonth
+from django.db.models import Q, Count, Sum
 from django.utils import timezone
-from datetime import datetime
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.formats import date_format
 import calendar
-import openpyxl
-from openpyxl.styles import Font, Alignment
-import io
-import os
 import logging
 from django.core.files.storage import default_storage
-from uuid import uuid4
 from django.db import transaction
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.core.mail import send_mail
 from django.utils.html import strip_tags
 
 logger = logging.getLogger(__name__)
@@ -99,35 +97,92 @@ def ficha_entrada_view(request):
         messages.error(request, f"Ocurrió un error al procesar la ficha de entrada: {e}")
         return render(request, 'reports/ficha_entrada.html', {'form': FichaEntradaForm()})
 
-@tech_required
-def historial_equipos(request):
+# Listado del historial: orden estable (más recientes primero) y proyección mínima
+HISTORIAL_PAGE_SIZE = getattr(settings, 'HISTORIAL_PAGE_SIZE', 50)
+HISTORIAL_MAX_PAGE_SIZE = 200
+HISTORIAL_KEYS = [('fecha_creacion', True), ('id', True)]
+HISTORIAL_SEARCH_KEYS = [('search_rank', False)] + HISTORIAL_KEYS
+HISTORIAL_FIELDS = (
+    'id',
+    'codigo',
+    'tipo_equipo',
+    'marca',
+    'modelo',
+    'nombre_cliente',
+    'apellido_cliente',
+    'cedula_cliente',
+    'tipo_falla',
+    'fecha_creacion',
+    'tecnico_asignado_id',
+)
+_TIPO_EQUIPO_LABELS = dict(FichaEntrada._meta.get_field('tipo_equipo').choices)
+_TIPO_FALLA_LABELS = dict(FichaEntrada._meta.get_field('tipo_falla').choices)
+
+
+def _is_tech_user(user):
+    return (getattr(user, 'rol', None) == 'tecnico') and (not user.is_superuser)
+
+
+def _historial_page_size(request):
+    try:
+        size = int(request.GET.get('limit', HISTORIAL_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = HISTORIAL_PAGE_SIZE
+    return max(1, min(size, HISTORIAL_MAX_PAGE_SIZE))
+
+
+def _historial_page(request, cursor=None):
+    """Obtiene una página del historial para el usuario de la petición.
+
+    Sin búsqueda ordena por (fecha_creacion, id) descendente; con búsqueda, por
+    relevancia y luego por fecha. Lanza `InvalidCursor` si el cursor no es válido.
+    """
     search_query = request.GET.get('search', '')
-    # Base queryset
     registros = FichaEntrada.objects.all()
-
     # Si el usuario es técnico (y no es superuser), limitar a sus fichas asignadas
-    is_tech_user = (getattr(request.user, 'rol', None) == 'tecnico') and (not request.user.is_superuser)
-    if is_tech_user:
+    if _is_tech_user(request.user):
         registros = registros.filter(tecnico_asignado=request.user)
 
-    # Aplicar búsqueda sobre el queryset ya filtrado
+    keys = HISTORIAL_KEYS
     if search_query:
-        # agregamos el filtro por el tecnico asignado
-        registros = registros.filter(
-            Q(codigo__icontains=search_query) |
-            Q(nombre_cliente__icontains=search_query) |
-            Q(apellido_cliente__icontains=search_query) |
-            Q(cedula_cliente__icontains=search_query) |
-            Q(marca__icontains=search_query) |
-            Q(modelo__icontains=search_query) |
-            Q(dependencia__icontains=search_query) |
-            Q(ubicacion__icontains=search_query) |
-            Q(departamento_cliente__icontains=search_query) |
-            Q(numero_serie__icontains=search_query) |
-            Q(descripcion_falla__icontains=search_query) |
-            Q(tipo_falla__icontains=search_query) |
-            Q(fecha_creacion__icontains=search_query)
-        ).distinct()
+        registros = search.rank_fichas(registros, search_query)
+        keys = HISTORIAL_SEARCH_KEYS
+
+    # La tabla sólo necesita el id del técnico asignado (columna local), así que
+    # la proyección con values() no requiere JOIN contra usuarios.
+    return keyset_paginate(
+        registros,
+        keys,
+        cursor=cursor,
+        page_size=_historial_page_size(request),
+        fields=HISTORIAL_FIELDS,
+    )
+
+
+def _historial_row(row):
+    """Convierte una fila de `values()` al formato que consumen la plantilla y el JSON."""
+    fecha = row['fecha_creacion']
+    return {
+        'id': row['id'],
+        'codigo': row['codigo'],
+        'tipo_equipo': _TIPO_EQUIPO_LABELS.get(row['tipo_equipo'], row['tipo_equipo']),
+        'marca': row['marca'],
+        'modelo': row['modelo'],
+        'cliente': f"{row['nombre_cliente']} {row['apellido_cliente']}",
+        'cedula_cliente': row['cedula_cliente'],
+        'tipo_falla': _TIPO_FALLA_LABELS.get(row['tipo_falla'], row['tipo_falla']),
+        'fecha_creacion': date_format(timezone.localtime(fecha), 'DATETIME_FORMAT') if fecha else '',
+        'tecnico_asignado_id': row['tecnico_asignado_id'],
+    }
+
+
+@tech_required
+def historial_equipos(request):
+    is_tech_user = _is_tech_user(request.user)
+    # La primera página se renderiza en el servidor; el resto lo pide la tabla
+    # a `historial_equipos_json` a medida que el usuario hace scroll.
+    page = _historial_page(request)
+    registros = [_historial_row(row) for row in page.rows]
 
     # Lista de técnicos para el selector en la plantilla: si es técnico, solo incluirse a sí mismo
     if is_tech_user:
@@ -135,7 +190,36 @@ def historial_equipos(request):
     else:
         users = CustomUser.objects.filter(rol__in=['tecnico', 'administrador'])
 
-    return render(request, 'reports/historial_equipos.html', {'registros': registros, 'users': users, 'is_tech_user': is_tech_user})
+    return render(request, 'reports/historial_equipos.html', {
+        'registros': registros,
+        'next_cursor': page.next_cursor,
+        'users': users,
+        'is_tech_user': is_tech_user,
+    })
+
+
+@tech_required
+def historial_equipos_json(request):
+    """Página siguiente del historial en JSON.
+
+    Parámetros GET:
+    - cursor: valor `next_cursor` devuelto por la página anterior (vacío = primera página)
+    - search: misma búsqueda que el listado HTML
+    - limit: tamaño de página (máximo 200)
+
+    Respuesta JSON:
+    { success: true, results: [ {...}, ... ], next_cursor: '...' | null, has_next: bool }
+    """
+    try:
+        page = _historial_page(request, cursor=request.GET.get('cursor') or None)
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'results': [_historial_row(row) for row in page.rows],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    })
 
 @login_required
 def get_equipo_details(request, registro_id):
@@ -185,150 +269,227 @@ def asignar_tecnico(request, registro_id):
     tecnicos = CustomUser.objects.filter(rol__in=['tecnico', 'administrador'])
     return render(request, 'reports/asignar_tecnico.html', {'tecnicos': tecnicos})
 
-def exportar_datos(request):
-    search_query = request.GET.get('search', '')
-    # Base queryset
+# Columnas de la exportación del historial: (encabezado, ancho aproximado)
+EXPORT_COLUMNS = [
+    ('Código', 15),
+    ('Tipo de Equipo', 25),
+    ('Marca', 18),
+    ('Modelo', 18),
+    ('Cliente', 30),
+    ('Tipo de Falla', 28),
+    ('Fecha de Creación', 20),
+]
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _export_rows(registros):
+    """Itera las fichas a exportar como tuplas listas para escribir, sin instanciar modelos."""
+    rows = registros.order_by('id').values_list(
+        'codigo', 'tipo_equipo', 'marca', 'modelo', 'nombre_cliente',
+        'apellido_cliente', 'tipo_falla', 'fecha_creacion',
+    )
+    for codigo, tipo_equipo, marca, modelo, nombre, apellido, tipo_falla, fecha in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield (
+            codigo,
+            _TIPO_EQUIPO_LABELS.get(tipo_equipo, tipo_equipo),
+            marca,
+            modelo,
+            f"{nombre} {apellido}",
+            _TIPO_FALLA_LABELS.get(tipo_falla, tipo_falla),
+            fecha.strftime('%Y-%m-%d %H:%M:%S'),
+        )
+
+
+def _historial_export_queryset(user, search_query):
     registros = FichaEntrada.objects.all()
     # Si el usuario es técnico (y no es superuser), limitar a sus fichas asignadas
-    is_tech_user = (getattr(request.user, 'rol', None) == 'tecnico') and (not request.user.is_superuser)
-    if is_tech_user:
-        registros = registros.filter(tecnico_asignado=request.user)
-
-    # Aplicar búsqueda sobre el queryset ya filtrado
+    if _is_tech_user(user):
+        registros = registros.filter(tecnico_asignado=user)
+    # Aplicar búsqueda sobre el queryset ya filtrado (mismo índice que el historial)
     if search_query:
-        registros = registros.filter(
-            Q(marca__icontains=search_query) |
-            Q(modelo__icontains=search_query) |
-            Q(nombre_cliente__icontains=search_query) |
-            Q(apellido_cliente__icontains=search_query) |
-            Q(departamento_cliente__icontains=search_query) |
-            Q(tipo_equipo__icontains=search_query) |
-            Q(codigo__icontains=search_query)
-        ).distinct()
-
-    # 1. Crear un nuevo libro de trabajo de Excel
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-
-    # 2. Definir el estilo de fuente en negrita
-    bold_font = Font(bold=True)
-
-    # 3. Encabezados (Fila 1)
-    headers = [
-        'Código',
-        'Tipo de Equipo',
-        'Marca',
-        'Modelo',
-        'Cliente',
-        'Tipo de Falla',
-        'Fecha de Creación',
-    ]
-
-    # Escribir los encabezados en la primera fila y aplicar negrita
-    for col_num, header_title in enumerate(headers, 1):
-        cell = sheet.cell(row=1, column=col_num, value=header_title)
-        cell.font = bold_font  # <--- Aplicar el estilo de negrita
-
-    # 4. Escribir los datos (A partir de la Fila 2)
-    row_num = 2
-    for registro in registros:
-        sheet.cell(row=row_num, column=1, value=registro.codigo)
-        sheet.cell(row=row_num, column=2, value=registro.get_tipo_equipo_display())
-        sheet.cell(row=row_num, column=3, value=registro.marca)
-        sheet.cell(row=row_num, column=4, value=registro.modelo)
-        sheet.cell(row=row_num, column=5, value=f"{registro.nombre_cliente} {registro.apellido_cliente}")
-        sheet.cell(row=row_num, column=6, value=registro.get_tipo_falla_display())
-        sheet.cell(row=row_num, column=7, value=registro.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'))
-        row_num += 1
-
-    # 5. Crear la respuesta HTTP para el archivo XLSX
-    output = io.BytesIO()
-    workbook.save(output)
-    output.seek(0)
-
-    # Crear la respuesta HTTP con el tipo de contenido correcto para Excel
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        registros = search.filter_fichas(registros, search_query)
+    return registros
+
+
+def _historial_export_stream(tipo, rows):
+    headers = [title for title, _ in EXPORT_COLUMNS]
+    if tipo == 'historial_csv':
+        return exports.stream_csv(headers, rows)
+    return exports.stream_xlsx(headers, rows, sheet_title='Historial', column_widths=[width for _, width in EXPORT_COLUMNS])
+
+
+def build_historial_export(job, fileobj, progress):
+    """Generador del trabajo en segundo plano para `historial_xlsx` / `historial_csv`."""
+    registros = _historial_export_queryset(job.solicitante, job.filtros.get('search', ''))
+    rows = export_jobs.track(_export_rows(registros), progress, total=registros.count())
+    exports.write_stream(_historial_export_stream(job.tipo, rows), fileobj)
+
+
+def exportar_datos(request):
+    """Exporta el historial filtrado en streaming.
+
+    Parámetros GET:
+    - search: misma búsqueda que el historial
+    - formato: 'xlsx' (por defecto) o 'csv'
+    - background: si vale '1', se genera en segundo plano y se responde con el
+      trabajo creado (ver `export_job_status`)
+    """
+    formato = 'csv' if request.GET.get('formato') == 'csv' else 'xlsx'
+    if request.GET.get('background') == '1':
+        return _submit_export_job(request, f'historial_{formato}', request.GET)
+
+    registros = _historial_export_queryset(request.user, request.GET.get('search', ''))
+    rows = _export_rows(registros)
+    return exports.streaming_response(
+        _historial_export_stream(f'historial_{formato}', rows),
+        f'historial_equipos.{formato}',
+        exports.CSV_CONTENT_TYPE if formato == 'csv' else exports.XLSX_CONTENT_TYPE,
     )
-    response['Content-Disposition'] = 'attachment; filename="historial_equipos.xlsx"'
 
-    return response
+
+def _export_job_json(job):
+    data = {
+        'id': job.id,
+        'tipo': job.tipo,
+        'estado': job.estado,
+        'progreso': job.progreso,
+        'filas_procesadas': job.filas_procesadas,
+        'total_filas': job.total_filas,
+        'error': job.error,
+        'status_url': reverse('reports:export_job_status', args=[job.id]),
+        'download_url': None,
+        'expira': job.expira.isoformat() if job.expira else None,
+    }
+    if job.estado == ExportJob.ESTADO_COMPLETADO and job.archivo:
+        data['download_url'] = reverse('reports:export_job_download', args=[job.id])
+    return data
+
+
+def _submit_export_job(request, tipo, params):
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': False, 'message': 'Autenticación requerida.'}, status=401)
+    try:
+        job, created = export_jobs.submit(tipo, params, request.user)
+    except export_jobs.ExportJobError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=403)
+    return JsonResponse({'success': True, 'created': created, 'job': _export_job_json(job)}, status=202)
+
+
+def _get_own_export_job(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id)
+    if job.solicitante_id != request.user.id and not request.user.is_superuser:
+        raise PermissionDenied('No tienes permiso para ver esta exportación.')
+    return job
+
 
 @login_required
-def reporte_estadisticas(request):
-    # Construir queryset base aplicando filtros opcionales provistos en GET
-    def _apply_stats_filters(req):
-        qs = FichaEntrada.objects.all()
-        search = (req.GET.get('search') or '').strip()
-        if not search:
-            return qs
-
-        q = Q()
-        # Búsqueda libre sobre campos relevantes
-        q |= Q(codigo__icontains=search)
-        q |= Q(nombre_cliente__icontains=search)
-        q |= Q(apellido_cliente__icontains=search)
-        q |= Q(cedula_cliente__icontains=search)
-        q |= Q(marca__icontains=search)
-        q |= Q(modelo__icontains=search)
-        # sede/ubicación (ej: 'barinas')
-        q |= Q(ubicacion__icontains=search)
-        # número de serie y contactos/cliente
-        q |= Q(numero_serie__icontains=search)
-        q |= Q(correo_cliente__icontains=search)
-        q |= Q(telefono_cliente__icontains=search)
-        q |= Q(dependencia__icontains=search)
-        q |= Q(departamento_cliente__icontains=search)
-        q |= Q(tipo_equipo__icontains=search)
-        # si el usuario escribió la etiqueta libre del tipo/falla cuando usó 'otro'
-        q |= Q(tipo_equipo_otro__icontains=search)
-        q |= Q(tipo_falla__icontains=search)
-        q |= Q(tipo_falla_otro__icontains=search)
-        q |= Q(descripcion_falla__icontains=search)
-        # descripción general/observaciones del equipo
-        q |= Q(descripcion__icontains=search)
-        q |= Q(observaciones__icontains=search)
-        # técnico - buscar por nombre/apellido/username
-        q |= Q(tecnico_asignado__first_name__icontains=search)
-        q |= Q(tecnico_asignado__last_name__icontains=search)
-        q |= Q(tecnico_asignado__username__icontains=search)
-
-        # Intentar interpretar search como fecha (yyyy-mm-dd o dd/mm/yyyy)
-        try:
-            # primero yyyy-mm-dd
-            fecha = datetime.strptime(search, '%Y-%m-%d').date()
-            q |= Q(fecha_creacion__date=fecha)
-        except Exception:
-            try:
-                fecha = datetime.strptime(search, '%d/%m/%Y').date()
-                q |= Q(fecha_creacion__date=fecha)
-            except Exception:
-                pass
+@require_http_methods(["POST"])
+def export_job_create(request):
+    """Crea (o reutiliza) una exportación en segundo plano.
 
-        return qs.filter(q).distinct()
+    Parámetros POST: `tipo` (ver `export_jobs.EXPORT_TYPES`) y los filtros del tipo.
+    """
+    return _submit_export_job(request, request.POST.get('tipo', ''), request.POST)
 
-    base_qs = _apply_stats_filters(request)
+
+@login_required
+def export_job_status(request, job_id):
+    """Estado y progreso de una exportación en JSON."""
+    job = _get_own_export_job(request, job_id)
+    export_jobs.resume_if_stale(job)
+    return JsonResponse({'success': True, 'job': _export_job_json(job)})
+
+
+@login_required
+def export_job_download(request, job_id):
+    job = _get_own_export_job(request, job_id)
+    if job.estado != ExportJob.ESTADO_COMPLETADO or not job.archivo:
+        return JsonResponse({'success': False, 'message': 'La exportación no está disponible.'}, status=404)
+    spec = export_jobs.get_spec(job.tipo)
+    try:
+        archivo = job.archivo.open('rb')
+    except FileNotFoundError:
+        return JsonResponse({'success': False, 'message': 'El archivo de la exportación ya no existe.'}, status=404)
+    return FileResponse(archivo, as_attachment=True, filename=f"{spec['filename']}.{spec['extension']}")
+
+def _estadisticas_agrupadas(base_qs, medida, campo_fecha, year):
+    """Calcula todas las métricas del reporte de estadísticas en una sola consulta.
+
+    Agrupa `base_qs` por (tipo de equipo, estado, técnico) y, con agregación
+    condicional, obtiene en la misma fila el conteo de cada mes de `year`. Los
+    desgloses se combinan después en Python a partir de esas filas.
+
+    - medida: función que devuelve la expresión de conteo, admitiendo `filter=`
+      (p.ej. `Count('id', ...)` sobre fichas o `Sum('total', ...)` sobre agregados).
+    - campo_fecha: campo de fecha sobre el que se calculan los meses.
+    """
+    meses = {
+        f'mes_{m}': medida(filter=Q(**{f'{campo_fecha}__year': year, f'{campo_fecha}__month': m}))
+        for m in range(1, 13)
+    }
+    filas = base_qs.values(
+        'tipo_equipo',
+        'estado',
+        'tecnico_asignado__id',
+        'tecnico_asignado__first_name',
+        'tecnico_asignado__last_name',
+    ).annotate(count=medida(), **meses).order_by()
+
+    total = 0
+    por_tipo = {}
+    por_estado = {}
+    por_tecnico = {}
+    por_mes = [0] * 12
+    for fila in filas:
+        count = fila['count'] or 0
+        if not count:
+            continue
+        total += count
+        por_tipo[fila['tipo_equipo']] = por_tipo.get(fila['tipo_equipo'], 0) + count
+        por_estado[fila['estado']] = por_estado.get(fila['estado'], 0) + count
+        tecnico = por_tecnico.setdefault(fila['tecnico_asignado__id'], {
+            'tecnico_asignado__id': fila['tecnico_asignado__id'],
+            'tecnico_asignado__first_name': fila['tecnico_asignado__first_name'],
+            'tecnico_asignado__last_name': fila['tecnico_asignado__last_name'],
+            'count': 0,
+        })
+        tecnico['count'] += count
+        for m in range(12):
+            por_mes[m] += fila[f'mes_{m + 1}'] or 0
+
+    return {
+        'total': total,
+        'por_tipo': [{'tipo_equipo': k, 'count': v} for k, v in por_tipo.items()],
+        'por_estado': [{'estado': k, 'count': v} for k, v in por_estado.items()],
+        'por_tecnico': sorted(por_tecnico.values(), key=lambda t: -t['count']),
+        'por_mes': por_mes,
+    }
+
+
+@login_required
+def reporte_estadisticas(request):
+    search_term = (request.GET.get('search') or '').strip()
+    if search_term:
+        # Búsqueda libre sobre el índice de fichas: cubre datos del equipo y del
+        # cliente, sede, tipo/falla (incluida la etiqueta 'otro'), técnico
+        # asignado y fecha de creación (yyyy-mm-dd o dd/mm/yyyy). Las fichas que
+        # coinciden se resuelven una sola vez en la subconsulta de ids del índice.
+        base_qs = search.filter_fichas(FichaEntrada.objects.all(), search_term)
+        medida = lambda **kw: Count('id', **kw)
+        campo_fecha = 'fecha_creacion'
+    else:
+        # Sin búsqueda se leen los agregados diarios: el coste depende del número
+        # de cubetas, no del número de fichas
+        base_qs = FichaEstadistica.objects.all()
+        medida = lambda **kw: Sum('total', **kw)
+        campo_fecha = 'fecha'
 
     # Si el usuario es técnico (y no es superuser), limitar el queryset a las fichas
     # asignadas a ese técnico para que tanto tablas como gráficos muestren solo su información.
-    is_tech_user = (getattr(request.user, 'rol', None) == 'tecnico') and (not request.user.is_superuser)
+    is_tech_user = _is_tech_user(request.user)
     if is_tech_user:
         base_qs = base_qs.filter(tecnico_asignado=request.user)
 
-    # Obtenemos estadisticas y metricas relevantes sobre el queryset filtrado
-    total_equipos = base_qs.count()
-    equipos_por_tipo = base_qs.values('tipo_equipo').annotate(count=Count('tipo_equipo'))
-    equipos_por_estado = base_qs.values('estado').annotate(count=Count('estado'))
-    # Conteo por técnico (usamos nombre completo cuando esté disponible)
-    equipos_por_tecnico_qs = base_qs.values(
-        'tecnico_asignado__id',
-        'tecnico_asignado__first_name',
-        'tecnico_asignado__last_name'
-    ).annotate(count=Count('id')).order_by('-count')
-
-    # Preparar datos para los gráficos
-    # Reparaciones por mes (año actual, meses 1-12)
     # Permitir seleccionar año/mes desde GET (para ver reparaciones en un mes específico)
     current_year = timezone.now().year
     # leer parámetros opcionales
@@ -339,16 +500,14 @@ def reporte_estadisticas(request):
     except Exception:
         year_int = current_year
 
-    # Usar base_qs para calcular reparaciones por mes del año seleccionado
-    reparaciones_mes_qs = (
-        base_qs.filter(fecha_creacion__year=year_int)
-        .annotate(month=TruncMonth('fecha_creacion'))
-        .values('month')
-        .annotate(count=Count('id'))
-        .order_by('month')
-    )
+    # Todas las métricas y gráficos salen de una única consulta agrupada
+    stats = _estadisticas_agrupadas(base_qs, medida, campo_fecha, year_int)
+    total_equipos = stats['total']
+    equipos_por_tipo = stats['por_tipo']
+    equipos_por_estado = stats['por_estado']
+    equipos_por_tecnico_qs = stats['por_tecnico']
 
-    # Si se seleccionó mes específico, calcular el conteo para ese mes
+    # Si se seleccionó mes específico, tomar el conteo de ese mes
     rep_count_for_month = None
     selected_month = None
     try:
@@ -356,15 +515,13 @@ def reporte_estadisticas(request):
             month_int = int(month_param)
             if 1 <= month_int <= 12:
                 selected_month = month_int
-                rep_count_for_month = base_qs.filter(fecha_creacion__year=year_int, fecha_creacion__month=month_int).count()
+                rep_count_for_month = stats['por_mes'][month_int - 1]
     except Exception:
         rep_count_for_month = None
 
-    # Mapeo de mes (1-12) a conteo
-    meses_map = {item['month'].month: item['count'] for item in reparaciones_mes_qs}
     meses_es = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre']
     reparaciones_por_mes_labels = meses_es
-    reparaciones_por_mes_data = [meses_map.get(i, 0) for i in range(1,13)]
+    reparaciones_por_mes_data = stats['por_mes']
 
     # Preparar datos por tecnico
     reparaciones_por_tecnico_labels = []
@@ -463,10 +620,10 @@ def add_seguimiento(request, registro_id):
     else:
         tecnico_instance = cleaned.get('tecnico') if 'tecnico' in cleaned else None
 
+    # El video se guarda tal como se subió; el recorte, la conversión y la
+    # miniatura se hacen en segundo plano al confirmar la transacción (ver video.py)
     video_file = request.FILES.get('video')
-    video_url = None
-    video_trimmed = False
-    video_trim_error = None
+    video_origen = video.save_upload(video_file) if video_file else ''
 
     try:
         with transaction.atomic():
@@ -475,11 +632,14 @@ def add_seguimiento(request, registro_id):
             # Validación: no permitir registrar un estado que ya exista en el timeline
             if seguimiento:
                 try:
-                    existing_timeline = list(seguimiento.timeline or [])
-                    used_estados = set([(ev.get('estado') or '').strip().lower() for ev in existing_timeline if ev.get('estado')])
                     new_estado = (estado or '').strip().lower()
-                    if new_estado and new_estado in used_estados:
+                    # iexact: los eventos migrados desde el JSON pueden conservar mayúsculas o espacios
+                    if new_estado and seguimiento.eventos.filter(estado__iexact=new_estado).exists():
                         # Determinar siguiente estado sugerido según la secuencia lógica
+                        used_estados = {
+                            (e or '').strip().lower()
+                            for e in seguimiento.eventos.values_list('estado', flat=True).distinct()
+                        }
                         sequence = ['recepcion', 'diagnostico', 'reparacion', 'pruebas', 'listo', 'entregado']
                         choice_map = dict(Seguimiento.ESTADO_CHOICES)
                         next_state = None
@@ -497,6 +657,8 @@ def add_seguimiento(request, registro_id):
                             msg = f"No puede usar el estado '{used_display}' porque ya fue usado en el timeline. No hay estados siguientes disponibles."
 
                         form.add_error(None, msg)
+                        if video_origen:
+                            default_storage.delete(video_origen)
                         html = render_to_string('reports/seguimiento_form_partial.html', {'form': form, 'ficha': ficha}, request=request)
                         return JsonResponse({'success': False, 'html': html, 'message': msg}, status=400)
                 except Exception:
@@ -521,53 +683,21 @@ def add_seguimiento(request, registro_id):
                     seguimiento.tecnico = tecnico_instance
                 seguimiento.save()
 
-            # Si se subió un video, guardarlo en storage con nombre único
-            if video_file:
-                ext = (video_file.name.split('.')[-1] or 'mp4').lower()
-                filename = f"seguimientos/videos/{uuid4().hex}.{ext}"
-                saved_path = default_storage.save(filename, video_file)
-                try:
-                    video_url = default_storage.url(saved_path)
-                except Exception:
-                    video_url = os.path.join(settings.MEDIA_URL, saved_path)
-
-                # Intentar recortar si storage provee un path local
-                try:
-                    local_path = default_storage.path(saved_path)
-                    from moviepy.editor import VideoFileClip
-                    clip = VideoFileClip(local_path)
-                    end_t = min(10, clip.duration)
-                    if clip.duration > end_t:
-                        tmp_path = local_path + '.tmp.mp4'
-                        clip.subclip(0, end_t).write_videofile(tmp_path, codec='libx264', audio_codec='aac', logger=None)
-                        clip.close()
-                        os.replace(tmp_path, local_path)
-                    else:
-                        clip.close()
-                    video_trimmed = True
-                except NotImplementedError:
-                    # Storage no provee path local (p.ej. S3) — no intentamos recortar aquí
-                    video_trim_error = 'storage_has_no_local_path'
-                except Exception as e:
-                    logger.exception('Error recortando video: %s', e)
-                    video_trim_error = str(e)
-
-            # Construir evento y añadir al timeline
-            evento = {
-                'fecha': timezone.now().isoformat(),
-                'titulo': dict(Seguimiento.ESTADO_CHOICES).get(estado, estado),
-                'descripcion': descripcion,
-                'estado': estado,
-                'progreso': progreso,
-                'tecnico': tecnico_instance.get_full_name() if tecnico_instance else '',
-                'autor': request.user.get_full_name() or request.user.username,
-                'video': video_url,
-            }
-
-            existing_timeline = list(seguimiento.timeline or [])
-            existing_timeline.append(evento)
-            seguimiento.timeline = existing_timeline
-            seguimiento.save()
+            # Registrar el evento en el timeline
+            evento_obj = SeguimientoEvento.objects.create(
+                seguimiento=seguimiento,
+                titulo=dict(Seguimiento.ESTADO_CHOICES).get(estado, estado),
+                descripcion=descripcion,
+                estado=estado,
+                progreso=progreso,
+                tecnico=tecnico_instance.get_full_name() if tecnico_instance else '',
+                autor=request.user.get_full_name() or request.user.username,
+                video_origen=video_origen,
+                video_estado=SeguimientoEvento.VIDEO_PENDIENTE if video_origen else '',
+            )
+            if video_origen:
+                transaction.on_commit(lambda: video.schedule(evento_obj.pk))
+            evento = evento_obj.as_timeline_dict()
 
             # Sincronizar el estado del seguimiento con la FichaEntrada relacionada
             # Mapeo entre los estados del modelo Seguimiento y los valores válidos en FichaEntrada
@@ -612,7 +742,6 @@ def add_seguimiento(request, registro_id):
                         logger.info('Estado "%s" no mapeado para envío de email (ficha=%s). Keys disponibles: %s', estado_key, ficha_obj.id, ','.join(template_map.keys()))
                         return
                     subject = f"Estado de su equipo {ficha_obj.codigo}: {evento_obj.get('titulo', '')}"
-                    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@example.com')
                     to_email = [ficha_obj.correo_cliente]
                     
                     equipo_ctx = {
@@ -648,35 +777,10 @@ def add_seguimiento(request, registro_id):
                         logger.exception('Falló render_to_string con request, intentando sin request')
                         html_content = render_to_string(tpl, context)
                     text_content = strip_tags(html_content)
-                    try:
-                        logger.info('Intentando enviar correo a %s (ficha=%s, estado=%s, plantilla=%s)', ficha_obj.correo_cliente, ficha_obj.id, estado_key, tpl)
-                        # Usar send_mail con html_message; send_mail devuelve el número de mensajes enviados
-                        sent = send_mail(
-                            subject,
-                            text_content,
-                            from_email,
-                            to_email,
-                            fail_silently=False,
-                            html_message=html_content,
-                        )
-                        logger.info('send_mail returned: %s', sent)
-                        logger.info('Correo enviado a %s para ficha %s estado=%s', ficha_obj.correo_cliente, ficha_obj.id, estado_key)
-                    except Exception as send_ex:
-                        # Registrar y encolar el correo para reintento en background
-                        logger.exception('Error enviando correo a %s: %s', ficha_obj.correo_cliente, send_ex)
-                        try:
-                            QueuedEmail.objects.create(
-                                to=[ficha_obj.correo_cliente],
-                                subject=subject,
-                                body_text=text_content,
-                                body_html=html_content,
-                                attempts=0,
-                                last_error=str(send_ex),
-                            )
-                            logger.info('Correo encolado para reintento a %s (ficha=%s)', ficha_obj.correo_cliente, ficha_obj.id)
-                        except Exception:
-                            logger.exception('No se pudo encolar el correo para ficha %s', ficha_obj.id)
-                    
+                    # Bandeja de salida: el correo se guarda en esta misma transacción y se
+                    # entrega en segundo plano al confirmarse (ver mail.py)
+                    queued = mail.enqueue(subject, text_content, to_email, body_html=html_content)
+                    logger.info('Correo %s encolado para %s (ficha=%s, estado=%s, plantilla=%s)', queued.pk, ficha_obj.correo_cliente, ficha_obj.id, estado_key, tpl)
 
                 # Llamada al helper (no bloquear si falla)
                 _send_event_email(ficha, seguimiento, evento)
@@ -685,9 +789,42 @@ def add_seguimiento(request, registro_id):
 
     except Exception as e:
         logger.exception('Error procesando add_seguimiento: %s', e)
+        if video_origen:
+            default_storage.delete(video_origen)
         return JsonResponse({'success': False, 'message': 'Error interno procesando el seguimiento.'}, status=500)
 
-    return JsonResponse({'success': True, 'message': 'Evento añadido al timeline', 'event': evento, 'seguimiento_id': seguimiento.id, 'video_trimmed': video_trimmed, 'video_trim_error': video_trim_error})
+    return JsonResponse({'success': True, 'message': 'Evento añadido al timeline', 'event': evento, 'seguimiento_id': seguimiento.id, 'video_estado': evento.get('video_estado')})
+
+
+# Límites por defecto de la consulta pública: (ráfaga, consultas por segundo)
+TIMELINES_RATE_LIMITS = {
+    'ip': (30, 0.5),
+    'cedula': (20, 0.2),
+}
+
+
+def _timelines_rate_limit(request, cedula):
+    """Consume una ficha de las cubetas de IP y de cédula; devuelve el Retry-After si se excede."""
+    limits = {**TIMELINES_RATE_LIMITS, **getattr(settings, 'TIMELINES_RATE_LIMITS', {})}
+    for name, key in (('ip', get_client_ip(request)), ('cedula', cedula)):
+        capacity, rate = limits[name]
+        allowed, retry_after = ratelimit.TokenBucket(f'timelines_{name}', capacity, rate).consume(key)
+        if not allowed:
+            logger.warning('Consulta de timelines limitada por %s (%s)', name, get_client_ip(request))
+            return retry_after
+    return None
+
+
+def _too_many_requests(request, retry_after):
+    if 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse(
+            {'success': False, 'message': 'Demasiadas consultas. Intenta nuevamente en unos segundos.', 'retry_after': retry_after},
+            status=429,
+        )
+    else:
+        response = custom_429_view(request)
+    response['Retry-After'] = str(retry_after)
+    return response
 
 
 def timelines_by_cedula(request):
@@ -698,38 +835,61 @@ def timelines_by_cedula(request):
 
     Respuesta JSON:
     { success: true, cedula: '...', fichas: [ { id, codigo, tipo_equipo, modelo, estado, progreso, fecha_ingreso, fecha_estimada, timeline: [...] }, ... ] }
+
+    La respuesta se cachea por cédula (ver `timelines.py`) y lleva ETag y
+    Last-Modified; si el cliente envía los valores vigentes se responde 304.
+    Las consultas se limitan por IP y por cédula (ver `ratelimit.py`).
     """
     cedula = request.GET.get('cedula', '').strip()
     if not cedula:
         return JsonResponse({'success': False, 'message': 'Parámetro cedula requerido.'}, status=400)
+    if len(cedula) > FichaEntrada._meta.get_field('cedula_cliente').max_length:
+        return JsonResponse({'success': False, 'message': 'Cédula no válida.'}, status=400)
 
-    try:
-        fichas = FichaEntrada.objects.filter(cedula_cliente=cedula)
-        result = []
-        for ficha in fichas:
-            # Obtener el seguimiento asociado (si existe)
-            seguimiento = Seguimiento.objects.filter(ficha=ficha).order_by('-fecha_ingreso').first()
-            timeline = []
-            if seguimiento:
-                # Asegurarse de que timeline sea lista
-                timeline = list(seguimiento.timeline or [])
-                # Normalizar campos: si un evento tiene ruta relativa de video, dejarla como viene
-            # Formatear datos de ficha para presentar en el modal
-            item = {
-                'id': ficha.id,
-                'codigo': ficha.codigo,
-                'tipo_equipo': ficha.get_tipo_equipo_display(),
-                'modelo': ficha.modelo,
-                'estado': seguimiento.estado if seguimiento else ficha.estado,
-                'progreso': seguimiento.progreso if seguimiento else 0,
-                'fechaIngreso': ficha.fecha_creacion.strftime('%d %b %Y'),
-                'fechaEstimada': seguimiento.fecha_estimada.strftime('%d %b %Y') if (seguimiento and seguimiento.fecha_estimada) else '',
-                'timeline': timeline,
-            }
-            result.append(item)
+    limited = _timelines_rate_limit(request, cedula)
+    if limited:
+        return _too_many_requests(request, limited)
 
-        return JsonResponse({'success': True, 'cedula': cedula, 'fichas': result})
+    try:
+        entry = timelines.get_entry(cedula)
     except Exception as e:
         logger.exception('Error timelines_by_cedula: %s', e)
         return JsonResponse({'success': False, 'message': 'Error interno al obtener timelines.'}, status=500)
-        
+
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Permite guardar la respuesta, pero obliga a revalidarla en cada consulta
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+class CorreosFallidosView(AdminRequiredMixin, ListView):
+    """Bandeja de correos fallidos (agotaron los reintentos), con reintento en bloque."""
+    template_name = 'reports/correos_fallidos.html'
+    context_object_name = 'correos'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return QueuedEmail.objects.filter(failed=True).order_by('-failed_at', '-id')
+
+    def post(self, request, *args, **kwargs):
+        fallidos = QueuedEmail.objects.filter(failed=True)
+        if request.POST.get('todos'):
+            reintentados = mail.retry_failed(fallidos)
+        else:
+            ids = [i for i in request.POST.getlist('ids') if i.isdigit()]
+            reintentados = mail.retry_failed(fallidos.filter(pk__in=ids)) if ids else 0
+        if reintentados:
+            messages.success(request, f'{reintentados} correo(s) devueltos a la cola de envío.')
+        else:
+            messages.warning(request, 'No se seleccionó ningún correo para reintentar.')
+        return redirect('reports:correos_fallidos')
+
+
+@admin_required
+def estado_limites(request):
+    """Contadores del limitador de frecuencia (permitidas / rechazadas) de este proceso."""
+    return JsonResponse({'success': True, 'limites': ratelimit.stats()})
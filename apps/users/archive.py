@@ -0,0 +1,140 @@
+# =====================================================
+# ARCHIVO: apps/users/archive.py
+# =====================================================
+"""Archivado mensual y retención de los registros de acceso (`LogAcceso`).
+
+La tabla `registros_acceso` solo conserva los últimos
+`LOGACCESO_RETENTION_MONTHS` meses completos (12 por defecto). Cada mes más
+antiguo se mueve a un archivo propio en el storage,
+`archivo/registros_acceso/AAAA-MM.csv.gz`, y luego se borra de la tabla por
+lotes. SQLite no tiene particiones nativas; un archivo por mes cumple ese papel:
+se consulta o se descarta entero sin tocar la tabla viva.
+
+Los archivos con más de `LOGACCESO_ARCHIVE_RETENTION_MONTHS` meses se eliminan
+(por defecto no se elimina ninguno). Todo se ejecuta con
+`manage.py archive_access_logs`.
+"""
+import csv
+import gzip
+import os
+import re
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from . import filters
+from .models import LogAcceso
+
+ARCHIVE_DIR = 'archivo/registros_acceso'
+COLUMNS = ('id', 'fecha_hora', 'accion', 'usuario_id', 'usuario__username', 'direccion_ip', 'user_agent')
+
+_ARCHIVE_NAME_RE = re.compile(r'^(\d{4})-(\d{2})(?:_\w+)?\.csv\.gz$')
+
+
+def month_start(value):
+    """Inicio (medianoche local, aware) del mes de `value`."""
+    local = timezone.localtime(value)
+    return timezone.make_aware(datetime(local.year, local.month, 1))
+
+
+def add_months(start, months):
+    local = timezone.localtime(start)
+    index = local.year * 12 + (local.month - 1) + months
+    return timezone.make_aware(datetime(index // 12, index % 12 + 1, 1))
+
+
+def retention_cutoff(keep_months=None, now=None):
+    """Inicio del mes más antiguo que se conserva en la tabla."""
+    if keep_months is None:
+        keep_months = getattr(settings, 'LOGACCESO_RETENTION_MONTHS', 12)
+    return add_months(month_start(now or timezone.now()), -keep_months)
+
+
+def months_to_archive(keep_months=None, now=None):
+    """Meses (inicio de cada uno) con registros anteriores al corte de retención."""
+    cutoff = retention_cutoff(keep_months, now)
+    oldest = LogAcceso.objects.filter(fecha_hora__lt=cutoff).order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+    months = []
+    if oldest is None:
+        return months
+    month = month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(start, batch_size=5000):
+    """Guarda en un .csv.gz los registros del mes que empieza en `start` y los borra.
+
+    Devuelve `(nombre_del_archivo, registros)`; `(None, 0)` si el mes está vacío.
+    Solo se borran los registros escritos en el archivo (id <= el mayor archivado).
+    """
+    end = add_months(start, 1)
+    month_qs = LogAcceso.objects.filter(fecha_hora__gte=start, fecha_hora__lt=end)
+    count = 0
+    max_id = None
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv.gz')
+    os.close(fd)
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(COLUMNS)
+            rows = month_qs.order_by('id').values_list(*COLUMNS).iterator(chunk_size=2000)
+            for row in rows:
+                writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+                count += 1
+                max_id = row[0]
+        if not count:
+            return None, 0
+        with open(tmp_path, 'rb') as f:
+            name = default_storage.save(f'{ARCHIVE_DIR}/{timezone.localtime(start):%Y-%m}.csv.gz', File(f))
+    finally:
+        os.remove(tmp_path)
+
+    archived = month_qs.filter(id__lte=max_id)
+    while True:
+        ids = list(archived.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            LogAcceso.objects.filter(pk__in=ids).delete()
+    filters.bump_version()
+    return name, count
+
+
+def read_archive(name):
+    """Itera las filas (dict) de un archivo mensual."""
+    with default_storage.open(name, 'rb') as raw:
+        with gzip.open(raw, 'rt', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def list_archives():
+    """Nombres de los archivos mensuales en el storage, del más antiguo al más nuevo."""
+    try:
+        _, files = default_storage.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(f'{ARCHIVE_DIR}/{f}' for f in files if _ARCHIVE_NAME_RE.match(f))
+
+
+def purge_archives(archive_months=None, now=None):
+    """Elimina los archivos de meses anteriores a la retención de archivos. Devuelve los nombres."""
+    if archive_months is None:
+        archive_months = getattr(settings, 'LOGACCESO_ARCHIVE_RETENTION_MONTHS', None)
+    if archive_months is None:
+        return []
+    cutoff = timezone.localtime(add_months(month_start(now or timezone.now()), -archive_months))
+    removed = []
+    for name in list_archives():
+        year, month = _ARCHIVE_NAME_RE.match(os.path.basename(name)).groups()[:2]
+        if (int(year), int(month)) < (cutoff.year, cutoff.month):
+            default_storage.delete(name)
+            removed.append(name)
+    return removed
@@ -0,0 +1,183 @@
+# =====================================================
+# ARCHIVO: apps/users/filters.py
+# =====================================================
+"""Filtros de los registros de acceso (`LogAcceso`).
+
+La lista, el gráfico y las exportaciones (directas o en segundo plano) reciben
+los mismos parámetros `usuario`, `accion`, `desde` y `hasta`. `LogAccesoFilter`
+los valida una sola vez y los compila a condiciones que usan los índices de
+`registros_acceso`: igualdad por usuario y acción, y los días completos
+[desde, hasta] como rango semiabierto sobre `fecha_hora` (sin `__date`, cuya
+conversión impide usar el índice).
+
+Los valores no válidos se descartan y se informan en `errors`. Los parámetros
+normalizados dan una clave de caché estable, con la que la lista y las
+exportaciones con los mismos filtros comparten el conteo y las primeras
+páginas (`LOGS_CACHE_TIMEOUT` segundos). El escritor de registros
+(apps/authentication/audit.py) y el archivado llaman a `bump_version()`, que
+invalida esas entradas de una vez; otros cambios (p.ej. desde el admin) se ven
+al vencer la caché.
+"""
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+
+from .models import LogAcceso
+
+CACHE_PREFIX = 'users:logs:'
+VERSION_KEY = CACHE_PREFIX + 'version'
+# Páginas de la lista que se guardan en caché (las más consultadas)
+CACHED_PAGES = 3
+
+_ACCIONES = dict(LogAcceso.ACCIONES)
+
+
+def _timeout():
+    return getattr(settings, 'LOGS_CACHE_TIMEOUT', 300)
+
+
+def cache_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version():
+    """Invalida los conteos y páginas cacheados de todos los filtros."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class LogAccesoFilter:
+    """Filtros validados de los registros de acceso."""
+
+    def __init__(self, usuario=None, accion=None, desde=None, hasta=None):
+        self.usuario = usuario
+        self.accion = accion
+        self.desde = desde
+        self.hasta = hasta
+        self.errors = {}
+
+    @classmethod
+    def from_params(cls, params):
+        """Construye el filtro desde `request.GET` (o un dict), descartando los valores no válidos."""
+        raw = {key: (params.get(key) or '').strip() for key in ('usuario', 'accion', 'desde', 'hasta')}
+        filtro = cls()
+        if raw['usuario']:
+            if raw['usuario'].isdigit() and int(raw['usuario']) > 0:
+                filtro.usuario = int(raw['usuario'])
+            else:
+                filtro.errors['usuario'] = 'Usuario no válido.'
+        if raw['accion']:
+            if raw['accion'] in _ACCIONES:
+                filtro.accion = raw['accion']
+            else:
+                filtro.errors['accion'] = 'Acción no válida.'
+        for key in ('desde', 'hasta'):
+            if raw[key]:
+                fecha = _parse_date(raw[key])
+                if fecha is None:
+                    filtro.errors[key] = 'Fecha no válida (use AAAA-MM-DD).'
+                setattr(filtro, key, fecha)
+        if filtro.desde and filtro.hasta and filtro.desde > filtro.hasta:
+            filtro.errors['hasta'] = 'La fecha final es anterior a la inicial.'
+            filtro.hasta = None
+        return filtro
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    def as_params(self):
+        """Parámetros normalizados (solo los que tienen valor), p.ej. para los filtros de un trabajo."""
+        params = {}
+        if self.usuario:
+            params['usuario'] = str(self.usuario)
+        if self.accion:
+            params['accion'] = self.accion
+        if self.desde:
+            params['desde'] = self.desde.isoformat()
+        if self.hasta:
+            params['hasta'] = self.hasta.isoformat()
+        return params
+
+    def lookups(self):
+        """Condiciones del filtro como argumentos de `filter()`."""
+        lookups = {}
+        if self.usuario:
+            lookups['usuario_id'] = self.usuario
+        if self.accion:
+            lookups['accion'] = self.accion
+        if self.desde:
+            lookups['fecha_hora__gte'] = _start_of(self.desde)
+        if self.hasta:
+            lookups['fecha_hora__lt'] = _start_of(self.hasta + timedelta(days=1))
+        return lookups
+
+    def apply(self, queryset):
+        return queryset.filter(**self.lookups())
+
+    def queryset(self):
+        """Registros filtrados, del más reciente al más antiguo (orden total)."""
+        return self.apply(LogAcceso.objects.all()).order_by('-fecha_hora', '-id')
+
+    def cache_key(self, *parts):
+        raw = json.dumps(self.as_params(), sort_keys=True, separators=(',', ':'))
+        digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        suffix = ':'.join(str(p) for p in parts)
+        return f'{CACHE_PREFIX}{cache_version()}:{digest}:{suffix}'
+
+    def count(self):
+        """Número de registros del filtro, compartido en caché entre la lista y las exportaciones."""
+        return cache.get_or_set(self.cache_key('count'), lambda: self.queryset().count(), _timeout())
+
+    def page_rows(self, number, per_page):
+        """Registros (con su usuario) de la página `number`; las primeras `CACHED_PAGES` se cachean."""
+        bottom = (number - 1) * per_page
+
+        def rows():
+            return list(self.queryset().select_related('usuario')[bottom:bottom + per_page])
+
+        if number > getattr(settings, 'LOGS_CACHED_PAGES', CACHED_PAGES):
+            return rows()
+        return cache.get_or_set(self.cache_key('page', per_page, number), rows, _timeout())
+
+
+class LogAccesoPaginator(Paginator):
+    """Paginador de la lista que toma el conteo y las primeras páginas de la caché del filtro."""
+
+    def __init__(self, filtro, per_page, orphans=0, allow_empty_first_page=True):
+        super().__init__(filtro.queryset(), per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+        self.filtro = filtro
+
+    @cached_property
+    def count(self):
+        return self.filtro.count()
+
+    def page(self, number):
+        if self.orphans:
+            return super().page(number)
+        number = self.validate_number(number)
+        return self._get_page(self.filtro.page_rows(number, self.per_page), number, self)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los registros de acceso más antiguos que la retención a un archivo .csv.gz por mes '
+        'y elimina los archivos mensuales vencidos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=None,
+            help='Meses completos que se conservan en la tabla (por defecto LOGACCESO_RETENTION_MONTHS, 12).',
+        )
+        parser.add_argument(
+            '--archive-months',
+            type=int,
+            default=None,
+            help='Meses que se conservan los archivos (por defecto LOGACCESO_ARCHIVE_RETENTION_MONTHS; sin valor no se borran).',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas eliminadas por transacción (por defecto 5000).')
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar los meses que se archivarían.')
+
+    def handle(self, *args, **options):
+        months = archive.months_to_archive(options['keep_months'])
+        if options['dry_run']:
+            for month in months:
+                self.stdout.write(f'Se archivaría {month:%Y-%m}')
+            self.stdout.write(self.style.SUCCESS(f'{len(months)} meses por archivar.'))
+            return
+
+        total = 0
+        for month in months:
+            name, count = archive.archive_month(month, batch_size=max(1, options['batch_size']))
+            if name:
+                total += count
+                self.stdout.write(f'{month:%Y-%m}: {count} registros -> {name}')
+        removed = archive.purge_archives(options['archive_months'])
+        for name in removed:
+            self.stdout.write(f'Archivo vencido eliminado: {name}')
+        self.stdout.write(self.style.SUCCESS(f'{total} registros archivados, {len(removed)} archivos eliminados.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.users import rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenera los conteos diarios de registros de acceso usados por el gráfico de accesos.'
+
+    def handle(self, *args, **options):
+        total = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{total} conteos diarios generados.'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_customuser_is_verified_alter_customuser_cargo_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logacceso',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_logacceso_fecha_evento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['fecha_hora', 'accion'], name='registros_acceso_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logacceso',
+            index=models.Index(fields=['usuario', 'fecha_hora'], name='registros_acceso_usuario_idx'),
+        ),
+    ]
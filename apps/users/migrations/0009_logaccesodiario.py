@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+def poblar_conteos(apps, schema_editor):
+    from apps.users.rollups import rebuild
+    rebuild(apps.get_model('users', 'LogAcceso'), apps.get_model('users', 'LogAccesoDiario'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_logacceso_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogAccesoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('accion', models.CharField(max_length=20, verbose_name='Acción')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Conteo diario de accesos',
+                'verbose_name_plural': 'Conteos diarios de accesos',
+                'db_table': 'registros_acceso_diario',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'accion'), name='registros_acceso_diario_unique')],
+            },
+        ),
+        migrations.RunPython(poblar_conteos, migrations.RunPython.noop),
+    ]
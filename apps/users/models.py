@@ -2,6 +2,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -121,7 +122,8 @@ class LogAcceso(models.Model):
         related_name='logs_acceso'
     )
     
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # Fecha del evento, no de la inserción: los registros se escriben por lotes (ver apps/authentication/audit.py)
+    fecha_hora = models.DateTimeField(default=timezone.now, editable=False)
     
     accion = models.CharField(
         max_length=20,
@@ -140,7 +142,34 @@ class LogAcceso(models.Model):
         verbose_name = 'Log de Acceso'
         verbose_name_plural = 'Logs de Acceso'
         ordering = ['-fecha_hora']
+        indexes = [
+            # Rangos de fecha (lista, gráfico, exportaciones, archivado) y filtro por acción
+            models.Index(fields=['fecha_hora', 'accion'], name='registros_acceso_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha_hora'], name='registros_acceso_usuario_idx'),
+        ]
     
     def __str__(self):
         usuario_str = self.usuario.username if self.usuario else 'Usuario desconocido'
-        return f"{usuario_str} - {self.get_accion_display()} - {self.fecha_hora}"
\ No newline at end of file
+        return f"{usuario_str} - {self.get_accion_display()} - {self.fecha_hora}"
+
+class LogAccesoDiario(models.Model):
+    """
+    Conteo diario de registros de acceso por acción (hora local), para el gráfico
+    de `logs_json`. Lo mantiene el escritor diferido de `LogAcceso` al guardar
+    cada lote (ver apps/users/rollups.py) y se puede regenerar con
+    `manage.py rebuild_access_log_counters`. Los días ya archivados conservan su conteo.
+    """
+    fecha = models.DateField('Fecha')
+    accion = models.CharField('Acción', max_length=20)
+    total = models.PositiveIntegerField('Total', default=0)
+
+    class Meta:
+        db_table = 'registros_acceso_diario'
+        verbose_name = 'Conteo diario de accesos'
+        verbose_name_plural = 'Conteos diarios de accesos'
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'accion'], name='registros_acceso_diario_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.accion}: {self.total}"
@@ -0,0 +1,60 @@
+# =====================================================
+# ARCHIVO: apps/users/rollups.py
+# =====================================================
+"""Conteos diarios de registros de acceso (`LogAccesoDiario`).
+
+El escritor diferido (apps/authentication/audit.py) llama a `add_entries` con
+cada lote que guarda, dentro de la misma transacción, así que el gráfico de
+`logs_json` suma como mucho `días × acciones` filas en lugar de agrupar la
+tabla de registros.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LogAcceso, LogAccesoDiario
+
+
+def _increment(fecha, accion, n):
+    lookup = {'fecha': fecha, 'accion': accion}
+    if LogAccesoDiario.objects.filter(**lookup).update(total=F('total') + n):
+        return
+    try:
+        with transaction.atomic():
+            LogAccesoDiario.objects.create(total=n, **lookup)
+    except IntegrityError:
+        # Otra escritura creó el día en paralelo
+        LogAccesoDiario.objects.filter(**lookup).update(total=F('total') + n)
+
+
+def add_entries(entries):
+    """Suma a los conteos diarios los `LogAcceso` de `entries`."""
+    counts = Counter((timezone.localdate(e.fecha_hora), e.accion) for e in entries)
+    for (fecha, accion), n in sorted(counts.items()):
+        _increment(fecha, accion, n)
+
+
+def rebuild(log_model=LogAcceso, rollup_model=LogAccesoDiario):
+    """Regenera los conteos de los días que siguen en la tabla de registros.
+
+    Los días anteriores al registro más antiguo (ya archivados) se conservan.
+    Acepta los modelos como parámetros para poder usarse desde migraciones.
+    Devuelve el número de filas de conteo generadas.
+    """
+    oldest = log_model.objects.order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+    grouped = (
+        log_model.objects
+        .annotate(fecha=TruncDate('fecha_hora'))
+        .values('fecha', 'accion')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    rows = [rollup_model(fecha=row['fecha'], accion=row['accion'], total=row['total']) for row in grouped.iterator()]
+    with transaction.atomic():
+        if oldest is not None:
+            rollup_model.objects.filter(fecha__gte=timezone.localdate(oldest)).delete()
+        rollup_model.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
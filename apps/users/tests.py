@@ -1,3 +1,211 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import datetime, timedelta
 
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
+from . import archive, rollups
+from .models import LogAcceso, LogAccesoDiario
+from .filters import LogAccesoFilter, bump_version
+
+
+def local(*args):
+	return timezone.make_aware(datetime(*args))
+
+
+def _logs(params):
+	return LogAccesoFilter.from_params(params).queryset()
+
+
+class LogAccesoRangeTests(TestCase):
+	def test_date_filters_are_half_open_local_day_ranges(self):
+		for fecha in (local(2025, 3, 9, 23, 59), local(2025, 3, 10, 0, 0), local(2025, 3, 12, 23, 59, 59), local(2025, 3, 13, 0, 0)):
+			LogAcceso.objects.create(accion='login', fecha_hora=fecha)
+		fechas = set(_logs({'desde': '2025-03-10', 'hasta': '2025-03-12'}).values_list('fecha_hora', flat=True))
+		self.assertEqual(fechas, {local(2025, 3, 10, 0, 0), local(2025, 3, 12, 23, 59, 59)})
+		# Fechas no válidas se ignoran
+		self.assertEqual(_logs({'desde': '10/03/2025', 'hasta': '2025-02-31'}).count(), 4)
+
+	def test_range_query_does_not_cast_the_column(self):
+		sql = str(_logs({'desde': '2025-03-10', 'hasta': '2025-03-12'}).query)
+		self.assertNotIn('django_datetime_cast_date', sql)
+
+	def test_filter_validates_and_normalizes(self):
+		filtro = LogAccesoFilter.from_params({'usuario': 'abc', 'accion': 'hack', 'desde': '2025-03-12', 'hasta': '2025-03-10'})
+		self.assertFalse(filtro.is_valid)
+		self.assertEqual(set(filtro.errors), {'usuario', 'accion', 'hasta'})
+		self.assertEqual(filtro.as_params(), {'desde': '2025-03-12'})
+		a = LogAccesoFilter.from_params({'usuario': ' 7', 'accion': 'login', 'hasta': '2025-03-10', 'desde': ''})
+		b = LogAccesoFilter.from_params({'hasta': '2025-03-10', 'accion': 'login', 'usuario': '7'})
+		self.assertTrue(a.is_valid)
+		self.assertEqual(a.cache_key('count'), b.cache_key('count'))
+		self.assertNotEqual(a.cache_key('count'), LogAccesoFilter.from_params({'accion': 'login'}).cache_key('count'))
+
+
+class LogAccesoArchiveTests(TestCase):
+	def setUp(self):
+		self.media = tempfile.mkdtemp()
+		override = override_settings(MEDIA_ROOT=self.media)
+		override.enable()
+		self.addCleanup(override.disable)
+		self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+		self.user = get_user_model().objects.create_user(username='ana', password='pass', cedula='V-12000001')
+
+	def test_old_months_are_moved_to_monthly_files(self):
+		ahora = timezone.now()
+		viejos = [local(2020, 1, 5), local(2020, 1, 31, 23, 0), local(2020, 3, 1, 0, 0)]
+		for fecha in viejos:
+			LogAcceso.objects.create(usuario=self.user, accion='login', direccion_ip='10.0.0.1', fecha_hora=fecha)
+		reciente = LogAcceso.objects.create(usuario=self.user, accion='logout', fecha_hora=ahora)
+
+		out = io.StringIO()
+		call_command('archive_access_logs', keep_months=12, stdout=out)
+		self.assertEqual(list(LogAcceso.objects.values_list('pk', flat=True)), [reciente.pk])
+
+		nombres = archive.list_archives()
+		self.assertEqual(nombres, ['archivo/registros_acceso/2020-01.csv.gz', 'archivo/registros_acceso/2020-03.csv.gz'])
+		filas = list(archive.read_archive(nombres[0]))
+		self.assertEqual([f['usuario__username'] for f in filas], ['ana', 'ana'])
+		self.assertEqual(datetime.fromisoformat(filas[1]['fecha_hora']), local(2020, 1, 31, 23, 0))
+		self.assertIn('3 registros archivados', out.getvalue())
+
+		# Retención de archivos: solo queda el más reciente de los dos
+		removed = archive.purge_archives(archive_months=0, now=local(2020, 3, 15))
+		self.assertEqual(removed, ['archivo/registros_acceso/2020-01.csv.gz'])
+		self.assertEqual(archive.list_archives(), ['archivo/registros_acceso/2020-03.csv.gz'])
+
+
+class LogsJsonTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.admin = get_user_model().objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-12000002', rol='administrador')
+		self.client.force_login(self.admin)
+
+	def test_chart_sums_daily_counters_within_window(self):
+		hoy = timezone.localdate()
+		LogAccesoDiario.objects.bulk_create([
+			LogAccesoDiario(fecha=hoy, accion='login', total=5),
+			LogAccesoDiario(fecha=hoy - timedelta(days=6), accion='login', total=2),
+			LogAccesoDiario(fecha=hoy - timedelta(days=6), accion='failed_login', total=9),
+			LogAccesoDiario(fecha=hoy - timedelta(days=7), accion='login', total=100),
+		])
+		url = reverse('users:logs_json')
+		resp = self.client.get(url, {'days': 7})
+		self.assertEqual(resp.json(), {'data': [{'accion': 'failed_login', 'count': 9}, {'accion': 'login', 'count': 7}], 'days': 7})
+
+		# La misma ventana se sirve desde la caché
+		with CaptureQueriesContext(connection) as queries:
+			self.client.get(url, {'days': 7})
+		self.assertFalse([q for q in queries if 'registros_acceso_diario' in q['sql']])
+
+		self.assertEqual(self.client.get(url, {'days': 100000}).json()['days'], 366)
+		self.assertEqual(self.client.get(url, {'days': 'abc'}).json()['days'], 30)
+		self.assertEqual(self.client.get(url, {'days': -5}).json()['days'], 1)
+
+	def test_rebuild_keeps_counters_of_archived_days(self):
+		LogAccesoDiario.objects.create(fecha=timezone.localdate() - timedelta(days=800), accion='login', total=4)
+		LogAccesoDiario.objects.create(fecha=timezone.localdate(), accion='login', total=99)
+		LogAcceso.objects.create(accion='login')
+		LogAcceso.objects.create(accion='logout')
+		self.assertEqual(rollups.rebuild(), 2)
+		self.assertEqual(
+			sorted(LogAccesoDiario.objects.values_list('accion', 'total')),
+			[('login', 1), ('login', 4), ('logout', 1)],
+		)
+
+
+class LogsExportTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-12000003', rol='administrador', first_name='Ana', last_name='Rojas')
+		self.client.force_login(self.admin)
+		cache.clear()
+		LogAcceso.objects.create(usuario=self.admin, accion='login', direccion_ip='10.0.0.1', user_agent='Firefox\nLinux', fecha_hora=local(2025, 3, 10, 8, 0))
+		LogAcceso.objects.create(accion='failed_login', direccion_ip='10.0.0.2', fecha_hora=local(2025, 3, 11, 9, 0))
+
+	def test_csv_is_streamed(self):
+		resp = self.client.get(reverse('users:logs_export_csv'), {'desde': '2025-03-10', 'hasta': '2025-03-11'})
+		self.assertTrue(resp.streaming)
+		lineas = b''.join(resp.streaming_content).decode('utf-8').splitlines()
+		self.assertEqual(lineas[0], 'Usuario,Accion,Fecha Hora,Direccion IP,User Agent')
+		self.assertTrue(lineas[1].startswith('Desconocido,Intento fallido de login,'))
+		self.assertTrue(lineas[2].startswith('Ana Rojas,Inicio de sesión,'))
+		self.assertTrue(lineas[2].endswith(',10.0.0.1,Firefox Linux'))
+
+	def test_xlsx_is_streamed_with_sampled_widths(self):
+		import openpyxl
+		resp = self.client.get(reverse('users:logs_export_excel'))
+		self.assertTrue(resp.streaming)
+		wb = openpyxl.load_workbook(io.BytesIO(b''.join(resp.streaming_content)))
+		ws = wb.active
+		self.assertEqual(ws.title, 'Logs')
+		self.assertEqual([c.value for c in ws[1]], ['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP', 'User Agent'])
+		self.assertEqual(ws.max_row, 3)
+		self.assertEqual(ws['B3'].value, 'Inicio de sesión')
+		self.assertEqual(ws.column_dimensions['B'].width, len('Intento fallido de login') + 2)
+
+	def test_pdf_is_paged_from_temp_file(self):
+		resp = self.client.get(reverse('users:logs_export_pdf'))
+		self.assertEqual(resp['Content-Type'], 'application/pdf')
+		self.assertIn('logs_acceso.pdf', resp['Content-Disposition'])
+		self.assertTrue(resp.streaming)
+		self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF'))
+
+	@override_settings(LOGS_PDF_MAX_ROWS=1)
+	def test_pdf_row_cap(self):
+		import re
+		resp = self.client.get(reverse('users:logs_export_pdf'))
+		data = b''.join(resp.streaming_content)
+		# Página con la fila permitida más la página que pide acotar los filtros
+		self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', data)), 2)
+
+	def test_invalid_filters_are_rejected(self):
+		resp = self.client.get(reverse('users:logs_export_csv'), {'desde': '10/03/2025'})
+		self.assertEqual(resp.status_code, 400)
+		resp = self.client.get(reverse('users:logs_export_csv'), {'accion': 'x', 'background': '1'})
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('accion', resp.json()['errors'])
+
+
+class LogAccesoListCacheTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='admin', email='a@example.com', password='pass', cedula='V-12000004', rol='administrador')
+		self.client.force_login(self.admin)
+		cache.clear()
+		LogAcceso.objects.bulk_create([
+			LogAcceso(usuario=self.admin, accion='login', fecha_hora=local(2025, 3, 10, 8, i)) for i in range(60)
+		])
+
+	def test_list_shares_cached_count_and_first_pages(self):
+		url = reverse('users:logs_list')
+		resp = self.client.get(url, {'accion': 'login'})
+		self.assertEqual(resp.context['paginator'].count, 60)
+		self.assertEqual(len(resp.context['logs']), 50)
+		# Misma consulta escrita distinto: conteo y página salen de la caché
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get(url, {'accion': 'login', 'usuario': ''})
+		self.assertFalse([q for q in ctx.captured_queries if 'FROM "registros_acceso"' in q['sql']])
+		self.assertEqual(resp.context['paginator'].count, 60)
+		self.assertEqual(LogAccesoFilter.from_params({'accion': 'login'}).count(), 60)
+
+	def test_writes_invalidate_cached_counts(self):
+		filtro = LogAccesoFilter.from_params({})
+		self.assertEqual(filtro.count(), 60)
+		LogAcceso.objects.create(accion='logout', fecha_hora=local(2025, 3, 11))
+		self.assertEqual(filtro.count(), 60)
+		bump_version()
+		self.assertEqual(filtro.count(), 61)
+
+	def test_invalid_filter_is_reported_and_ignored(self):
+		resp = self.client.get(reverse('users:logs_list'), {'desde': 'ayer'}, follow=False)
+		self.assertEqual(resp.context['paginator'].count, 60)
+		self.assertTrue(any('Filtro ignorado' in str(m) for m in resp.context['messages']))
@@ -6,28 +6,19 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db.models import Q
 
-from .models import CustomUser, LogAcceso
+from .filters import LogAccesoFilter, LogAccesoPaginator
+from .models import CustomUser, LogAcceso, LogAccesoDiario
 from apps.authentication.mixins import AdminRequiredMixin
 from apps.authentication.forms import CustomUserCreationForm, CustomUserChangeForm
+from apps.reports import export_jobs, exports, pdf
 from django.http import HttpResponse, JsonResponse
-import csv
-import io
-try:
-    from openpyxl import Workbook
-    from openpyxl.utils import get_column_letter
-except Exception:
-    Workbook = None
-try:
-    from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-    from reportlab.lib import colors
-except Exception:
-    SimpleDocTemplate = None
 from django.utils import timezone
-from django.db.models import Count
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
 from datetime import timedelta
 
 
@@ -208,34 +199,18 @@ class LogAccesoListView(AdminRequiredMixin, ListView):
     context_object_name = 'logs'
     paginate_by = 50
 
-    def get_queryset(self):
-        queryset = LogAcceso.objects.select_related('usuario').all().order_by('-fecha_hora')
-
-        # filtros simples: usuario, accion, rango de fechas
-        usuario = self.request.GET.get('usuario')
-        accion = self.request.GET.get('accion')
-        desde = self.request.GET.get('desde')
-        hasta = self.request.GET.get('hasta')
-
-        if usuario:
-            queryset = queryset.filter(usuario__id=usuario)
+    def get(self, request, *args, **kwargs):
+        self.filtro = LogAccesoFilter.from_params(request.GET)
+        for error in self.filtro.errors.values():
+            messages.warning(request, f'Filtro ignorado: {error}')
+        return super().get(request, *args, **kwargs)
 
-        if accion:
-            queryset = queryset.filter(accion=accion)
-
-        if desde:
-            try:
-                queryset = queryset.filter(fecha_hora__date__gte=desde)
-            except Exception:
-                pass
+    def get_queryset(self):
+        return self.filtro.queryset().select_related('usuario')
 
-        if hasta:
-            try:
-                queryset = queryset.filter(fecha_hora__date__lte=hasta)
-            except Exception:
-                pass
-
-        return queryset
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # Conteo y primeras páginas compartidos en caché con las exportaciones
+        return LogAccesoPaginator(self.filtro, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -250,181 +225,191 @@ class LogAccesoListView(AdminRequiredMixin, ListView):
         return context
 
 
+# Ventana máxima (días) del gráfico de accesos
+LOGS_JSON_MAX_DAYS = 366
+
+
 @login_required
 def logs_json(request):
-    """Devuelve datos agregados para gráficos: conteo de acciones en los últimos N días."""
+    """Devuelve datos agregados para gráficos: conteo de acciones en los últimos N días.
+
+    Suma los conteos diarios de `LogAccesoDiario` (una fila por día y acción) en
+    lugar de agrupar los registros. `days` se limita a [1, LOGS_JSON_MAX_DAYS] y
+    la respuesta de cada ventana se cachea `LOGS_JSON_CACHE_TIMEOUT` segundos.
+    """
     if not request.user.is_administrador:
         return JsonResponse({'error': 'Permiso denegado'}, status=403)
 
-    days = int(request.GET.get('days', 30))
-    since = timezone.now() - timedelta(days=days)
-
-    data = (
-        LogAcceso.objects.filter(fecha_hora__gte=since)
-        .values('accion')
-        .annotate(count=Count('id'))
-        .order_by('-count')
+    try:
+        days = int(request.GET.get('days', 30))
+    except (TypeError, ValueError):
+        days = 30
+    days = min(max(days, 1), getattr(settings, 'LOGS_JSON_MAX_DAYS', LOGS_JSON_MAX_DAYS))
+    today = timezone.localdate()
+
+    cache_key = f'users:logs_json:{today.isoformat()}:{days}'
+    result = cache.get(cache_key)
+    if result is None:
+        data = (
+            LogAccesoDiario.objects.filter(fecha__gt=today - timedelta(days=days))
+            .values('accion')
+            .annotate(count=Sum('total'))
+            .order_by('-count')
+        )
+        # Formato: [{accion: 'login', count: 10}, ...]
+        result = [{'accion': item['accion'], 'count': item['count']} for item in data]
+        cache.set(cache_key, result, getattr(settings, 'LOGS_JSON_CACHE_TIMEOUT', 60))
+    return JsonResponse({'data': result, 'days': days})
+
+
+def _logs_filter_error(request, filtro):
+    """Respuesta 400 con los filtros no válidos de una exportación."""
+    detalle = ' '.join(filtro.errors.values())
+    if request.GET.get('background') == '1':
+        return JsonResponse({'success': False, 'message': detalle, 'errors': filtro.errors}, status=400)
+    return HttpResponse(f'Filtros no válidos: {detalle}', status=400)
+
+
+LOGS_EXPORT_HEADERS = ['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP', 'User Agent']
+LOGS_EXPORT_CHUNK_SIZE = 2000
+_ACCION_LABELS = dict(LogAcceso.ACCIONES)
+
+
+def _logs_export_rows(queryset, fecha_formato=None):
+    """Itera los logs como tuplas listas para exportar, sin instanciar modelos.
+
+    Proyecta solo las columnas necesarias con `values_list` y lee en bloques de
+    `LOGS_EXPORT_CHUNK_SIZE` filas, así que la memoria no depende del número de logs.
+    """
+    rows = queryset.values_list(
+        'usuario_id', 'usuario__first_name', 'usuario__last_name',
+        'accion', 'fecha_hora', 'direccion_ip', 'user_agent',
+    )
+    for usuario_id, first_name, last_name, accion, fecha_hora, ip, user_agent in rows.iterator(chunk_size=LOGS_EXPORT_CHUNK_SIZE):
+        usuario_nombre = f'{first_name} {last_name}'.strip() if usuario_id else 'Desconocido'
+        yield (
+            usuario_nombre,
+            _ACCION_LABELS.get(accion, accion),
+            fecha_hora.strftime(fecha_formato) if fecha_formato else fecha_hora.isoformat(),
+            ip or '',
+            (user_agent or '').replace('\n', ' '),
+        )
+
+
+def _logs_export_stream(tipo, filtro, progress=None):
+    """Fragmentos del CSV o XLSX de los logs de `filtro` (`tipo` 'logs_csv' o 'logs_xlsx')."""
+    queryset = filtro.queryset()
+    if tipo == 'logs_csv':
+        rows = _logs_export_rows(queryset)
+    else:
+        rows = _logs_export_rows(queryset, '%Y-%m-%d %H:%M:%S')
+    if progress is not None:
+        rows = export_jobs.track(rows, progress, total=filtro.count())
+    if tipo == 'logs_csv':
+        return exports.stream_csv(LOGS_EXPORT_HEADERS, rows)
+    widths, rows = exports.sample_widths(LOGS_EXPORT_HEADERS, rows)
+    return exports.stream_xlsx(LOGS_EXPORT_HEADERS, rows, sheet_title='Logs', column_widths=widths)
+
+
+LOGS_PDF_HEADERS = ['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP']
+# Peso relativo del ancho de cada columna del PDF
+LOGS_PDF_COL_WEIGHTS = [4, 3, 3, 2]
+LOGS_PDF_MAX_ROWS = 5000
+
+
+def _write_logs_pdf(rows, out, filtro=None):
+    """Escribe los logs (tuplas de `_logs_export_rows`) como PDF paginado sobre el archivo binario `out`.
+
+    Se incluyen como máximo `LOGS_PDF_MAX_ROWS` filas (None = sin límite); si hay
+    más, la última página pide acotar los filtros e indica el total de `filtro`.
+    """
+    writer = pdf.TablePDF(
+        out, 'Registros de Acceso', LOGS_PDF_HEADERS,
+        col_weights=LOGS_PDF_COL_WEIGHTS,
+        max_rows=getattr(settings, 'LOGS_PDF_MAX_ROWS', LOGS_PDF_MAX_ROWS),
+    )
+    return writer.write(
+        (row[:4] for row in rows),
+        total=filtro.count if filtro is not None else None,
     )
 
-    # Formato: [{accion: 'login', count: 10}, ...]
-    result = [{'accion': item['accion'], 'count': item['count']} for item in data]
-    return JsonResponse({'data': result})
+
+def build_logs_export(job, fileobj, progress):
+    """Generador de los trabajos en segundo plano `logs_csv`, `logs_xlsx` y `logs_pdf`."""
+    filtro = LogAccesoFilter.from_params(job.filtros)
+    if job.tipo in ('logs_csv', 'logs_xlsx'):
+        exports.write_stream(_logs_export_stream(job.tipo, filtro, progress), fileobj)
+        return
+    if not pdf.available():
+        raise RuntimeError('Dependencia missing: reportlab no instalada')
+    total = filtro.count()
+    max_rows = getattr(settings, 'LOGS_PDF_MAX_ROWS', LOGS_PDF_MAX_ROWS)
+    if max_rows is not None:
+        total = min(total, max_rows)
+    rows = export_jobs.track(_logs_export_rows(filtro.queryset(), '%Y-%m-%d %H:%M:%S'), progress, total=total)
+    _write_logs_pdf(rows, fileobj, filtro)
+
+
+def _submit_logs_job(request, tipo, filtro):
+    try:
+        # Filtros normalizados: la misma consulta escrita distinto reutiliza el trabajo
+        job, created = export_jobs.submit(tipo, filtro.as_params(), request.user)
+    except export_jobs.ExportJobError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=403)
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'job': {
+            'id': job.id,
+            'estado': job.estado,
+            'status_url': reverse('reports:export_job_status', args=[job.id]),
+        },
+    }, status=202)
 
 
 @login_required
 def export_logs_csv(request):
-    """Exporta los logs filtrados a CSV."""
+    """Exporta los logs filtrados a CSV en streaming (con `background=1`, en segundo plano)."""
     if not request.user.is_administrador:
         return HttpResponse('Permiso denegado', status=403)
-
-    # Reutilizamos los mismos parámetros de filtrado que la lista
-    queryset = LogAcceso.objects.select_related('usuario').all().order_by('-fecha_hora')
-    usuario = request.GET.get('usuario')
-    accion = request.GET.get('accion')
-    desde = request.GET.get('desde')
-    hasta = request.GET.get('hasta')
-
-    if usuario:
-        queryset = queryset.filter(usuario__id=usuario)
-    if accion:
-        queryset = queryset.filter(accion=accion)
-    if desde:
-        try:
-            queryset = queryset.filter(fecha_hora__date__gte=desde)
-        except Exception:
-            pass
-    if hasta:
-        try:
-            queryset = queryset.filter(fecha_hora__date__lte=hasta)
-        except Exception:
-            pass
-
-    # Construir respuesta CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="logs_acceso.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP', 'User Agent'])
-
-    for log in queryset:
-        usuario_nombre = log.usuario.get_full_name() if log.usuario else 'Desconocido'
-        writer.writerow([usuario_nombre, log.get_accion_display(), log.fecha_hora.isoformat(), log.direccion_ip or '', (log.user_agent or '').replace('\n', ' ')])
-
-    return response
+    # Mismos filtros (y conteo en caché) que la lista
+    filtro = LogAccesoFilter.from_params(request.GET)
+    if not filtro.is_valid:
+        return _logs_filter_error(request, filtro)
+    if request.GET.get('background') == '1':
+        return _submit_logs_job(request, 'logs_csv', filtro)
+    return exports.streaming_response(_logs_export_stream('logs_csv', filtro), 'logs_acceso.csv', exports.CSV_CONTENT_TYPE)
 
 
 @login_required
 def export_logs_excel(request):
-    """Exporta los logs filtrados a Excel (.xlsx)."""
+    """Exporta los logs filtrados a Excel (.xlsx) en streaming (con `background=1`, en segundo plano)."""
     if not request.user.is_administrador:
         return HttpResponse('Permiso denegado', status=403)
-
-    if Workbook is None:
-        return HttpResponse('Dependencia missing: openpyxl no instalada', status=500)
-
-    # Reutilizamos filtros
-    queryset = LogAcceso.objects.select_related('usuario').all().order_by('-fecha_hora')
-    usuario = request.GET.get('usuario')
-    accion = request.GET.get('accion')
-    desde = request.GET.get('desde')
-    hasta = request.GET.get('hasta')
-
-    if usuario:
-        queryset = queryset.filter(usuario__id=usuario)
-    if accion:
-        queryset = queryset.filter(accion=accion)
-    if desde:
-        try:
-            queryset = queryset.filter(fecha_hora__date__gte=desde)
-        except Exception:
-            pass
-    if hasta:
-        try:
-            queryset = queryset.filter(fecha_hora__date__lte=hasta)
-        except Exception:
-            pass
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Logs'
-
-    headers = ['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP', 'User Agent']
-    ws.append(headers)
-
-    for log in queryset:
-        usuario_nombre = log.usuario.get_full_name() if log.usuario else 'Desconocido'
-        ws.append([usuario_nombre, log.get_accion_display(), log.fecha_hora.strftime('%Y-%m-%d %H:%M:%S'), log.direccion_ip or '', (log.user_agent or '').replace('\n', ' ')])
-
-    # Ajustar ancho de columnas
-    for i, column_cells in enumerate(ws.columns, 1):
-        length = max((len(str(cell.value)) for cell in column_cells), default=0)
-        ws.column_dimensions[get_column_letter(i)].width = min(max(length + 2, 10), 60)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    response = HttpResponse(output.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="logs_acceso.xlsx"'
-    return response
+    filtro = LogAccesoFilter.from_params(request.GET)
+    if not filtro.is_valid:
+        return _logs_filter_error(request, filtro)
+    if request.GET.get('background') == '1':
+        return _submit_logs_job(request, 'logs_xlsx', filtro)
+    return exports.streaming_response(_logs_export_stream('logs_xlsx', filtro), 'logs_acceso.xlsx', exports.XLSX_CONTENT_TYPE)
 
 
 @login_required
 def export_logs_pdf(request):
-    """Exporta los logs filtrados a PDF (tabla simple)."""
+    """Exporta los logs filtrados a PDF paginado (con `background=1`, en segundo plano)."""
     if not request.user.is_administrador:
         return HttpResponse('Permiso denegado', status=403)
 
-    if SimpleDocTemplate is None:
+    if not pdf.available():
         return HttpResponse('Dependencia missing: reportlab no instalada', status=500)
-
-    # Reutilizamos filtros
-    queryset = LogAcceso.objects.select_related('usuario').all().order_by('-fecha_hora')
-    usuario = request.GET.get('usuario')
-    accion = request.GET.get('accion')
-    desde = request.GET.get('desde')
-    hasta = request.GET.get('hasta')
-
-    if usuario:
-        queryset = queryset.filter(usuario__id=usuario)
-    if accion:
-        queryset = queryset.filter(accion=accion)
-    if desde:
-        try:
-            queryset = queryset.filter(fecha_hora__date__gte=desde)
-        except Exception:
-            pass
-    if hasta:
-        try:
-            queryset = queryset.filter(fecha_hora__date__lte=hasta)
-        except Exception:
-            pass
-
-    # Construir datos para la tabla
-    headers = ['Usuario', 'Accion', 'Fecha Hora', 'Direccion IP']
-    data = [headers]
-    for log in queryset:
-        usuario_nombre = log.usuario.get_full_name() if log.usuario else 'Desconocido'
-        data.append([usuario_nombre, log.get_accion_display(), log.fecha_hora.strftime('%Y-%m-%d %H:%M:%S'), log.direccion_ip or ''])
-    # agremamos un titulo
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), rightMargin=20, leftMargin=20, topMargin=20, bottomMargin=20, title="Registros de Acceso")
-    table = Table(data, repeatRows=1)
-    
-    style = TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2E6DA4')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 10),
-        ('GRID', (0,0), (-1,-1), 0.25, colors.grey),
-    ])
-    table.setStyle(style)
-    elems = [table]
-    doc.build(elems)
-    buffer.seek(0)
-
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="logs_acceso.pdf"'
-    return response
\ No newline at end of file
+    filtro = LogAccesoFilter.from_params(request.GET)
+    if not filtro.is_valid:
+        return _logs_filter_error(request, filtro)
+    if request.GET.get('background') == '1':
+        return _submit_logs_job(request, 'logs_pdf', filtro)
+
+    # Se genera en un archivo temporal que se envía por bloques
+    return pdf.pdf_response(
+        'logs_acceso.pdf',
+        lambda out: _write_logs_pdf(_logs_export_rows(filtro.queryset(), '%Y-%m-%d %H:%M:%S'), out, filtro),
+    )
@@ -0,0 +1,73 @@
+// Exportaciones en segundo plano.
+// Los enlaces y formularios GET marcados con `data-background-export` piden la
+// exportación con `background=1`, consultan el progreso del trabajo y descargan
+// el archivo cuando está listo. Sin JavaScript se mantiene la descarga directa.
+(function () {
+    const POLL_INTERVAL = 1500;
+
+    function setLabel(el, text) {
+        if (!el) return;
+        if (!el.dataset.origText) el.dataset.origText = el.innerHTML;
+        if (text === null) {
+            el.innerHTML = el.dataset.origText;
+            el.disabled = false;
+        } else {
+            el.textContent = text;
+            el.disabled = true;
+        }
+    }
+
+    function poll(statusUrl, button) {
+        fetch(statusUrl, {credentials: 'same-origin'})
+            .then(resp => resp.json())
+            .then(data => {
+                const job = data.job || {};
+                if (job.estado === 'completado' && job.download_url) {
+                    setLabel(button, null);
+                    window.location.href = job.download_url;
+                } else if (job.estado === 'error') {
+                    setLabel(button, null);
+                    alert('No se pudo generar la exportación: ' + (job.error || 'error desconocido'));
+                } else {
+                    setLabel(button, `Generando... ${job.progreso || 0}%`);
+                    setTimeout(() => poll(statusUrl, button), POLL_INTERVAL);
+                }
+            })
+            .catch(err => {
+                setLabel(button, null);
+                console.error('Error consultando la exportación:', err);
+            });
+    }
+
+    function start(url, button) {
+        const target = new URL(url, window.location.origin);
+        target.searchParams.set('background', '1');
+        setLabel(button, 'Generando...');
+        fetch(target.toString(), {credentials: 'same-origin'})
+            .then(resp => resp.json())
+            .then(data => {
+                if (!data.success) throw new Error(data.message || 'Error solicitando la exportación');
+                poll(data.job.status_url, button);
+            })
+            .catch(err => {
+                setLabel(button, null);
+                alert(err.message);
+            });
+    }
+
+    document.addEventListener('click', function (e) {
+        const link = e.target.closest('a[data-background-export]');
+        if (!link) return;
+        e.preventDefault();
+        start(link.href, link);
+    });
+
+    document.addEventListener('submit', function (e) {
+        const form = e.target.closest('form[data-background-export]');
+        if (!form) return;
+        e.preventDefault();
+        const url = new URL(form.action, window.location.origin);
+        new FormData(form).forEach((value, key) => url.searchParams.set(key, value));
+        start(url.toString(), form.querySelector('button[type="submit"]'));
+    });
+})();
@@ -96,9 +96,18 @@ function buscarEquipos() {
         return;
     }
     // Llamada al endpoint del backend que devuelve fichas y timelines por cédula
-    fetch(`/reports/timelines/?cedula=${encodeURIComponent(cedula)}`, { method: 'GET', credentials: 'same-origin' })
-        .then(resp => resp.json())
-        .then(data => {
+    fetch(`/reports/timelines/?cedula=${encodeURIComponent(cedula)}`, {
+        method: 'GET',
+        credentials: 'same-origin',
+        headers: { 'Accept': 'application/json' },
+    })
+        .then(resp => resp.json().then(data => ({ status: resp.status, data })))
+        .then(({ status, data }) => {
+            if (status === 429) {
+                const espera = (data && data.retry_after) || 60;
+                alert(`⚠️ Demasiadas consultas. Intenta nuevamente en ${espera} segundos.`);
+                return;
+            }
             if (data && data.success && Array.isArray(data.fichas) && data.fichas.length > 0) {
                 // Adaptar la respuesta al formato que espera mostrarResultados
                 const equipos = data.fichas.map(f => ({
@@ -163,6 +172,14 @@ function mostrarResultados(equipos, cedula) {
             const estadoIcon = (item.icono) ? item.icono : (item.estado === 'recepcion' ? '📦' : (item.estado === 'diagnostico' ? '🔍' : (item.estado === 'reparacion' ? '🔧' : (item.estado === 'pruebas' ? '✅' : '📌'))));
             // Mostrar fecha tal cual (backend envía ISO o texto formateado)
             const fechaTexto = item.fecha || '';
+            // El video se procesa en segundo plano: mostrar aviso mientras no esté listo
+            let videoHtml = '';
+            if (item.video_estado === 'pendiente' || item.video_estado === 'en_proceso') {
+                videoHtml = `<div class="timeline-video">Video en proceso…</div>`;
+            } else if (item.video) {
+                const poster = item.poster ? `<img src="${item.poster}" alt="Video" style="max-width: 160px; display: block;">` : 'Ver video';
+                videoHtml = `<div class="timeline-video"><a href="${item.video}" target="_blank">${poster}</a></div>`;
+            }
             html += `
                 <div class="timeline-item ${item.estado}">
                     <div class="timeline-dot"></div>
@@ -170,7 +187,7 @@ function mostrarResultados(equipos, cedula) {
                         <div class="timeline-date">${fechaTexto}</div>
                         <div class="timeline-title">${estadoIcon} ${item.titulo}</div>
                         <div class="timeline-desc">${item.descripcion || ''}</div>
-                        ${item.video ? (`<div class="timeline-video"><a href="${item.video}" target="_blank">Ver video</a></div>`) : ''}
+                        ${videoHtml}
                     </div>
                 </div>
             `;